@@ -37,6 +37,13 @@ def main():
         sys.path.insert(0, src_dir)
         sys.path.insert(0, current_dir)
 
+        # 守护进程模式：不导入Qt，直接运行录制守护进程
+        if "--daemon" in sys.argv[1:]:
+            argv = [arg for arg in sys.argv[1:] if arg != "--daemon"]
+            import recorder_daemon
+
+            return recorder_daemon.main(argv)
+
         # 导入并运行内部main模块
         from src import main as internal_main
 
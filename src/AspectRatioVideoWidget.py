@@ -8,7 +8,45 @@ from PySide6.QtWidgets import (
     QComboBox,
     QFrame,
 )
-from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtCore import Qt, QTimer, Signal, QRect
+from PySide6.QtGui import QImage, QPainter
+
+
+class VideoFrameLabel(QLabel):
+    """视频显示控件：有软件渲染帧时按比例绘制QImage，否则按普通QLabel显示"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.frame_image = None
+
+    def set_frame(self, image: QImage):
+        """设置要显示的帧(界面线程中调用)"""
+        self.frame_image = image
+        self.update()
+
+    def clear_frame(self):
+        """清除软件渲染帧，恢复文字显示"""
+        self.frame_image = None
+        self.update()
+
+    def paintEvent(self, event):
+        image = self.frame_image
+        if image is None or image.isNull():
+            super().paintEvent(event)
+            return
+
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+        # 保持画面比例居中绘制
+        size = image.size().scaled(self.size(), Qt.KeepAspectRatio)
+        target = QRect(
+            (self.width() - size.width()) // 2,
+            (self.height() - size.height()) // 2,
+            size.width(),
+            size.height(),
+        )
+        painter.drawImage(target, image)
+        painter.end()
 
 
 class AspectRatioVideoWidget(QWidget):
@@ -66,7 +104,7 @@ class AspectRatioVideoWidget(QWidget):
         self.video_container_layout.setContentsMargins(0, 0, 0, 0)
 
         # 视频显示控件
-        self.video_widget = QLabel()
+        self.video_widget = VideoFrameLabel()
         self.video_widget.setStyleSheet("background-color: rgb(180, 180, 180);")
         self.video_widget.setAlignment(Qt.AlignCenter)
         self.video_widget.setText("视频显示区域")
@@ -169,6 +207,14 @@ class AspectRatioVideoWidget(QWidget):
         """获取视频显示控件"""
         return self.video_widget
 
+    def show_frame(self, image: QImage):
+        """软件渲染：显示一帧图像"""
+        self.video_widget.set_frame(image)
+
+    def clear_frame(self):
+        """软件渲染：清除画面"""
+        self.video_widget.clear_frame()
+
     def get_aspect_mode(self):
         """获取当前比例模式"""
         return self.aspect_mode
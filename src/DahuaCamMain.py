@@ -1,51 +1,43 @@
 # coding=utf-8
 import sys
 import os
+import threading
 import time
-from datetime import datetime
-from PySide6 import QtWidgets
+from collections import deque
 from PySide6.QtWidgets import QApplication, QMainWindow, QMessageBox, QFileDialog
 from PySide6.QtCore import QTimer, Signal, QDateTime, QDate, QTime, QSize
-from PySide6.QtGui import QPixmap
-from ctypes import sizeof, POINTER, cast, c_char
+from PySide6.QtGui import QImage
+from ctypes import sizeof
 
 # from ctypes import *
 
 
 from DahuaCamUI import Ui_MainWindow
 from config_manager import ConfigManager
-from NetSDK.NetSDK import NetClient
-from NetSDK.SDK_Callback import (
-    fDisConnect,
-    fHaveReConnect,
-    CB_FUNCTYPE,
-    fDecCBFun,
-    fRealDataCallBackEx2,
+from sdk_executor import SDKCommandExecutor
+from camera_session import (
+    CameraSession,
+    SessionListener,
+    media_filename,
 )
+from frame_subscribers import POLICY_LATEST
+from event_recorder import DEFAULT_POST_ROLL, EventRecorder
+from alarm_coalescer import DEFAULT_WINDOW as DEFAULT_ALARM_WINDOW
+from alarm_history import HISTORY_NAME, acquire_history, release_history
+from alarm_table_model import AlarmTableModel
+from clip_export import export_clip
+from media_catalog import CATALOG_NAME, MediaCatalog
+from remux_pool import EVENT_PRIORITY, JOB_DONE, PRIORITY_NORMAL, RemuxPool
+from retention_manager import GB, acquire_retention, release_retention
+from snapshot_writer import SnapshotWriter
+from yuv_convert import FORMAT_I420, YUVConverter, pick_scale
 from NetSDK.SDK_Enum import (
     SDK_RealPlayType,
-    EM_LOGIN_SPAC_CAP_TYPE,
     SDK_PTZ_ControlType,
-    EM_DEV_CFG_TYPE,
-    EM_REALDATA_FLAG,
-    SDK_ALARM_TYPE,
 )
 from NetSDK.SDK_Struct import (
-    C_LLONG,
-    NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY,
-    NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY,
-    SNAP_PARAMS,
-    C_DWORD,
-    C_LDWORD,
-    c_ubyte,
-    c_uint,
-    c_int,
-    c_long,
-    NET_TIME,
     LOG_SET_PRINT_INFO,
     sys_platform,
-    PLAY_FRAME_INFO,
-    ALARM_MOTIONDETECT_INFO,
 )
 
 # 添加必要的路径
@@ -68,104 +60,50 @@ parent_dir = os.path.abspath(parent_dir)
 sys.path.insert(0, current_dir)
 sys.path.insert(0, parent_dir)
 
-# 全局变量保存窗口引用
-g_window_instance = None
-
-
-# 报警信息类
-class AlarmInfo:
-    def __init__(self):
-        self.time_str = ""
-        self.channel_str = ""
-        self.alarm_type = ""
-        self.status_str = ""
-
-    def get_motion_alarm_info(self, alarm_info):
-        """获取动检报警信息"""
-        self.time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.channel_str = str(alarm_info.nChannelID)
-        self.alarm_type = "动检事件(VideoMotion)"
-        if alarm_info.nEventAction == 0:
-            self.status_str = "脉冲(Pulse)"
-        elif alarm_info.nEventAction == 1:
-            self.status_str = "开始(Start)"
-        elif alarm_info.nEventAction == 2:
-            self.status_str = "结束(Stop)"
-        else:
-            self.status_str = "未知(Unknown)"
-
-
-# 抓拍回调函数
-@CB_FUNCTYPE(None, C_LLONG, POINTER(c_ubyte), c_uint, c_uint, C_DWORD, C_LDWORD)
-def CaptureCallBack(lLoginID, pBuf, RevLen, EncodeType, CmdSerial, dwUser):
-    """抓拍回调函数"""
-    if lLoginID == 0 or g_window_instance is None:
-        return
-
-    print("Enter CaptureCallBack")
-    try:
-        # 直接使用全局窗口引用
-        g_window_instance.capture_signal.emit(pBuf, RevLen, EncodeType)
-    except Exception as e:
-        print(f"抓拍回调错误: {e}")
-
-
-# 报警回调函数
-@CB_FUNCTYPE(
-    None,
-    c_long,
-    C_LLONG,
-    POINTER(c_char),
-    C_DWORD,
-    POINTER(c_char),
-    c_long,
-    c_int,
-    c_long,
-    C_LDWORD,
-)
-def AlarmCallback(
-    lCommand,
-    lLoginID,
-    pBuf,
-    dwBufLen,
-    pchDVRIP,
-    nDVRPort,
-    bAlarmAckFlag,
-    nEventID,
-    dwUser,
-):
-    """报警回调函数"""
-    if lLoginID == 0 or g_window_instance is None:
-        return
-
-    try:
-        if lCommand == SDK_ALARM_TYPE.EVENT_MOTIONDETECT:
-            print("收到动检报警")
-            alarm_info = cast(pBuf, POINTER(ALARM_MOTIONDETECT_INFO)).contents
-            show_info = AlarmInfo()
-            show_info.get_motion_alarm_info(alarm_info)
-            # 通过信号发送到主线程
-            g_window_instance.alarm_signal.emit(lCommand, show_info)
-    except Exception as e:
-        print(f"报警回调错误: {e}")
-
-
-class DahuaCamWindow(QMainWindow, Ui_MainWindow):
+# 渲染模式(渲染模式下拉框的itemData)
+RENDER_CALLBACK = 0  # SDK直接渲染到窗口句柄
+RENDER_PLAYSDK = 1  # PlaySDK解码并渲染(Windows)
+RENDER_SOFTWARE = 2  # PlaySDK解码，YUV转RGB后由Qt绘制
+
+# 抓拍模式(抓拍模式下拉框的itemData)
+SNAP_SINGLE = "single"
+SNAP_BURST = "burst"  # 按间隔连拍指定张数
+SNAP_INTERVAL = "interval"  # 按间隔抓拍直到停止
+
+ALARM_REFRESH_MS = 40  # 报警表格刷新间隔，与软件渲染的帧间隔一致
+ALARM_QUEUE_SIZE = 100000  # 两次刷新之间缓存的本会话报警事件数上限
+
+SNAP_MAX_IN_FLIGHT = 4  # 未返回的抓拍请求超过此数时跳过本次定时抓拍
+
+RENDER_MODE_NAMES = {
+    RENDER_CALLBACK: "CallBack",
+    RENDER_PLAYSDK: "PlaySDK",
+    RENDER_SOFTWARE: "Software",
+}
+
+
+class DahuaCamWindow(QMainWindow, Ui_MainWindow, SessionListener):
+    """摄像机窗口 - CameraSession 的界面视图，SDK调用在执行器工作线程中完成"""
+
     # 添加信号用于线程安全的UI更新
-    capture_signal = Signal(object, int, int)
-    alarm_signal = Signal(int, object)  # 报警信号
+    snapshot_signal = Signal(
+        str, int, object, str
+    )  # 抓拍图片已保存(路径, 字节数, 批次, 错误)
+    connection_signal = Signal(bool, str, int)  # 断线/重连信号(是否在线, IP, 端口)
+    remux_signal = Signal(str)  # 转MP4进度(状态栏消息)
+    export_signal = Signal(object, str)  # 片段导出完成(结果, 错误信息)
+    frame_signal = Signal(object, object)  # 软件渲染帧(QImage, RGB缓冲区)
 
     def __init__(self, parent=None):
         super(DahuaCamWindow, self).__init__(parent)
         self.setupUi(self)
 
-        # 设置全局窗口引用
-        global g_window_instance
-        g_window_instance = self
-
         # 连接信号
-        self.capture_signal.connect(self.handle_capture_callback)
-        self.alarm_signal.connect(self.handle_alarm_callback)
+        self.snapshot_signal.connect(self.handle_snapshot_saved)
+        self.connection_signal.connect(self.handle_connection_changed)
+        self.remux_signal.connect(self.statusbar.showMessage)
+        self.export_signal.connect(self.handle_export_done)
+        self.frame_signal.connect(self.show_rendered_frame)
 
         # 配置管理器
         self.config_manager = ConfigManager()
@@ -173,40 +111,115 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         # 界面初始化
         self._init_ui()
 
-        # NetSDK用到的相关变量和回调
-        self.loginID = 0
-        self.playID = 0
-        self.recordID = 0  # 录制ID
-        self.freePort = c_int()  # PlaySDK端口
-        self.is_recording = False  # 录制状态
-        self.record_start_time = None  # 录制开始时间
-        self.is_alarm_listening = False  # 报警监听状态
+        self.preview_channel = None  # 正在预览的通道
         self.alarm_count = 0  # 报警记录数量
-        self.m_DisConnectCallBack = fDisConnect(self.DisConnectCallBack)
-        self.m_ReConnectCallBack = fHaveReConnect(self.ReConnectCallBack)
-
-        # PlaySDK模式专用回调：解码回调 - 获取YUV数据
-        self.m_DecodingCallBack = fDecCBFun(self.DecodingCallBack)
-
-        # PlaySDK模式专用回调：拉流回调 - 获取原始流数据并输入到PlaySDK
-        self.m_RealDataCallBack = fRealDataCallBackEx2(self.RealDataCallBack)
+        self.alarm_suppressed = 0  # 合并时丢弃的重复报警数(已显示的值)
 
         # 录制时间更新定时器
         self.record_timer = QTimer()
         self.record_timer.timeout.connect(self.update_record_time)
 
-        # 获取NetSDK对象并初始化
-        self.sdk = NetClient()
-        self.sdk.InitEx(self.m_DisConnectCallBack)
-        self.sdk.SetAutoReconnect(self.m_ReConnectCallBack)
-
-        # 设置报警回调
-        self.sdk.SetDVRMessCallBackEx1(AlarmCallback, 0)
+        # 软件渲染：订阅最新解码帧，在订阅线程中转换为RGB，QImage通过信号交给界面线程
+        self.render_subscription = None
+        self.yuv_converter = YUVConverter()  # 只在订阅线程中使用
+        self.render_buffers = [None, None]  # 交替使用的RGB缓冲区(QImage直接引用其内存)
+        self.render_index = 0
+        self.render_pending = False  # 已发出、界面线程尚未显示的帧
+        self.render_size = (0, 0)  # 显示区域尺寸(界面线程更新)
+        self.frame_rgb = None  # 正在显示的RGB缓冲区
+
+        # 连拍/定时抓拍：定时器发送抓拍请求，图片在回调中交给后台线程保存
+        self.snap_timer = QTimer()
+        self.snap_timer.timeout.connect(self._snap_tick)
+        self.snap_run = 0  # 当前抓拍批次，单张抓拍为0
+        self.snap_mode = SNAP_SINGLE
+        self.snap_total = 0  # 连拍张数
+        self.snap_requested = 0  # 本批次已发送的请求数
+        self.snap_saved = 0  # 本批次已保存的图片数
+        self.snap_skipped = 0  # 请求未返回而跳过的定时抓拍次数
+        self.snap_in_flight = 0
+        self.local_snap_seq = 0  # 最近一次本地抓拍的解码帧序号
+        self.snap_seq = 0  # 文件名序号，跨批次递增，避免同一秒内的文件重名
+        self.snapshot_dir = ""  # 最近一次抓拍的保存目录
+
+        # 动检录制(勾选"动检录制"后创建)
+        self.event_recorder = None
+
+        # SDK命令执行器：阻塞调用在工作线程中执行，结果通过信号回到界面线程
+        self.executor = SDKCommandExecutor("DahuaCamSDK", parent=self)
+        self.login_future = None
+
+        # 设备会话：持有登录、预览、录制等状态，事件通过 SessionListener 回调本窗口
+        self.session = CameraSession(listener=self)
+        self.sdk = self.session.sdk
 
         # 创建保存目录
         self.setup_default_save_path()
         self.create_save_directory()
 
+        # 录像/抓拍索引：文件关闭时写入，启动和更换保存目录时后台增量扫描
+        self.catalog = MediaCatalog(os.path.join(base_dir, CATALOG_NAME))
+        self.rescan_catalog()
+
+        # 保存目录的配额和磁盘剩余空间管理(后台线程删除最早的文件)，
+        # 使用同一目录的窗口共享一个管理器
+        self.retention = acquire_retention(
+            self.catalog.db_path, self.save_path_edit.text().strip() or base_dir
+        )
+        self.device_quota = None  # 本窗口设置的设备配额(IP, 字节)
+
+        # 报警历史：订阅报警事件总线，后台批量写入数据库，表格只显示最近的记录；
+        # 总线包含所有会话的报警，进程内的窗口共享一个写入器
+        self.alarm_history = acquire_history(os.path.join(base_dir, HISTORY_NAME))
+
+        # 报警表格：只显示本窗口会话的报警，alarm_received 把事件放入队列，
+        # 定时器每个刷新周期把新事件一次加入表格模型
+        self.alarm_model = AlarmTableModel(parent=self)
+        self.alarm_tableView.setModel(self.alarm_model)
+        self.alarm_events = deque(maxlen=ALARM_QUEUE_SIZE)
+        self.alarm_timer = QTimer()
+        self.alarm_timer.timeout.connect(self.drain_alarm_events)
+        self.alarm_timer.start(ALARM_REFRESH_MS)
+
+        # 抓拍图片的后台写入线程(写文件并写入索引)
+        self.snapshot_writer = SnapshotWriter(
+            self.catalog, on_saved=self._snapshot_saved
+        )
+
+        # 录像转MP4(设备配置 remux_mp4 开启时创建)
+        self.remux = None
+        self.remux_enabled = False
+
+    @property
+    def loginID(self):
+        return self.session.loginID
+
+    @property
+    def current_stream(self):
+        """当前预览通道的预览流"""
+        if self.preview_channel is None:
+            return None
+        return self.session.streams.get(self.preview_channel)
+
+    @property
+    def playID(self):
+        stream = self.current_stream
+        return stream.play_id if stream else 0
+
+    @property
+    def is_recording(self):
+        stream = self.current_stream
+        return bool(stream and stream.is_recording)
+
+    @property
+    def record_start_time(self):
+        stream = self.current_stream
+        return stream.record_start_time if stream else None
+
+    @property
+    def is_alarm_listening(self):
+        return self.session.is_alarm_listening
+
     def setup_default_save_path(self):
         """设置默认保存路径"""
         # 在base_dir下创建capture目录（绝对路径）
@@ -245,9 +258,12 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-离线(OffLine)")
 
         # 初始化渲染模式选择
-        self.render_mode_comboBox.addItem("回调模式(CallBack)")
+        self.render_mode_comboBox.addItem("回调模式(CallBack)", RENDER_CALLBACK)
         if sys_platform == "windows":
-            self.render_mode_comboBox.addItem("PlaySDK模式(PlaySDK-Windows独有)")
+            self.render_mode_comboBox.addItem(
+                "PlaySDK模式(PlaySDK-Windows独有)", RENDER_PLAYSDK
+            )
+        self.render_mode_comboBox.addItem("软件渲染(Software)", RENDER_SOFTWARE)
 
         # 连接登录和预览按钮的点击事件
         self.login_btn.clicked.connect(self.login_btn_onclick)
@@ -261,8 +277,12 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
 
         # 连接抓拍和录制按钮事件
         self.capture_btn.clicked.connect(self.capture_picture)
+        self.snap_mode_comboBox.currentIndexChanged.connect(self.snap_mode_changed)
+        self.local_snap_checkBox.toggled.connect(self.snap_format_comboBox.setEnabled)
         self.record_btn.clicked.connect(self.toggle_record)
+        self.motion_record_checkBox.toggled.connect(self.toggle_motion_record)
         self.select_path_btn.clicked.connect(self.select_save_path)
+        self.save_path_edit.editingFinished.connect(self.save_path_changed)
 
         # 连接设备控制按钮事件
         self.get_time_btn.clicked.connect(self.get_device_time)
@@ -282,6 +302,12 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         self.copy_url_btn.clicked.connect(self.copy_rtsp_url)
         self.ffmpeg_generator_btn.clicked.connect(self.open_ffmpeg_generator)
 
+        # 录像导出：默认导出最近一分钟
+        now = QDateTime.currentDateTime()
+        self.export_end_edit.setDateTime(now)
+        self.export_start_edit.setDateTime(now.addSecs(-60))
+        self.export_btn.clicked.connect(self.export_clip)
+
         # 连接视频比例控制事件（使用自定义组件的信号）
         self.video_widget.aspect_mode_changed.connect(self.on_aspect_ratio_changed)
 
@@ -352,6 +378,15 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
 
     def login_btn_onclick(self):
         """登录/登出按钮点击事件"""
+        if self.login_future is not None and not self.login_future.done():
+            # 登录进行中，再次点击取消登录
+            self.login_future.cancel()
+            self.login_future = None
+            self.login_btn.setText("登录(Login)")
+            self.statusbar.showMessage("登录已取消")
+            print("登录已取消")
+            return
+
         if not self.loginID:
             # 执行登录
             ip = self.IP_lineEdit.text()
@@ -373,105 +408,119 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
                 return
 
             print(f"尝试登录设备: {ip}:{port}, 用户名: {username}")
-
-            stuInParam = NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY()
-            stuInParam.dwSize = sizeof(NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY)
-            stuInParam.szIP = ip.encode()
-            stuInParam.nPort = port
-            stuInParam.szUserName = username.encode()
-            stuInParam.szPassword = password.encode()
-            stuInParam.emSpecCap = EM_LOGIN_SPAC_CAP_TYPE.TCP
-
-            stuOutParam = NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY()
-            stuOutParam.dwSize = sizeof(NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY)
-
-            self.loginID, device_info, error_msg = self.sdk.LoginWithHighLevelSecurity(
-                stuInParam, stuOutParam
+            self.session.set_credentials(ip, port, username, password)
+            self.apply_device_options(ip)
+
+            self.login_btn.setText("取消登录(Cancel)")
+            self.statusbar.showMessage(f"正在登录 {ip}:{port}...")
+            self.login_future = self.executor.submit(
+                self.session.login,
+                kind="login",
+                on_done=lambda result, error: self._on_login_done(
+                    ip, port, username, password, result, error
+                ),
+                on_discard=self._discard_login,
             )
-
-            if self.loginID != 0:
-                success_msg = f"登录成功 - {ip}:{port}, 通道数: {device_info.nChanNum}"
-                print(success_msg)
-                self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-在线(OnLine)")
-                self.login_btn.setText("登出(Logout)")
-                self.play_btn.setEnabled(True)
-
-                # 启用相机控制相关的组
-                self.ptz_groupBox.setEnabled(True)
-                self.camera_groupBox.setEnabled(True)
-                self.record_groupBox.setEnabled(True)
-                self.capture_btn.setEnabled(True)
-                self.record_btn.setEnabled(True)
-
-                # 设备相关的功能需要登录后才能使用
-                self.get_time_btn.setEnabled(True)
-                self.set_time_btn.setEnabled(True)
-                self.sync_time_btn.setEnabled(True)
-                self.restart_btn.setEnabled(True)
-                self.start_alarm_btn.setEnabled(True)
-
-                # 填充通道列表
-                self.Channel_comboBox.clear()
-                for i in range(int(device_info.nChanNum)):
-                    self.Channel_comboBox.addItem(str(i))
-                self.StreamTyp_comboBox.setEnabled(True)
-                self.render_mode_comboBox.setEnabled(True)
-
-                # 保存成功登录的配置
-                self.save_login_config(ip, port, username, password)
-
-                self.statusbar.showMessage(f"登录成功 - {ip}:{port}")
-            else:
-                print(f"登录失败: {error_msg}")
-                QMessageBox.warning(self, "登录失败", error_msg)
-                self.statusbar.showMessage("登录失败")
         else:
-            # 执行登出
+            # 执行登出：先停止预览、录制和报警监听，执行器保证按顺序执行
             print("开始登出...")
+            self.login_btn.setEnabled(False)
             if self.playID:
                 print("停止预览...")
                 self.stop_preview()
+            if self.is_alarm_listening:
+                self.stop_alarm_listen()
+
+            self.executor.submit(
+                self.session.logout,
+                kind="logout",
+                on_done=self._on_logout_done,
+                cancellable=False,
+            )
 
-            result = self.sdk.Logout(self.loginID)
-            if result:
-                print("登出成功")
-                self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-离线(OffLine)")
-                self.login_btn.setText("登录(Login)")
-                self.loginID = 0
-                self.play_btn.setEnabled(False)
-
-                # 禁用相机控制相关的组
-                self.ptz_groupBox.setEnabled(False)
-                self.camera_groupBox.setEnabled(False)
-                self.record_groupBox.setEnabled(False)
-                self.capture_btn.setEnabled(False)
-                self.record_btn.setEnabled(False)
-
-                # 设备相关的功能在登出后禁用
-                self.get_time_btn.setEnabled(False)
-                self.set_time_btn.setEnabled(False)
-                self.sync_time_btn.setEnabled(False)
-                self.restart_btn.setEnabled(False)
-                self.start_alarm_btn.setEnabled(False)
-                self.stop_alarm_btn.setEnabled(False)
-
-                self.Channel_comboBox.clear()
-                self.StreamTyp_comboBox.setEnabled(False)
-                self.render_mode_comboBox.setEnabled(False)
-
-                # 停止录制（如果正在录制）
-                if self.is_recording:
-                    self.stop_record()
-
-                # 停止报警监听（如果正在监听）
-                if self.is_alarm_listening:
-                    self.stop_alarm_listen()
-
-                self.statusbar.showMessage("已登出")
-            else:
-                error_msg = "登出失败"
-                print(error_msg)
-                self.statusbar.showMessage(error_msg)
+    def _discard_login(self, result):
+        """登录超时或被取消后才返回成功时，登出该会话(工作线程中执行)"""
+        if result and result[0]:
+            print(f"登录结果已过期，登出句柄: {self.session.loginID}")
+            self.session.logout()
+
+    def _on_login_done(self, ip, port, username, password, result, error):
+        """登录调用完成(界面线程)"""
+        self.login_future = None
+        self.login_btn.setText("登录(Login)")
+        success, error_msg = (False, str(error)) if error is not None else result
+
+        if success:
+            channel_count = self.session.channel_count
+            success_msg = f"登录成功 - {ip}:{port}, 通道数: {channel_count}"
+            print(success_msg)
+            self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-在线(OnLine)")
+            self.login_btn.setText("登出(Logout)")
+            self.play_btn.setEnabled(True)
+
+            # 启用相机控制相关的组
+            self.ptz_groupBox.setEnabled(True)
+            self.camera_groupBox.setEnabled(True)
+            self.record_groupBox.setEnabled(True)
+            self.capture_btn.setEnabled(True)
+            self.record_btn.setEnabled(True)
+
+            # 设备相关的功能需要登录后才能使用
+            self.get_time_btn.setEnabled(True)
+            self.set_time_btn.setEnabled(True)
+            self.sync_time_btn.setEnabled(True)
+            self.restart_btn.setEnabled(True)
+            self.start_alarm_btn.setEnabled(True)
+
+            # 填充通道列表
+            self.Channel_comboBox.clear()
+            for i in range(channel_count):
+                self.Channel_comboBox.addItem(str(i))
+            self.StreamTyp_comboBox.setEnabled(True)
+            self.render_mode_comboBox.setEnabled(True)
+
+            # 保存成功登录的配置
+            self.save_login_config(ip, port, username, password)
+
+            self.statusbar.showMessage(f"登录成功 - {ip}:{port}")
+        else:
+            print(f"登录失败: {error_msg}")
+            QMessageBox.warning(self, "登录失败", error_msg)
+            self.statusbar.showMessage("登录失败")
+
+    def _on_logout_done(self, result, error):
+        """登出调用完成(界面线程)"""
+        self.login_btn.setEnabled(True)
+        if error is None and result:
+            print("登出成功")
+            self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-离线(OffLine)")
+            self.login_btn.setText("登录(Login)")
+            self.play_btn.setEnabled(False)
+
+            # 禁用相机控制相关的组
+            self.ptz_groupBox.setEnabled(False)
+            self.camera_groupBox.setEnabled(False)
+            self.record_groupBox.setEnabled(False)
+            self.capture_btn.setEnabled(False)
+            self.record_btn.setEnabled(False)
+
+            # 设备相关的功能在登出后禁用
+            self.get_time_btn.setEnabled(False)
+            self.set_time_btn.setEnabled(False)
+            self.sync_time_btn.setEnabled(False)
+            self.restart_btn.setEnabled(False)
+            self.start_alarm_btn.setEnabled(False)
+            self.stop_alarm_btn.setEnabled(False)
+
+            self.Channel_comboBox.clear()
+            self.StreamTyp_comboBox.setEnabled(False)
+            self.render_mode_comboBox.setEnabled(False)
+
+            self.statusbar.showMessage("已登出")
+        else:
+            error_msg = f"登出失败: {error}" if error is not None else "登出失败"
+            print(error_msg)
+            self.statusbar.showMessage(error_msg)
 
     def play_btn_onclick(self):
         """预览/停止按钮点击事件"""
@@ -490,76 +539,63 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         else:
             stream_type = SDK_RealPlayType.Realplay_1
 
-        render_mode = self.render_mode_comboBox.currentIndex()
+        render_mode = self.render_mode_comboBox.currentData()
         print(
             f"开始预览 - 通道: {channel}, 流类型: {stream_type}, 渲染模式: {render_mode}"
         )
+        print(f"使用{RENDER_MODE_NAMES[render_mode]}渲染模式")
+
+        # 窗口句柄需要在界面线程中获取，软件渲染模式下SDK不绘制窗口
+        hwnd = 0 if render_mode == RENDER_SOFTWARE else int(self.PlayWnd.winId())
+        self.play_btn.setEnabled(False)
+        self.statusbar.showMessage("正在打开预览...")
+        self.executor.submit(
+            self.session.start_preview,
+            channel,
+            stream_type,
+            hwnd,
+            render_mode != RENDER_CALLBACK,
+            kind="realplay",
+            on_done=lambda result, error: self._on_preview_started(
+                channel, render_mode, result, error
+            ),
+            on_discard=lambda result: self._discard_preview(channel, result),
+        )
 
-        try:
-            if render_mode == 0:
-                # CallBack模式（回调渲染）- 索引0
-                print("使用CallBack回调渲染模式")
-                self.playID = self.sdk.RealPlayEx(
-                    self.loginID, channel, int(self.PlayWnd.winId()), stream_type
-                )
-
-                if self.playID != 0:
-                    print(f"CallBack预览启动成功 - PlayID: {self.playID}")
-                    self.play_btn.setText("停止(Stop)")
-                    self.StreamTyp_comboBox.setEnabled(False)
-                    self.render_mode_comboBox.setEnabled(False)
-                    self.statusbar.showMessage("CallBack预览已开始")
-                else:
-                    error_msg = self.sdk.GetLastErrorMessage()
-                    print(f"CallBack预览失败: {error_msg}")
-                    QMessageBox.warning(self, "预览失败", error_msg)
+    def _discard_preview(self, channel, result):
+        """预览超时或被取消后才打开成功时，关闭该预览(工作线程中执行)"""
+        if result and result[0] is not None:
+            self.session.stop_preview(channel)
+
+    def _on_preview_started(self, channel, render_mode, result, error):
+        """预览打开完成(界面线程)"""
+        self.play_btn.setEnabled(True)
+        stream, error_msg = (None, str(error)) if error is not None else result
+        mode_name = RENDER_MODE_NAMES[render_mode]
+        if stream is not None:
+            self.preview_channel = channel
+            if render_mode == RENDER_CALLBACK:
+                print(f"CallBack预览启动成功 - PlayID: {stream.play_id}")
             else:
-                # PlaySDK模式 (Windows独有) - 索引1
-                print("使用PlaySDK渲染模式")
-                result, self.freePort = self.sdk.GetFreePort()
-                if not result:
-                    error_msg = "获取PlaySDK端口失败"
-                    print(error_msg)
-                    QMessageBox.warning(self, "预览失败", error_msg)
-                    return
-
-                self.sdk.OpenStream(self.freePort)
-                self.sdk.Play(self.freePort, int(self.PlayWnd.winId()))
-
-                self.playID = self.sdk.RealPlayEx(self.loginID, channel, 0, stream_type)
-                if self.playID != 0:
-                    print(
-                        f"PlaySDK预览启动成功 - PlayID: {self.playID}, Port: {self.freePort.value}"
-                    )
-                    self.play_btn.setText("停止(Stop)")
-                    self.StreamTyp_comboBox.setEnabled(False)
-                    self.render_mode_comboBox.setEnabled(False)
-                    self.statusbar.showMessage("PlaySDK预览已开始")
-
-                    # 设置数据回调和解码回调
-                    self.sdk.SetRealDataCallBackEx2(
-                        self.playID,
-                        self.m_RealDataCallBack,
-                        None,
-                        EM_REALDATA_FLAG.RAW_DATA,
-                    )
-                    self.sdk.SetDecCallBack(self.freePort, self.m_DecodingCallBack)
-                else:
-                    error_msg = self.sdk.GetLastErrorMessage()
-                    print(f"PlaySDK预览失败: {error_msg}")
-                    # 清理PlaySDK资源
-                    self.sdk.Stop(self.freePort)
-                    self.sdk.CloseStream(self.freePort)
-                    self.sdk.ReleasePort(self.freePort)
-                    QMessageBox.warning(self, "预览失败", error_msg)
-
-        except Exception as e:
-            error_msg = f"预览异常：{str(e)}"
-            print(error_msg)
-            QMessageBox.warning(self, "错误", error_msg)
+                print(
+                    f"{mode_name}预览启动成功 - PlayID: {stream.play_id}, Port: {stream.port.value}"
+                )
+            if render_mode == RENDER_SOFTWARE:
+                self.start_render(stream)
+            self.play_btn.setText("停止(Stop)")
+            self.StreamTyp_comboBox.setEnabled(False)
+            self.render_mode_comboBox.setEnabled(False)
+            self.statusbar.showMessage(f"{mode_name}预览已开始")
+        else:
+            print(f"{mode_name}预览失败: {error_msg}")
+            self.statusbar.showMessage("预览失败")
+            QMessageBox.warning(self, "预览失败", error_msg)
 
     def stop_preview(self):
         """停止预览"""
+        # 动检录制和连拍/定时抓拍依赖当前预览
+        self.stop_motion_record()
+        self.stop_snapshots()
         # 停止预览前，先停止录制（如果正在录制）
         if self.is_recording:
             print("停止预览前先停止录制...")
@@ -567,21 +603,24 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
 
         # 停止预览
         print("停止预览...")
-        result = self.sdk.StopRealPlayEx(self.playID)
-        if result:
+        self.play_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.stop_preview,
+            self.preview_channel,
+            kind="realplay",
+            on_done=self._on_preview_stopped,
+            cancellable=False,
+        )
+
+    def _on_preview_stopped(self, result, error):
+        """预览停止完成(界面线程)"""
+        self.play_btn.setEnabled(bool(self.loginID))
+        if error is None and result:
             print("预览停止成功")
             self.play_btn.setText("预览(Play)")
-
-            # 如果使用了PlaySDK模式，需要清理PlaySDK资源
-            render_mode = self.render_mode_comboBox.currentIndex()
-            if render_mode == 1 and sys_platform == "windows":
-                print("清理PlaySDK资源...")
-                self.sdk.SetDecCallBack(self.freePort, None)
-                self.sdk.Stop(self.freePort)
-                self.sdk.CloseStream(self.freePort)
-                self.sdk.ReleasePort(self.freePort)
-
-            self.playID = 0
+            self.preview_channel = None
+            self.stop_render()
+            self.video_widget.clear_frame()
             self.PlayWnd.repaint()
             self.StreamTyp_comboBox.setEnabled(True)
             self.render_mode_comboBox.setEnabled(True)
@@ -591,38 +630,53 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
             print(error_msg)
             self.statusbar.showMessage(error_msg)
 
-    def RealDataCallBack(
-        self, lRealHandle, dwDataType, pBuffer, dwBufSize, param, dwUser
-    ):
-        """
-        拉流回调函数 - 仅在PlaySDK模式下使用
-        作用：获取摄像头的原始视频流数据，并将其输入到PlaySDK进行解码
-        流程：摄像头 -> SDK -> 此回调 -> PlaySDK解码器 -> DecodingCallBack -> 显示
-        """
-        if lRealHandle == self.playID:
-            # 将原始流数据输入到PlaySDK进行解码显示
-            self.sdk.InputData(self.freePort, pBuffer, dwBufSize)
+    def start_render(self, stream):
+        """软件渲染：订阅预览流的最新解码帧，转换在订阅线程中完成"""
+        self.stop_render()
+        self.render_size = (self.PlayWnd.width(), self.PlayWnd.height())
+        self.render_pending = False
+        self.render_subscription = stream.subscribe(
+            "render", POLICY_LATEST, callback=self._convert_frame
+        )
 
-            # 可选：保存原始流数据到文件
-            # data_buffer = cast(pBuffer, POINTER(c_ubyte * dwBufSize)).contents
-            # with open('./data.dav', 'ab+') as data_file:
-            #     data_file.write(data_buffer)
+    def stop_render(self):
+        """停止软件渲染(界面线程)"""
+        subscription, self.render_subscription = self.render_subscription, None
+        if subscription is not None:
+            subscription.close()
 
-    def DecodingCallBack(self, nPort, pBuf, nSize, pFrameInfo, pUserData, nReserved2):
-        """
-        PlaySDK解码回调函数 - 仅在PlaySDK模式下使用
-        作用：获取PlaySDK解码后的YUV数据，可以进行进一步处理
-        流程：RealDataCallBack -> PlaySDK解码器 -> 此回调 -> 可获取YUV数据
-        """
-        # 这里可以获取解码后的YUV数据进行处理
-        # data = cast(pBuf, POINTER(c_ubyte * nSize)).contents
-        # info = pFrameInfo.contents
-        # if info.nType == 3:  # YUV数据
-        #     # 可以在这里处理YUV数据转RGB等操作
-        #     # 例如：图像处理、AI分析、格式转换等
-        #     pass
-        # 注意：此回调在PlaySDK内部线程中执行，不要进行耗时操作
-        pass
+    def _convert_frame(self, frame):
+        """把最新解码帧转换为RGB(订阅线程)，结果通过 frame_signal 交给界面线程"""
+        if self.render_pending:
+            # 界面线程还没显示上一帧，丢弃本帧
+            return
+
+        # 按显示尺寸整数倍缩小，减少转换量
+        width, height = self.render_size
+        scale = pick_scale(frame.width, frame.height, width, height)
+        shape = (frame.height // scale, frame.width // scale, 3)
+        # 两个缓冲区交替使用，不改写正在显示的缓冲区；
+        # 尺寸变化时分配新缓冲区，旧缓冲区由界面线程引用到换帧为止
+        self.render_index ^= 1
+        out = self.render_buffers[self.render_index]
+        if out is not None and out.shape != shape:
+            out = None
+        rgb = self.yuv_converter.convert(
+            frame.data, frame.width, frame.height, FORMAT_I420, scale, out
+        )
+        self.render_buffers[self.render_index] = rgb
+        image = QImage(rgb.data, shape[1], shape[0], shape[1] * 3, QImage.Format_RGB888)
+        self.render_pending = True
+        self.frame_signal.emit(image, rgb)
+
+    def show_rendered_frame(self, image, rgb):
+        """显示订阅线程转换好的帧(界面线程)"""
+        self.render_pending = False
+        if self.render_subscription is None:
+            # 预览已停止
+            return
+        self.frame_rgb = rgb
+        self.video_widget.show_frame(image)
 
     def create_save_directory(self):
         """创建保存目录"""
@@ -662,10 +716,49 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         )
         if selected_path:
             self.save_path_edit.setText(selected_path)
-            self.create_save_directory()
+            self.save_path_changed()
+
+    def save_path_changed(self):
+        """保存目录变化后同步索引，配额管理改为检查新目录"""
+        save_path = self.save_path_edit.text().strip()
+        if not save_path or os.path.abspath(save_path) == self.retention.root:
+            return
+        self.create_save_directory()
+        self.rescan_catalog()
+        old = self.retention
+        self.retention = acquire_retention(self.catalog.db_path, save_path)
+        if self.device_quota is not None:
+            ip, quota = self.device_quota
+            old.set_device_quota(ip, 0)
+            self.retention.set_device_quota(ip, quota)
+        release_retention(old)
+        self.retention.trigger()
+
+    def rescan_catalog(self):
+        """在后台线程中把保存目录同步到索引(程序外增删的文件)"""
+        save_path = self.save_path_edit.text().strip()
+        if not save_path or not os.path.isdir(save_path):
+            return
+        threading.Thread(
+            target=self._rescan_catalog,
+            args=(os.path.abspath(save_path),),
+            name="MediaCatalogRescan",
+            daemon=True,
+        ).start()
+
+    def _rescan_catalog(self, path):
+        try:
+            stats = self.catalog.rescan(path)
+            print(f"媒体索引已同步({path}): {stats}")
+        except Exception as e:
+            print(f"媒体索引扫描失败: {e}")
 
     def capture_picture(self):
-        """抓拍图片"""
+        """抓拍图片，连拍/定时模式下再次点击停止"""
+        if self.snap_timer.isActive():
+            self.stop_snapshots()
+            return
+
         if not self.loginID:
             error_msg = "请先登录设备！"
             print(f"抓拍错误: {error_msg}")
@@ -682,96 +775,152 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         # 检查保存目录
         if not self.verify_save_directory():
             return
+        self.snapshot_dir = os.path.abspath(self.save_path_edit.text().strip())
 
-        try:
+        mode = self.snap_mode_comboBox.currentData()
+        if mode == SNAP_SINGLE:
             print("开始抓拍...")
-            # 设置抓拍回调 - 简化参数传递
-            dwUser = 0  # 简化为0，使用全局变量引用
-            self.sdk.SetSnapRevCallBack(CaptureCallBack, dwUser)
-
-            # 获取当前通道
-            channel = self.Channel_comboBox.currentIndex()
-
-            # 设置抓拍参数
-            snap_params = SNAP_PARAMS()
-            snap_params.Channel = channel
-            snap_params.Quality = 1  # 抓拍质量
-            snap_params.mode = 0  # 抓拍模式
-
-            print(f"抓拍参数 - 通道: {channel}, 质量: {snap_params.Quality}")
-
-            # 执行抓拍
-            result = self.sdk.SnapPictureEx(self.loginID, snap_params)
-            if result:
-                success_msg = f"抓拍请求已发送 - 通道: {channel}"
-                print(success_msg)
-                self.statusbar.showMessage("抓拍请求已发送...")
-            else:
-                error_msg = self.sdk.GetLastErrorMessage()
-                print(f"抓拍失败: {error_msg}")
-                QMessageBox.warning(self, "抓拍失败", f"错误: {error_msg}")
-
-        except Exception as e:
-            error_msg = f"抓拍过程出错: {str(e)}"
-            print(error_msg)
-            QMessageBox.warning(self, "错误", error_msg)
-
-    def handle_capture_callback(self, pBuf, RevLen, EncodeType):
-        """处理抓拍回调 - 在主线程中安全执行"""
-        try:
-            print(f"处理抓拍回调 - 数据长度: {RevLen}, 编码类型: {EncodeType}")
-
-            # 生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            ip = self.IP_lineEdit.text().replace(".", "_")
-            channel = self.Channel_comboBox.currentIndex()
-            filename = f"capture_{ip}_ch{channel}_{timestamp}.jpg"
-
-            # 获取保存路径
-            save_path = self.save_path_edit.text().strip()
-            if not save_path:
-                # 如果保存路径为空，使用默认路径
-                save_path = os.path.join(base_dir, "capture")
-                save_path = os.path.abspath(save_path)
-                self.save_path_edit.setText(save_path)
-                print(f"使用默认保存路径: {save_path}")
-            else:
-                # 确保路径是绝对路径
-                save_path = os.path.abspath(save_path)
-
-            full_path = os.path.join(save_path, filename)
-            full_path = os.path.abspath(full_path)  # 确保完整路径是绝对路径
+            self.snap_run = 0
+            self._request_snap(None)
+            return
 
-            print(f"保存抓拍图片到: {full_path}")
+        interval = self.snap_interval_spinBox.value()
+        self.snap_run += 1
+        self.snap_mode = mode
+        self.snap_total = self.snap_count_spinBox.value() if mode == SNAP_BURST else 0
+        self.snap_requested = 0
+        self.snap_saved = 0
+        self.snap_skipped = 0
+        self.snap_in_flight = 0
+        print(
+            f"开始{'连拍' if mode == SNAP_BURST else '定时抓拍'} - "
+            f"间隔: {interval} ms, 张数: {self.snap_total or '不限'}"
+        )
+        self.capture_btn.setText("停止抓拍(Stop)")
+        self.snap_mode_comboBox.setEnabled(False)
+        self._snap_tick()
+        self.snap_timer.start(interval)
+
+    def stop_snapshots(self):
+        """停止连拍/定时抓拍，已发送的请求仍会保存"""
+        if not self.snap_timer.isActive():
+            return
+        self.snap_timer.stop()
+        self.capture_btn.setText("抓拍(Capture)")
+        self.snap_mode_comboBox.setEnabled(True)
+        print(
+            f"抓拍已停止 - 请求: {self.snap_requested}, 已保存: {self.snap_saved}, "
+            f"跳过: {self.snap_skipped}"
+        )
 
-            # 确保保存目录存在
-            os.makedirs(save_path, exist_ok=True)
+    def snap_mode_changed(self):
+        mode = self.snap_mode_comboBox.currentData()
+        self.snap_count_spinBox.setEnabled(mode == SNAP_BURST)
+        self.snap_interval_spinBox.setEnabled(mode != SNAP_SINGLE)
 
-            # 保存图片数据 - 使用更安全的方式
-            pic_buf = cast(pBuf, POINTER(c_ubyte * RevLen)).contents
-            with open(full_path, "wb") as f:
-                f.write(pic_buf)
+    def _snap_tick(self):
+        """定时发送一次抓拍请求(界面线程)"""
+        if not self.playID:
+            self.stop_snapshots()
+            return
+        if self.snap_in_flight >= SNAP_MAX_IN_FLIGHT:
+            # 设备或网络跟不上设定的间隔，跳过本次，不在执行器中堆积请求
+            self.snap_skipped += 1
+            return
+        if not self._request_snap(self.snap_seq + 1):
+            self.snap_skipped += 1
+            return
+        self.snap_seq += 1
+        self.snap_requested += 1
+        if self.snap_total and self.snap_requested >= self.snap_total:
+            self.stop_snapshots()
 
-            success_msg = f"抓拍成功: {filename}"
-            print(success_msg)
-            self.statusbar.showMessage(success_msg)
+    def _request_snap(self, seq) -> bool:
+        """
+        抓拍一张图片：本地抓拍时取最新解码帧交给写入线程编码保存，
+        否则发送设备抓拍请求，保存路径随请求记录，回调中按流水号取回
+        :return: 本地抓拍没有新的解码帧时返回False
+        """
+        stream = self.current_stream
+        if self.local_snap_checkBox.isChecked():
+            if stream is not None and stream.frames is not None:
+                return self._local_snap(stream, seq)
+            if seq is None:
+                print("当前渲染模式没有解码帧，使用设备抓拍")
 
-            # 可选：在界面上显示缩略图
-            try:
-                pixmap = QPixmap(full_path)
-                if not pixmap.isNull() and hasattr(self, "PlayWnd"):
-                    # 在视频窗口的某个角落显示抓拍成功的提示
-                    pass
-            except Exception:
-                pass
+        channel = self.Channel_comboBox.currentIndex()
+        filename = media_filename(
+            "capture", self.IP_lineEdit.text(), channel, "jpg", seq=seq
+        )
+        path = os.path.join(self.snapshot_dir, filename)
+        self.snap_in_flight += 1
+        self.executor.submit(
+            self.session.snap,
+            channel,
+            1,
+            (path, self.snap_run),
+            kind="snap",
+            on_done=lambda result, error: self._on_snap_sent(channel, result, error),
+        )
+        return True
 
-            QMessageBox.information(self, "抓拍成功", f"图片已保存到:\n{full_path}")
+    def _local_snap(self, stream, seq) -> bool:
+        """本地抓拍：复制最新解码帧，JPEG/PNG编码和写盘在写入线程中完成"""
+        frame = stream.frames.latest()
+        if frame is None or (seq is not None and frame.seq == self.local_snap_seq):
+            # 定时抓拍的间隔小于帧间隔时不重复保存同一帧
+            if seq is None:
+                self.statusbar.showMessage("还没有解码帧，请稍后再试")
+            return False
+        self.local_snap_seq = frame.seq
+        ext = self.snap_format_comboBox.currentData()
+        filename = media_filename(
+            "capture", self.IP_lineEdit.text(), stream.channel, ext, seq=seq
+        )
+        path = os.path.join(self.snapshot_dir, filename)
+        if not self.snapshot_writer.submit(frame, path, context=self.snap_run):
+            print(f"抓拍保存队列已满，丢弃图片: {filename}")
+            self.statusbar.showMessage("抓拍保存队列已满")
+        return True
 
-        except Exception as e:
-            error_msg = f"处理抓拍回调失败: {e}"
-            print(error_msg)
-            self.statusbar.showMessage("抓拍保存失败")
-            QMessageBox.warning(self, "抓拍失败", f"保存图片失败: {str(e)}")
+    def _on_snap_sent(self, channel, result, error):
+        """抓拍请求发送完成(界面线程)"""
+        self.snap_in_flight = max(self.snap_in_flight - 1, 0)
+        serial, error_msg = (0, str(error)) if error is not None else result
+        if serial:
+            print(f"抓拍请求已发送 - 通道: {channel}, 流水号: {serial}")
+            if not self.snap_timer.isActive():
+                self.statusbar.showMessage("抓拍请求已发送...")
+            return
+        print(f"抓拍失败: {error_msg}")
+        if self.snap_timer.isActive():
+            self.statusbar.showMessage(f"抓拍失败: {error_msg}")
+        else:
+            QMessageBox.warning(self, "抓拍失败", f"错误: {error_msg}")
+
+    def _snapshot_saved(self, path, size, run, error_msg):
+        """图片写入完成(写入线程)，转到界面线程显示"""
+        self.snapshot_signal.emit(path, size, run, error_msg)
+
+    def handle_snapshot_saved(self, path, size, run, error_msg):
+        """图片保存结果，只更新状态栏，不弹窗"""
+        filename = os.path.basename(path)
+        if error_msg:
+            print(f"抓拍保存失败({filename}): {error_msg}")
+            self.statusbar.showMessage(f"抓拍保存失败: {error_msg}")
+            return
+        print(f"抓拍成功: {path} ({size} 字节)")
+        if not run or run != self.snap_run:
+            self.statusbar.showMessage(f"抓拍成功: {filename}")
+            return
+        self.snap_saved += 1
+        if self.snap_mode == SNAP_BURST:
+            message = f"连拍 {self.snap_saved}/{self.snap_total}: {filename}"
+            if self.snap_saved >= self.snap_total:
+                message = f"连拍完成: {self.snap_saved} 张 - {self.snapshot_dir}"
+        else:
+            message = f"定时抓拍 已保存 {self.snap_saved} 张: {filename}"
+        self.statusbar.showMessage(message)
 
     def toggle_record(self):
         """切换录制状态"""
@@ -806,97 +955,153 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         if not self.verify_save_directory():
             return
 
-        try:
-            print("开始录制...")
-            # 生成录制文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            ip = self.IP_lineEdit.text().replace(".", "_")
-            channel = self.Channel_comboBox.currentIndex()
-            filename = f"record_{ip}_ch{channel}_{timestamp}.dav"
-
-            # 获取保存路径
-            save_path = self.save_path_edit.text().strip()
-            if not save_path:
-                # 如果保存路径为空，使用默认路径
-                save_path = os.path.join(base_dir, "capture")
-                save_path = os.path.abspath(save_path)
-                self.save_path_edit.setText(save_path)
-                print(f"使用默认保存路径: {save_path}")
-            else:
-                # 确保路径是绝对路径
-                save_path = os.path.abspath(save_path)
-
-            full_path = os.path.join(save_path, filename)
-            full_path = os.path.abspath(full_path)
-
-            print(f"录制文件路径: {full_path}")
-            print(f"使用预览ID进行录制: {self.playID}")
-
-            # 确保保存目录存在
-            os.makedirs(save_path, exist_ok=True)
-
-            # 使用预览ID开始保存视频流 - 直接保存当前预览的流
-            self.recordID = self.sdk.StartSaveRealData(
-                self.playID, full_path.encode(), None, None
-            )
+        print("开始录制...")
+        # 生成录制文件名
+        channel = self.preview_channel
+        filename = media_filename("record", self.IP_lineEdit.text(), channel, "dav")
+
+        # 获取保存路径
+        save_path = self.save_path_edit.text().strip()
+        if not save_path:
+            # 如果保存路径为空，使用默认路径
+            save_path = os.path.join(base_dir, "capture")
+            save_path = os.path.abspath(save_path)
+            self.save_path_edit.setText(save_path)
+            print(f"使用默认保存路径: {save_path}")
+        else:
+            # 确保路径是绝对路径
+            save_path = os.path.abspath(save_path)
+
+        full_path = os.path.abspath(os.path.join(save_path, filename))
+
+        print(f"录制文件路径: {full_path}")
+        print(f"使用预览ID进行录制: {self.playID}")
+
+        self.record_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.start_record,
+            channel,
+            full_path,
+            kind="record",
+            on_done=lambda result, error: self._on_record_started(
+                filename, result, error
+            ),
+        )
 
-            if self.recordID != 0:
-                print(f"录制启动成功 - RecordID: {self.recordID}")
-                self.is_recording = True
-                self.record_start_time = time.time()
-                self.record_btn.setText("停止录制(Stop Record)")
-                self.record_status_label.setText("录制状态: 录制中")
-                self.record_status_label.setStyleSheet(
-                    "color: green; font-weight: bold;"
+    def _on_record_started(self, filename, result, error):
+        """开始录制完成(界面线程)"""
+        self.record_btn.setEnabled(bool(self.loginID))
+        success, error_msg = (False, str(error)) if error is not None else result
+        if success:
+            stream = self.current_stream
+            if stream is not None and stream.record_writer is not None:
+                preroll = stream.packets.stats()
+                print(
+                    f"录制启动成功 - 预录 {preroll['buffered_seconds']:.1f} 秒, "
+                    f"缓冲内存 {preroll['memory_bytes'] // 1024} KB"
                 )
+            elif stream is not None:
+                print(f"录制启动成功 - RecordID: {stream.record_id}")
+            self.record_btn.setText("停止录制(Stop Record)")
+            self.record_status_label.setText("录制状态: 录制中")
+            self.record_status_label.setStyleSheet("color: green; font-weight: bold;")
+
+            # 启动计时器
+            self.record_timer.start(1000)  # 每秒更新一次
+
+            if stream is not None and stream.record_path:
+                # 分段录制时文件名带有序号
+                filename = os.path.basename(stream.record_path)
+            success_msg = f"开始录制预览流: {filename}"
+            print(success_msg)
+            self.statusbar.showMessage(success_msg)
+        else:
+            print(f"开始录制失败: {error_msg}")
+            QMessageBox.warning(self, "录制失败", f"开始录制失败: {error_msg}")
 
-                # 启动计时器
-                self.record_timer.start(1000)  # 每秒更新一次
+    def toggle_motion_record(self, checked):
+        """切换动检录制：动检开始时录制当前预览通道，结束后延时关闭"""
+        if not checked:
+            self.stop_motion_record()
+            return
+        if not self.playID:
+            error_msg = "请先开始预览！动检录制需要在预览状态下使用。"
+            print(f"动检录制错误: {error_msg}")
+            QMessageBox.warning(self, "警告", error_msg)
+            self._uncheck_motion_record()
+            return
+        if not self.verify_save_directory():
+            self._uncheck_motion_record()
+            return
 
-                success_msg = f"开始录制预览流: {filename}"
-                print(success_msg)
-                self.statusbar.showMessage(success_msg)
-            else:
-                error_msg = self.sdk.GetLastErrorMessage()
-                print(f"开始录制失败: {error_msg}")
-                QMessageBox.warning(self, "录制失败", f"开始录制失败: {error_msg}")
+        save_path = os.path.abspath(self.save_path_edit.text().strip())
+        config = self.config_manager.get_device_config(self.session.ip) or {}
+        post_roll = float(config.get("post_roll_seconds", DEFAULT_POST_ROLL))
+        self.event_recorder = EventRecorder(
+            self.session,
+            save_path,
+            post_roll=post_roll,
+            channels=[self.preview_channel],
+            auto_preview=False,
+            # 片段的开始/结束必须按顺序执行，不能被取消
+            submit=lambda fn, *args: self.executor.submit(
+                fn, *args, kind="record", cancellable=False
+            ),
+        )
+        # 动检事件来自报警订阅
+        if not self.is_alarm_listening:
+            self.start_alarm_listen()
 
-        except Exception as e:
-            error_msg = f"录制过程出错: {str(e)}"
-            print(error_msg)
-            QMessageBox.warning(self, "错误", error_msg)
+        success_msg = (
+            f"动检录制已开启 - 通道: {self.preview_channel}, 延时: {post_roll}秒"
+        )
+        print(success_msg)
+        self.statusbar.showMessage(success_msg)
+
+    def stop_motion_record(self):
+        """关闭动检录制(正在录制的片段随之关闭)"""
+        event_recorder, self.event_recorder = self.event_recorder, None
+        if event_recorder is not None:
+            event_recorder.stop()
+            print("动检录制已关闭")
+        self._uncheck_motion_record()
+
+    def _uncheck_motion_record(self):
+        self.motion_record_checkBox.blockSignals(True)
+        self.motion_record_checkBox.setChecked(False)
+        self.motion_record_checkBox.blockSignals(False)
 
     def stop_record(self):
         """停止录制"""
-        try:
-            print("停止录制...")
-            if self.recordID != 0:
-                result = self.sdk.StopSaveRealData(self.recordID)
-                if result:
-                    print("录制停止成功")
-                    self.is_recording = False
-                    self.recordID = 0
-                    self.record_btn.setText("开始录制(Start Record)")
-                    self.record_status_label.setText("录制状态: 停止")
-                    self.record_status_label.setStyleSheet(
-                        "color: red; font-weight: bold;"
-                    )
-
-                    # 停止计时器
-                    self.record_timer.stop()
-                    self.record_time_label.setText("录制时间: 00:00:00")
-
-                    self.statusbar.showMessage("录制已停止")
-                    QMessageBox.information(self, "录制完成", "视频录制已完成并保存")
-                else:
-                    error_msg = self.sdk.GetLastErrorMessage()
-                    print(f"停止录制失败: {error_msg}")
-                    QMessageBox.warning(self, "停止录制失败", f"错误: {error_msg}")
+        print("停止录制...")
+        self.record_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.stop_record,
+            self.preview_channel,
+            kind="record",
+            on_done=self._on_record_stopped,
+            cancellable=False,
+        )
 
-        except Exception as e:
-            error_msg = f"停止录制过程出错: {str(e)}"
-            print(error_msg)
-            QMessageBox.warning(self, "错误", error_msg)
+    def _on_record_stopped(self, result, error):
+        """停止录制完成(界面线程)"""
+        self.record_btn.setEnabled(bool(self.loginID))
+        success, error_msg = (False, str(error)) if error is not None else result
+        if success:
+            print("录制停止成功")
+            self.record_btn.setText("开始录制(Start Record)")
+            self.record_status_label.setText("录制状态: 停止")
+            self.record_status_label.setStyleSheet("color: red; font-weight: bold;")
+
+            # 停止计时器
+            self.record_timer.stop()
+            self.record_time_label.setText("录制时间: 00:00:00")
+
+            self.statusbar.showMessage("录制已停止")
+            QMessageBox.information(self, "录制完成", "视频录制已完成并保存")
+        else:
+            print(f"停止录制失败: {error_msg}")
+            QMessageBox.warning(self, "停止录制失败", f"错误: {error_msg}")
 
     def update_record_time(self):
         """更新录制时间显示"""
@@ -918,16 +1123,30 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, "警告", "请先登录设备！")
             return
 
-        try:
-            channel = self.Channel_comboBox.currentIndex()
-            speed = self.ptz_speed_spinBox.value()
+        channel = self.Channel_comboBox.currentIndex()
+        speed = self.ptz_speed_spinBox.value()
+
+        # 根据文档，dwStop 为 True 时表示停止，为 False 时表示开始
+        # 按下与松开在同一个执行器中按顺序执行，保证停止命令在开始命令之后
+        self.executor.submit(
+            self.session.ptz,
+            channel,
+            command,
+            speed,
+            stop,
+            kind="ptz",
+            on_done=self._on_ptz_done,
+        )
 
-            # 根据文档，dwStop 为 True 时表示停止，为 False 时表示开始
-            # param1, param2, param3 在这里分别对应命令、速度等
-            # 对于基础方向控制，param2 是速度
-            self.sdk.PTZControlEx2(self.loginID, channel, command, 0, speed, 0, stop)
-        except Exception as e:
-            print(f"PTZ控制异常: {e}")
+    def _on_ptz_done(self, result, error):
+        """云台控制完成(界面线程)，失败时只在状态栏提示"""
+        if error is not None:
+            print(f"PTZ控制异常: {error}")
+            self.statusbar.showMessage(f"云台控制失败: {error}")
+        elif not result:
+            error_msg = self.sdk.GetLastErrorMessage()
+            print(f"PTZ控制失败: {error_msg}")
+            self.statusbar.showMessage(f"云台控制失败: {error_msg}")
 
     def on_aspect_ratio_changed(self, index):
         """视频比例改变事件"""
@@ -943,46 +1162,162 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         """窗口大小改变事件，确保视频区域正确更新"""
         super().resizeEvent(event)
         if hasattr(self, "PlayWnd"):
+            self.render_size = (self.PlayWnd.width(), self.PlayWnd.height())
             self.PlayWnd.repaint()
 
-    def DisConnectCallBack(self, lLoginID, pchDVRIP, nDVRPort, dwUser):
-        """断线回调函数"""
-        print(
-            f"设备断线回调 - LoginID: {lLoginID}, IP: {pchDVRIP.decode()}, Port: {nDVRPort}"
-        )
-        self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-离线(OffLine)")
-        self.statusbar.showMessage("设备连接断开")
+    def session_disconnected(self, session, ip, port):
+        """断线回调(SDK线程)，由会话转发"""
+        self.connection_signal.emit(False, ip, port)
 
-    def ReConnectCallBack(self, lLoginID, pchDVRIP, nDVRPort, dwUser):
-        """断线重连回调函数"""
-        print(
-            f"设备重连回调 - LoginID: {lLoginID}, IP: {pchDVRIP.decode()}, Port: {nDVRPort}"
+    def session_reconnected(self, session, ip, port):
+        """断线重连回调(SDK线程)，由会话转发"""
+        self.connection_signal.emit(True, ip, port)
+
+    def snapshot_received(self, session, buffer, EncodeType, request):
+        """抓拍回调(SDK线程)：把已复制的图片缓冲区交给写入线程，不经过界面线程"""
+        if request is not None:
+            channel, (path, run) = request
+        else:
+            # 设备未返回流水号时按当前通道命名
+            channel, run = self.preview_channel or 0, 0
+            path = os.path.join(
+                self.snapshot_dir or base_dir,
+                media_filename("capture", session.ip, channel, "jpg"),
+            )
+        if not self.snapshot_writer.submit(buffer, path, context=run):
+            print(f"抓拍保存队列已满，丢弃图片: {os.path.basename(path)}")
+
+    def alarm_received(self, session, event):
+        """报警回调(SDK线程或合并线程)，表格按刷新周期从队列中取出事件"""
+        event_recorder = self.event_recorder
+        if event_recorder is not None:
+            event_recorder.on_alarm(event)
+        # deque.append 在GIL下是原子的，队列满时丢弃最旧的事件
+        self.alarm_events.append(event)
+
+    def export_clip(self):
+        """按时间段导出当前设备通道的录像(后台线程复制，不解码)"""
+        ip = self.IP_lineEdit.text().strip()
+        if not ip:
+            QMessageBox.warning(self, "警告", "请输入设备IP！")
+            return
+        channel = self.Channel_comboBox.currentIndex()
+        start = self.export_start_edit.dateTime().toSecsSinceEpoch()
+        end = self.export_end_edit.dateTime().toSecsSinceEpoch()
+        if end <= start:
+            QMessageBox.warning(self, "警告", "结束时间必须晚于开始时间！")
+            return
+        fmt = self.export_format_comboBox.currentData()
+        save_path = self.save_path_edit.text().strip() or base_dir
+        default_path = os.path.join(save_path, media_filename("clip", ip, channel, fmt))
+        output, _ = QFileDialog.getSaveFileName(
+            self, "导出片段", default_path, f"{fmt.upper()} (*.{fmt})"
+        )
+        if not output:
+            return
+        self.export_btn.setEnabled(False)
+        self.statusbar.showMessage("正在导出片段...")
+        print(f"导出片段: {ip} 通道{channel} {start} - {end} -> {output}")
+        threading.Thread(
+            target=self._export_clip,
+            args=(ip, channel, start, end, output, fmt),
+            name="ClipExport",
+            daemon=True,
+        ).start()
+
+    def _export_clip(self, ip, channel, start, end, output, fmt):
+        try:
+            result, error_msg = export_clip(
+                self.catalog, ip, channel, start, end, output, fmt
+            )
+        except Exception as e:
+            result, error_msg = None, str(e)
+        self.export_signal.emit(result, error_msg)
+
+    def handle_export_done(self, result, error_msg):
+        """片段导出完成(界面线程)"""
+        self.export_btn.setEnabled(True)
+        if result is None:
+            print(f"导出片段失败: {error_msg}")
+            self.statusbar.showMessage("导出片段失败")
+            QMessageBox.warning(self, "导出失败", error_msg)
+            return
+        message = (
+            f"已导出 {result.duration:.0f} 秒 ({result.parts} 个录像文件, "
+            f"{result.bytes / (1024 * 1024):.1f} MB, {result.elapsed:.1f} 秒)"
         )
-        self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-在线(OnLine)")
-        self.statusbar.showMessage("设备重新连接")
+        print(f"导出片段成功: {result.path} - {message}")
+        self.statusbar.showMessage(f"导出片段成功: {os.path.basename(result.path)}")
+        QMessageBox.information(self, "导出成功", f"{message}\n{result.path}")
+
+    def media_closed(self, session, entry):
+        """录像文件关闭(写入线程或执行器线程)，写入索引，需要时提交转MP4"""
+        self.catalog.add_entry(entry)
+        if self.remux_enabled and self.remux is not None:
+            priority = EVENT_PRIORITY.get(entry.get("event"), PRIORITY_NORMAL)
+            self.remux.submit(entry["path"], priority=priority, context=entry)
+
+    def _remux_progress(self, job):
+        """转MP4进度(转换线程)"""
+        name = os.path.basename(job.source)
+        self.remux_signal.emit(f"转MP4: {name} {job.progress * 100:.0f}%")
+
+    def _remux_done(self, job):
+        """转MP4完成(转换线程)，MP4写入索引"""
+        if job.state != JOB_DONE:
+            self.remux_signal.emit(f"转MP4失败: {os.path.basename(job.source)}")
+            return
+        self.catalog.add_entry(
+            dict(
+                job.context,
+                path=job.target,
+                file=os.path.basename(job.target),
+                bytes=job.output_bytes,
+            )
+        )
+        self.remux_signal.emit(f"转MP4完成: {os.path.basename(job.target)}")
+
+    def handle_connection_changed(self, online, ip, port):
+        """处理断线/重连 - 在主线程中执行"""
+        if online:
+            self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-在线(OnLine)")
+            self.statusbar.showMessage("设备重新连接")
+        else:
+            self.setWindowTitle("实时预览与云台控制(RealPlay & PTZ)-离线(OffLine)")
+            self.statusbar.showMessage("设备连接断开")
 
     def closeEvent(self, event):
         """关闭窗口事件，清理资源"""
         try:
-            # 清除全局引用
-            global g_window_instance
-            g_window_instance = None
-
-            # 停止录制
-            if self.is_recording:
-                self.stop_record()
-
-            # 停止预览和登出
-            if self.loginID:
-                if self.playID:
-                    self.sdk.StopRealPlayEx(self.playID)
-                self.sdk.Logout(self.loginID)
+            # 断开会话与窗口的连接，之后的回调不再转发到界面
+            self.session.listener = SessionListener()
 
             # 停止计时器
             if self.record_timer.isActive():
                 self.record_timer.stop()
-
-            self.sdk.Cleanup()
+            self.stop_render()
+            self.snap_timer.stop()
+            self.alarm_timer.stop()
+
+            release_retention(self.retention)
+            release_history(self.alarm_history)
+            if self.remux is not None:
+                # 终止未完成的转换，DAV文件保留
+                self.remux.close(wait=False, timeout=2.0)
+
+            # 关闭动检录制，片段由下面的会话清理一并关闭
+            if self.event_recorder is not None:
+                self.event_recorder.stop()
+                self.event_recorder = None
+
+            # 取消尚未执行的调用，在工作线程中完成清理(停止录制、预览并登出)，不阻塞界面
+            self.executor.cancel_all()
+            self.executor.submit(
+                self.session.close, kind="logout", timeout=0, cancellable=False
+            )
+            self.executor.shutdown(cancel_pending=False)
+            # 写完已收到的抓拍图片
+            self.snapshot_writer.close(timeout=2.0)
         except Exception as e:
             print(f"清理资源时出错: {e}")
         event.accept()
@@ -1007,6 +1342,41 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         except Exception as e:
             print(f"保存配置失败: {e}")
 
+    def apply_device_options(self, ip: str):
+        """把设备配置中的录制选项应用到会话(登录前调用)"""
+        config = self.config_manager.get_device_config(ip) or {}
+        try:
+            self.session.preroll_seconds = float(config.get("preroll_seconds", 0))
+            self.session.segment_seconds = float(config.get("segment_minutes", 0)) * 60
+            self.session.segment_bytes = int(
+                float(config.get("segment_mb", 0)) * 1024 * 1024
+            )
+            self.device_quota = (ip, int(float(config.get("quota_gb", 0)) * GB))
+            self.retention.set_device_quota(*self.device_quota)
+            self.remux_enabled = bool(config.get("remux_mp4", False))
+            self.session.tee_dir = str(config.get("tee_path") or "")
+            self.session.alarm_coalescer.window = float(
+                config.get("alarm_window_seconds", DEFAULT_ALARM_WINDOW)
+            )
+        except (TypeError, ValueError) as e:
+            print(f"录制选项配置无效: {e}")
+            self.session.preroll_seconds = 0.0
+            self.session.segment_seconds = 0.0
+            self.session.segment_bytes = 0
+            self.session.tee_dir = ""
+            self.session.alarm_coalescer.window = DEFAULT_ALARM_WINDOW
+        if self.remux_enabled and self.remux is None:
+            self.remux = RemuxPool(
+                workers=1, on_progress=self._remux_progress, on_done=self._remux_done
+            )
+        if self.session.preroll_seconds > 0:
+            print(f"启用预录: {self.session.preroll_seconds} 秒")
+        if self.session.segment_seconds > 0 or self.session.segment_bytes > 0:
+            print(
+                f"启用录像分段: {self.session.segment_seconds / 60:g} 分钟 / "
+                f"{self.session.segment_bytes // (1024 * 1024)} MB"
+            )
+
     def load_saved_config(self, ip: str):
         """加载保存的配置"""
         try:
@@ -1030,40 +1400,39 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, "警告", error_msg)
             return
 
-        try:
-            print("开始获取设备时间...")
-            device_time = NET_TIME()
-            result = self.sdk.GetDevConfig(
-                self.loginID,
-                int(EM_DEV_CFG_TYPE.TIMECFG),
-                -1,
-                device_time,
-                sizeof(NET_TIME),
-            )
-
-            if result:
-                # 将设备时间显示在界面上
-                qt_datetime = QDateTime(
-                    QDate(device_time.dwYear, device_time.dwMonth, device_time.dwDay),
-                    QTime(
-                        device_time.dwHour, device_time.dwMinute, device_time.dwSecond
-                    ),
-                )
-                self.device_time_edit.setDateTime(qt_datetime)
-                success_msg = (
-                    f"获取设备时间成功: {qt_datetime.toString('yyyy-MM-dd hh:mm:ss')}"
-                )
-                print(success_msg)
-                self.statusbar.showMessage(success_msg)
-            else:
-                error_msg = self.sdk.GetLastErrorMessage()
-                print(f"获取时间失败: {error_msg}")
-                QMessageBox.warning(self, "获取时间失败", f"错误: {error_msg}")
+        print("开始获取设备时间...")
+        self.get_time_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.get_device_time,
+            kind="config",
+            on_done=self._on_device_time_got,
+        )
 
-        except Exception as e:
-            error_msg = f"获取时间过程出错: {str(e)}"
+    def _on_device_time_got(self, result, error):
+        """获取设备时间完成(界面线程)"""
+        self.get_time_btn.setEnabled(bool(self.loginID))
+        if error is not None:
+            error_msg = f"获取时间过程出错: {error}"
             print(error_msg)
             QMessageBox.warning(self, "错误", error_msg)
+            return
+
+        device_time, error_msg = result
+        if device_time is not None:
+            # 将设备时间显示在界面上
+            qt_datetime = QDateTime(
+                QDate(device_time.dwYear, device_time.dwMonth, device_time.dwDay),
+                QTime(device_time.dwHour, device_time.dwMinute, device_time.dwSecond),
+            )
+            self.device_time_edit.setDateTime(qt_datetime)
+            success_msg = (
+                f"获取设备时间成功: {qt_datetime.toString('yyyy-MM-dd hh:mm:ss')}"
+            )
+            print(success_msg)
+            self.statusbar.showMessage(success_msg)
+        else:
+            print(f"获取时间失败: {error_msg}")
+            QMessageBox.warning(self, "获取时间失败", f"错误: {error_msg}")
 
     def set_device_time(self):
         """设置设备时间"""
@@ -1073,49 +1442,51 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, "警告", error_msg)
             return
 
-        try:
-            print("开始设置设备时间...")
-            # 获取界面上的时间
-            qt_datetime = self.device_time_edit.dateTime()
-            qt_date = qt_datetime.date()
-            qt_time = qt_datetime.time()
-
-            # 构造设备时间结构
-            device_time = NET_TIME()
-            device_time.dwYear = qt_date.year()
-            device_time.dwMonth = qt_date.month()
-            device_time.dwDay = qt_date.day()
-            device_time.dwHour = qt_time.hour()
-            device_time.dwMinute = qt_time.minute()
-            device_time.dwSecond = qt_time.second()
-
-            print(f"设置时间为: {qt_datetime.toString('yyyy-MM-dd hh:mm:ss')}")
-
-            # 设置设备时间
-            result = self.sdk.SetDevConfig(
-                self.loginID,
-                int(EM_DEV_CFG_TYPE.TIMECFG),
-                -1,
-                device_time,
-                sizeof(NET_TIME),
-            )
-
-            if result:
-                success_msg = (
-                    f"设置设备时间成功: {qt_datetime.toString('yyyy-MM-dd hh:mm:ss')}"
-                )
-                print(success_msg)
-                self.statusbar.showMessage(success_msg)
-                QMessageBox.information(self, "设置成功", "设备时间设置成功")
-            else:
-                error_msg = self.sdk.GetLastErrorMessage()
-                print(f"设置时间失败: {error_msg}")
-                QMessageBox.warning(self, "设置时间失败", f"错误: {error_msg}")
+        print("开始设置设备时间...")
+        # 获取界面上的时间
+        qt_datetime = self.device_time_edit.dateTime()
+        qt_date = qt_datetime.date()
+        qt_time = qt_datetime.time()
+
+        time_text = qt_datetime.toString("yyyy-MM-dd hh:mm:ss")
+        print(f"设置时间为: {time_text}")
+
+        # 设置设备时间
+        self.set_time_btn.setEnabled(False)
+        self.sync_time_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.set_device_time,
+            qt_date.year(),
+            qt_date.month(),
+            qt_date.day(),
+            qt_time.hour(),
+            qt_time.minute(),
+            qt_time.second(),
+            kind="config",
+            on_done=lambda result, error: self._on_device_time_set(
+                time_text, result, error
+            ),
+        )
 
-        except Exception as e:
-            error_msg = f"设置时间过程出错: {str(e)}"
+    def _on_device_time_set(self, time_text, result, error):
+        """设置设备时间完成(界面线程)"""
+        self.set_time_btn.setEnabled(bool(self.loginID))
+        self.sync_time_btn.setEnabled(bool(self.loginID))
+        if error is not None:
+            error_msg = f"设置时间过程出错: {error}"
             print(error_msg)
             QMessageBox.warning(self, "错误", error_msg)
+            return
+
+        success, error_msg = result
+        if success:
+            success_msg = f"设置设备时间成功: {time_text}"
+            print(success_msg)
+            self.statusbar.showMessage(success_msg)
+            QMessageBox.information(self, "设置成功", "设备时间设置成功")
+        else:
+            print(f"设置时间失败: {error_msg}")
+            QMessageBox.warning(self, "设置时间失败", f"错误: {error_msg}")
 
     def sync_pc_time(self):
         """同步PC时间到设备"""
@@ -1159,38 +1530,41 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         )
 
         if reply == QMessageBox.Yes:
-            try:
-                print("发送设备重启命令...")
-                result = self.sdk.RebootDev(self.loginID)
-                if result:
-                    print("重启命令发送成功")
-                    QMessageBox.information(
-                        self, "重启成功", "设备重启命令发送成功，设备正在重启..."
-                    )
-                    self.statusbar.showMessage("设备重启中...")
-
-                    # 断开连接
-                    if self.playID:
-                        print("停止预览...")
-                        self.sdk.StopRealPlayEx(self.playID)
-                        self.playID = 0
-                        self.play_btn.setText("预览(Play)")
-                        self.PlayWnd.repaint()
-
-                    # 停止录制
-                    if self.is_recording:
-                        print("停止录制...")
-                        self.stop_record()
-
-                else:
-                    error_msg = self.sdk.GetLastErrorMessage()
-                    print(f"重启失败: {error_msg}")
-                    QMessageBox.warning(self, "重启失败", f"错误: {error_msg}")
-
-            except Exception as e:
-                error_msg = f"重启过程出错: {str(e)}"
-                print(error_msg)
-                QMessageBox.warning(self, "错误", error_msg)
+            print("发送设备重启命令...")
+            self.restart_btn.setEnabled(False)
+            self.executor.submit(
+                self.session.reboot,
+                kind="reboot",
+                on_done=self._on_reboot_sent,
+            )
+
+    def _on_reboot_sent(self, result, error):
+        """重启命令发送完成(界面线程)"""
+        self.restart_btn.setEnabled(bool(self.loginID))
+        if error is not None:
+            error_msg = f"重启过程出错: {error}"
+            print(error_msg)
+            QMessageBox.warning(self, "错误", error_msg)
+            return
+
+        success, error_msg = result
+        if success:
+            print("重启命令发送成功")
+            self.statusbar.showMessage("设备重启中...")
+
+            # 断开连接(停止预览前会先停止录制)
+            if self.playID:
+                self.stop_preview()
+            elif self.is_recording:
+                print("停止录制...")
+                self.stop_record()
+
+            QMessageBox.information(
+                self, "重启成功", "设备重启命令发送成功，设备正在重启..."
+            )
+        else:
+            print(f"重启失败: {error_msg}")
+            QMessageBox.warning(self, "重启失败", f"错误: {error_msg}")
 
     def open_log(self):
         """开启SDK日志"""
@@ -1252,58 +1626,65 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, "警告", error_msg)
             return
 
-        try:
-            print("开始报警监听...")
-            result = self.sdk.StartListenEx(self.loginID)
-            if result:
-                self.is_alarm_listening = True
-                self.start_alarm_btn.setEnabled(False)
-                self.stop_alarm_btn.setEnabled(True)
+        print("开始报警监听...")
+        self.start_alarm_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.start_alarm_listen,
+            kind="alarm",
+            on_done=self._on_alarm_listen_started,
+        )
 
-                success_msg = "报警监听已开启"
-                print(success_msg)
-                self.statusbar.showMessage(success_msg)
-                QMessageBox.information(
-                    self, "监听成功", "报警监听已开启，系统将实时显示报警信息"
-                )
-            else:
-                error_msg = self.sdk.GetLastErrorMessage()
-                print(f"开启报警监听失败: {error_msg}")
-                QMessageBox.warning(self, "监听失败", f"开启报警监听失败: {error_msg}")
+    def _on_alarm_listen_started(self, result, error):
+        """开启报警监听完成(界面线程)"""
+        success, error_msg = (False, str(error)) if error is not None else result
+        if success:
+            self.start_alarm_btn.setEnabled(False)
+            self.stop_alarm_btn.setEnabled(True)
 
-        except Exception as e:
-            error_msg = f"报警监听过程出错: {str(e)}"
-            print(error_msg)
-            QMessageBox.warning(self, "错误", error_msg)
+            success_msg = "报警监听已开启"
+            print(success_msg)
+            self.statusbar.showMessage(success_msg)
+            QMessageBox.information(
+                self, "监听成功", "报警监听已开启，系统将实时显示报警信息"
+            )
+        else:
+            self.start_alarm_btn.setEnabled(bool(self.loginID))
+            print(f"开启报警监听失败: {error_msg}")
+            QMessageBox.warning(self, "监听失败", f"开启报警监听失败: {error_msg}")
 
     def stop_alarm_listen(self):
         """停止报警监听"""
         if not self.loginID:
             return
 
-        try:
-            print("停止报警监听...")
-            result = self.sdk.StopListen(self.loginID)
-            if result:
-                self.is_alarm_listening = False
-                self.start_alarm_btn.setEnabled(True)
-                self.stop_alarm_btn.setEnabled(False)
+        print("停止报警监听...")
+        self.stop_alarm_btn.setEnabled(False)
+        self.executor.submit(
+            self.session.stop_alarm_listen,
+            kind="alarm",
+            on_done=self._on_alarm_listen_stopped,
+            cancellable=False,
+        )
 
-                success_msg = "报警监听已停止"
-                print(success_msg)
-                self.statusbar.showMessage(success_msg)
-            else:
-                error_msg = self.sdk.GetLastErrorMessage()
-                print(f"停止报警监听失败: {error_msg}")
+    def _on_alarm_listen_stopped(self, result, error):
+        """停止报警监听完成(界面线程)"""
+        success, error_msg = (False, str(error)) if error is not None else result
+        if success:
+            self.start_alarm_btn.setEnabled(bool(self.loginID))
+            self.stop_alarm_btn.setEnabled(False)
 
-        except Exception as e:
-            error_msg = f"停止报警监听过程出错: {str(e)}"
-            print(error_msg)
+            success_msg = "报警监听已停止"
+            print(success_msg)
+            self.statusbar.showMessage(success_msg)
+        else:
+            self.stop_alarm_btn.setEnabled(self.is_alarm_listening)
+            print(f"停止报警监听失败: {error_msg}")
 
     def clear_alarm_records(self):
-        """清空报警记录"""
+        """清空报警表格(报警历史仍保存在数据库中)"""
         try:
-            self.alarm_tableWidget.setRowCount(0)
+            self.alarm_events.clear()
+            self.alarm_model.clear()
             self.alarm_count = 0
             self.alarm_count_label.setText("报警记录: 0")
             self.statusbar.showMessage("报警记录已清空")
@@ -1311,47 +1692,45 @@ class DahuaCamWindow(QMainWindow, Ui_MainWindow):
         except Exception as e:
             print(f"清空报警记录失败: {e}")
 
-    def handle_alarm_callback(self, lCommand, alarm_info):
-        """处理报警回调 - 在主线程中安全执行"""
+    def drain_alarm_events(self):
+        """把上次刷新以来的报警事件一次加入表格(界面线程定时调用)"""
+        events = []
+        popleft = self.alarm_events.popleft
+        try:
+            for _ in range(len(self.alarm_events)):
+                events.append(popleft())
+        except IndexError:
+            pass
+        suppressed = self.session.alarm_coalescer.suppressed
+        if not events and suppressed == self.alarm_suppressed:
+            return
         try:
-            if lCommand == SDK_ALARM_TYPE.EVENT_MOTIONDETECT:
-                print(f"处理动检报警: {alarm_info.channel_str}")
-
-                # 限制记录数量，超过500条自动清空
-                if self.alarm_count >= 500:
-                    self.clear_alarm_records()
-
-                # 添加新记录到表格
-                row = self.alarm_tableWidget.rowCount()
-                self.alarm_tableWidget.setRowCount(row + 1)
-
-                # 填充数据
-                items = [
-                    str(row + 1),  # 序号
-                    alarm_info.time_str,  # 时间
-                    alarm_info.channel_str,  # 通道
-                    alarm_info.alarm_type,  # 报警类型
-                    alarm_info.status_str,  # 状态
-                ]
-
-                for col, item_text in enumerate(items):
-                    item = QtWidgets.QTableWidgetItem(item_text)
-                    self.alarm_tableWidget.setItem(row, col, item)
-
-                # 更新计数
-                self.alarm_count += 1
-                self.alarm_count_label.setText(f"报警记录: {self.alarm_count}")
-
-                # 滚动到最新记录
-                self.alarm_tableWidget.scrollToBottom()
-
-                # 更新状态栏
-                self.statusbar.showMessage(
-                    f"收到报警: 通道{alarm_info.channel_str} - {alarm_info.status_str}"
+            self.alarm_suppressed = suppressed
+            if events:
+                # 只有原本停在底部时才跟随最新记录，不打断向上翻看
+                scroll_bar = self.alarm_tableView.verticalScrollBar()
+                at_bottom = scroll_bar.value() >= scroll_bar.maximum()
+
+                self.alarm_model.append(events)
+                self.alarm_count += len(events)
+                if at_bottom:
+                    self.alarm_tableView.scrollToBottom()
+
+                event = events[-1]
+                message = (
+                    f"收到报警: {event.type_name} 通道{event.channel_str} - "
+                    f"{event.action_str}"
                 )
-
+                if len(events) > 1:
+                    message += f" (本次 {len(events)} 条)"
+                self.statusbar.showMessage(message)
+
+            text = f"报警记录: {self.alarm_count}"
+            if suppressed:
+                text += f" (已合并 {suppressed} 条重复报警)"
+            self.alarm_count_label.setText(text)
         except Exception as e:
-            print(f"处理报警回调失败: {e}")
+            print(f"处理报警事件失败: {e}")
 
     def generate_rtsp_url(self):
         """生成RTSP URL"""
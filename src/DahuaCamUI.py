@@ -203,12 +203,57 @@ class Ui_MainWindow(object):
         self.capture_btn.setEnabled(False)
         self.record_layout.addWidget(self.capture_btn)
 
+        # 抓拍模式：单张 / 连拍(张数、间隔) / 定时(间隔，直到停止)
+        self.snap_mode_frame = QtWidgets.QFrame()
+        self.snap_mode_layout = QtWidgets.QHBoxLayout(self.snap_mode_frame)
+        self.snap_mode_layout.setContentsMargins(0, 0, 0, 0)
+        self.snap_mode_comboBox = QtWidgets.QComboBox()
+        self.snap_mode_comboBox.addItem("单张(Single)", "single")
+        self.snap_mode_comboBox.addItem("连拍(Burst)", "burst")
+        self.snap_mode_comboBox.addItem("定时(Interval)", "interval")
+        self.snap_mode_layout.addWidget(self.snap_mode_comboBox)
+        self.snap_count_spinBox = QtWidgets.QSpinBox()
+        self.snap_count_spinBox.setRange(2, 1000)
+        self.snap_count_spinBox.setValue(5)
+        self.snap_count_spinBox.setSuffix(" 张")
+        self.snap_count_spinBox.setEnabled(False)
+        self.snap_mode_layout.addWidget(self.snap_count_spinBox)
+        self.snap_interval_spinBox = QtWidgets.QSpinBox()
+        self.snap_interval_spinBox.setRange(20, 3600000)
+        self.snap_interval_spinBox.setSingleStep(100)
+        self.snap_interval_spinBox.setValue(200)
+        self.snap_interval_spinBox.setSuffix(" ms")
+        self.snap_interval_spinBox.setEnabled(False)
+        self.snap_mode_layout.addWidget(self.snap_interval_spinBox)
+        self.record_layout.addWidget(self.snap_mode_frame)
+
+        # 本地抓拍：直接保存预览的最新解码帧(PlaySDK/Software渲染时可用)
+        self.local_snap_frame = QtWidgets.QFrame()
+        self.local_snap_layout = QtWidgets.QHBoxLayout(self.local_snap_frame)
+        self.local_snap_layout.setContentsMargins(0, 0, 0, 0)
+        self.local_snap_checkBox = QtWidgets.QCheckBox("本地抓拍(Local)")
+        self.local_snap_checkBox.setToolTip(
+            "从预览解码帧生成图片，不向设备发送抓拍请求(需要PlaySDK或Software渲染)"
+        )
+        self.local_snap_layout.addWidget(self.local_snap_checkBox)
+        self.snap_format_comboBox = QtWidgets.QComboBox()
+        self.snap_format_comboBox.addItem("JPG", "jpg")
+        self.snap_format_comboBox.addItem("PNG", "png")
+        self.snap_format_comboBox.setEnabled(False)
+        self.local_snap_layout.addWidget(self.snap_format_comboBox)
+        self.local_snap_layout.addStretch()
+        self.record_layout.addWidget(self.local_snap_frame)
+
         # 录制按钮
         self.record_btn = QtWidgets.QPushButton("开始录制(Start Record)")
         self.record_btn.setMinimumSize(QtCore.QSize(100, 32))
         self.record_btn.setEnabled(False)
         self.record_layout.addWidget(self.record_btn)
 
+        # 动检录制开关
+        self.motion_record_checkBox = QtWidgets.QCheckBox("动检录制(Motion Record)")
+        self.record_layout.addWidget(self.motion_record_checkBox)
+
         # 录制状态标签
         self.record_status_label = QtWidgets.QLabel("录制状态: 停止")
         self.record_status_label.setStyleSheet(
@@ -375,6 +420,45 @@ class Ui_MainWindow(object):
         self.rtsp_layout.addWidget(self.ffmpeg_generator_btn)
 
         self.system_layout.addWidget(self.rtsp_groupBox)
+
+        # 录像片段导出区域
+        self.export_groupBox = QtWidgets.QGroupBox("录像导出(Clip Export)")
+        self.export_layout = QtWidgets.QVBoxLayout(self.export_groupBox)
+
+        self.export_start_layout = QtWidgets.QHBoxLayout()
+        self.export_start_label = QtWidgets.QLabel("开始:")
+        self.export_start_layout.addWidget(self.export_start_label)
+        self.export_start_edit = QtWidgets.QDateTimeEdit()
+        self.export_start_edit.setDisplayFormat("yyyy-MM-dd hh:mm:ss")
+        self.export_start_edit.setMinimumWidth(150)
+        self.export_start_layout.addWidget(self.export_start_edit)
+        self.export_layout.addLayout(self.export_start_layout)
+
+        self.export_end_layout = QtWidgets.QHBoxLayout()
+        self.export_end_label = QtWidgets.QLabel("结束:")
+        self.export_end_layout.addWidget(self.export_end_label)
+        self.export_end_edit = QtWidgets.QDateTimeEdit()
+        self.export_end_edit.setDisplayFormat("yyyy-MM-dd hh:mm:ss")
+        self.export_end_edit.setMinimumWidth(150)
+        self.export_end_layout.addWidget(self.export_end_edit)
+        self.export_layout.addLayout(self.export_end_layout)
+
+        self.export_format_layout = QtWidgets.QHBoxLayout()
+        self.export_format_label = QtWidgets.QLabel("格式:")
+        self.export_format_layout.addWidget(self.export_format_label)
+        self.export_format_comboBox = QtWidgets.QComboBox()
+        self.export_format_comboBox.addItem("DAV", "dav")
+        self.export_format_comboBox.addItem("MP4", "mp4")
+        self.export_format_comboBox.setMaximumWidth(80)
+        self.export_format_layout.addWidget(self.export_format_comboBox)
+        self.export_format_layout.addStretch()
+        self.export_layout.addLayout(self.export_format_layout)
+
+        self.export_btn = QtWidgets.QPushButton("导出片段(Export Clip)")
+        self.export_btn.setMinimumSize(QtCore.QSize(100, 30))
+        self.export_layout.addWidget(self.export_btn)
+
+        self.system_layout.addWidget(self.export_groupBox)
         self.system_layout.addStretch()
 
         # 添加系统设置组到右侧第二列
@@ -414,35 +498,26 @@ class Ui_MainWindow(object):
 
         self.alarm_layout.addLayout(self.alarm_control_layout)
 
-        # 报警列表表格
-        self.alarm_tableWidget = QtWidgets.QTableWidget()
-        self.alarm_tableWidget.setColumnCount(5)
-        self.alarm_tableWidget.setRowCount(0)
-
-        # 设置表头
-        alarm_headers = [
-            "序号(No.)",
-            "时间(Time)",
-            "通道(Channel)",
-            "报警类型(Alarm Type)",
-            "状态(Status)",
-        ]
-
-        for i, header in enumerate(alarm_headers):
-            item = QtWidgets.QTableWidgetItem(header)
-            self.alarm_tableWidget.setHorizontalHeaderItem(i, item)
+        # 报警列表(表头和数据由 AlarmTableModel 提供)
+        self.alarm_tableView = QtWidgets.QTableView()
 
         # 设置表格属性
-        self.alarm_tableWidget.horizontalHeader().setDefaultSectionSize(150)
-        self.alarm_tableWidget.horizontalHeader().setMinimumSectionSize(80)
-        self.alarm_tableWidget.verticalHeader().setVisible(False)
-        self.alarm_tableWidget.setAlternatingRowColors(True)
-        self.alarm_tableWidget.setSelectionBehavior(
+        self.alarm_tableView.horizontalHeader().setDefaultSectionSize(150)
+        self.alarm_tableView.horizontalHeader().setMinimumSectionSize(80)
+        self.alarm_tableView.verticalHeader().setVisible(False)
+        # 固定行高，滚动时不需要计算每行的高度
+        self.alarm_tableView.verticalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.Fixed
+        )
+        self.alarm_tableView.verticalHeader().setDefaultSectionSize(24)
+        self.alarm_tableView.setAlternatingRowColors(True)
+        self.alarm_tableView.setSelectionBehavior(
             QtWidgets.QAbstractItemView.SelectRows
         )
-        self.alarm_tableWidget.setMaximumHeight(200)
+        self.alarm_tableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.alarm_tableView.setMaximumHeight(200)
 
-        self.alarm_layout.addWidget(self.alarm_tableWidget)
+        self.alarm_layout.addWidget(self.alarm_tableView)
 
         # 将报警监听区域添加到主垂直布局
         self.left_layout.addWidget(self.alarm_groupBox)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+报警事件合并(去抖)
+
+动检等报警会在短时间内反复产生 开始/脉冲/结束 事件，AlarmCoalescer 按
+(设备IP, 报警类型, 通道) 合并后再交给下游(动检录制、界面、报警历史)：
+
+- 开始: 通道已处于报警中时丢弃，否则立即发出
+- 结束: 暂存 window 秒，期间同一通道再次开始则丢弃这一对结束/开始，
+  前后两段合并为一个区间；到期后发出暂存的结束事件(时间不变)
+- 脉冲: 通道处于报警中，或距上次发出的脉冲不足 window 秒时丢弃
+- 没有对应开始的重复结束事件丢弃，其他动作原样发出
+
+window 为0时不合并，事件直接发出。到期的结束事件由合并线程发出，
+发出事件时持有锁，同一通道的开始/结束在下游的顺序与合并结果一致。
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from alarm_events import ACTION_PULSE, ACTION_START, ACTION_STOP, AlarmEvent
+
+DEFAULT_WINDOW = 1.0  # 合并窗口(秒)
+
+
+class _ChannelState:
+    """一个 (IP, 报警类型, 通道) 的合并状态"""
+
+    __slots__ = ("active", "stop", "stop_at", "last_pulse_ms")
+
+    def __init__(self):
+        self.active = False  # 已发出开始、尚未发出结束
+        self.stop: Optional[AlarmEvent] = None  # 暂存的结束事件
+        self.stop_at = 0.0  # 暂存的结束事件的发出时间(monotonic)
+        self.last_pulse_ms = None  # 最近发出的脉冲事件时间
+
+
+class AlarmCoalescer:
+    """按设备和通道合并报警事件，结果通过 emit(events) 交给下游"""
+
+    def __init__(
+        self,
+        emit: Callable[[List[AlarmEvent]], None],
+        window: float = DEFAULT_WINDOW,
+        name: str = "AlarmCoalescer",
+    ):
+        """
+        :param emit: 接收合并后的事件列表，在发布线程或合并线程中调用
+        :param window: 合并窗口(秒)，0表示不合并，对之后收到的事件生效
+        """
+        self.emit = emit
+        self.window = window
+        self.name = name
+        self._states: Dict[Tuple[str, int, int], _ChannelState] = {}
+        self._pending = 0  # 暂存的结束事件数
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+        self.received = 0
+        self.emitted = 0
+        self.suppressed = 0  # 丢弃的事件数
+        self.merged = 0  # 合并到前一区间的 结束/开始 对数
+
+    # ------------------------------------------------------------------
+    # 线程
+    # ------------------------------------------------------------------
+    def start(self):
+        """启动合并线程(发出到期的结束事件)"""
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._wakeup.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 2.0):
+        """停止合并线程，立即发出所有暂存的结束事件，之后的事件不再合并"""
+        thread, self._thread = self._thread, None
+        self._stopped = True
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        with self._lock:
+            self._deliver(self._expire(None))
+            self._states.clear()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self._next_timeout())
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            with self._lock:
+                self._deliver(self._expire(time.monotonic()))
+
+    def _next_timeout(self) -> Optional[float]:
+        with self._lock:
+            if not self._pending:
+                return None
+            deadline = min(
+                s.stop_at for s in self._states.values() if s.stop is not None
+            )
+        return max(deadline - time.monotonic(), 0.0)
+
+    # ------------------------------------------------------------------
+    # 合并
+    # ------------------------------------------------------------------
+    def publish(self, events: Iterable[AlarmEvent]):
+        """合并一批事件(SDK线程)，需要立即发出的事件交给 emit"""
+        if self.window <= 0 or self._stopped:
+            events = list(events)
+            self.received += len(events)
+            self._deliver(events)
+            return
+        with self._lock:
+            output = []
+            for event in events:
+                self.received += 1
+                result = self._offer(event)
+                if result:
+                    output.append(event)
+                elif result is not None:
+                    self.suppressed += 1
+            self._deliver(output)
+
+    def _offer(self, event: AlarmEvent) -> Optional[bool]:
+        """处理一个事件，返回是否立即发出，暂存时返回None"""
+        action = event.action
+        key = (event.ip, event.command, event.channel)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _ChannelState()
+            if action == ACTION_STOP:
+                # 开始发生在监听之前，结束事件照常发出
+                return True
+
+        if action == ACTION_START:
+            if state.stop is not None:
+                # 结束后很快再次开始：继续原区间
+                state.stop = None
+                self._pending -= 1
+                self.merged += 1
+                self.suppressed += 1  # 暂存的结束事件也不再发出
+                return False
+            if state.active:
+                return False
+            state.active = True
+            return True
+
+        if action == ACTION_STOP:
+            if not state.active or state.stop is not None:
+                return False
+            state.stop = event
+            state.stop_at = time.monotonic() + self.window
+            self._pending += 1
+            self._wakeup.set()
+            return None
+
+        if action == ACTION_PULSE:
+            if state.active:
+                return False
+            last = state.last_pulse_ms
+            if last is not None and event.time_ms - last < self.window * 1000:
+                return False
+            state.last_pulse_ms = event.time_ms
+            return True
+
+        return True
+
+    def _expire(self, now: Optional[float]) -> List[AlarmEvent]:
+        """取出到期(now为None时全部)的结束事件，按时间排序"""
+        if not self._pending:
+            return []
+        expired = []
+        for state in self._states.values():
+            if state.stop is not None and (now is None or state.stop_at <= now):
+                expired.append(state.stop)
+                state.stop = None
+                state.active = False
+                self._pending -= 1
+        expired.sort(key=lambda e: e.time_ms)
+        return expired
+
+    def _deliver(self, events: List[AlarmEvent]):
+        if not events:
+            return
+        self.emitted += len(events)
+        try:
+            self.emit(events)
+        except Exception as e:
+            print(f"报警合并输出错误: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "received": self.received,
+            "emitted": self.emitted,
+            "suppressed": self.suppressed,
+            "merged": self.merged,
+            "pending": self._pending,
+        }
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+报警事件解码与分发
+
+AlarmCallback(SDK线程)按报警类型查表解码为紧凑的 AlarmEvent(元组)，
+事件中只有整数和会话已有的IP字符串，时间为接收时刻的Unix毫秒数，
+显示用的时间、类型和状态文字在读取属性时才生成，回调中不做字符串处理。
+
+解码表按 SDK_ALARM_TYPE 成员名和 SDK_Struct 结构体名用 getattr 解析，
+当前NetSDK版本中不存在的类型或结构体自动跳过；表中没有的报警类型也会生成事件
+(通道为-1)，名称取自枚举成员名。
+
+AlarmBus 把事件分发给订阅者：每个订阅者一个有上限的 deque，
+append/popleft 在GIL下是原子的，发布端不加锁、不等待读者，读者跟不上时丢弃最旧的事件。
+"""
+
+import threading
+import time
+from collections import deque
+from ctypes import POINTER, cast, sizeof, string_at
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    from NetSDK import SDK_Struct
+    from NetSDK.SDK_Enum import SDK_ALARM_TYPE
+except ImportError:
+    # 未安装NetSDK时(模拟器后端)只能解码模拟器产生的报警类型
+    from fake_sdk import SDK_ALARM_TYPE, SDK_Struct
+
+# 事件动作(与 nEventAction 一致)
+ACTION_UNKNOWN = -1
+ACTION_PULSE = 0
+ACTION_START = 1
+ACTION_STOP = 2
+
+ACTION_NAMES = {
+    ACTION_PULSE: "脉冲(Pulse)",
+    ACTION_START: "开始(Start)",
+    ACTION_STOP: "结束(Stop)",
+}
+
+DEFAULT_QUEUE_SIZE = 10000  # 每个订阅者缓存的事件数上限
+
+# 解码方式
+_STATES = "states"  # 每通道一个字节的报警状态数组，按状态变化生成开始/结束事件
+_FLAG = "flag"  # 设备级报警，第一个字节非0表示开始
+
+# SDK_ALARM_TYPE 成员名 -> (显示名称, 结构体名或解码方式)
+ALARM_TYPES = {
+    "EVENT_MOTIONDETECT": ("动检事件(VideoMotion)", "ALARM_MOTIONDETECT_INFO"),
+    "EVENT_VIDEOBLIND": ("视频遮挡(VideoBlind)", "ALARM_VIDEOBLIND_INFO"),
+    "EVENT_VIDEOLOST": ("视频丢失(VideoLoss)", "ALARM_VIDEOLOST_INFO"),
+    "EVENT_VIDEOABNORMALDETECTION": (
+        "视频异常(VideoAbnormal)",
+        "ALARM_VIDEOABNORMAL_DETECTION_INFO",
+    ),
+    "ALARM_ALARM_EX2": ("本地报警(LocalAlarm)", "ALARM_ALARM_INFO_EX2"),
+    "ALARM_STORAGE_FAILURE_EX": (
+        "存储错误(StorageFailure)",
+        "ALARM_STORAGE_FAILURE_EX",
+    ),
+    "ALARM_STORAGE_LOW_SPACE": (
+        "存储空间不足(LowSpace)",
+        "ALARM_STORAGE_LOW_SPACE_INFO",
+    ),
+    "ALARM_ALARM_EX": ("外部报警(Alarm)", _STATES),
+    "MOTION_ALARM_EX": ("动检报警(Motion)", _STATES),
+    "VIDEOLOST_ALARM_EX": ("视频丢失(VideoLost)", _STATES),
+    "SHELTER_ALARM_EX": ("视频遮挡(Shelter)", _STATES),
+    "SOUND_DETECT_ALARM_EX": ("音频检测(SoundDetect)", _STATES),
+    "DISKFULL_ALARM_EX": ("硬盘满(DiskFull)", _FLAG),
+    "URGENCY_ALARM_EX": ("紧急报警(Urgency)", _FLAG),
+}
+
+# 动检类报警(开始/结束动作与 EVENT_MOTIONDETECT 一致)
+MOTION_COMMANDS = frozenset(
+    int(getattr(SDK_ALARM_TYPE, name))
+    for name in ("EVENT_MOTIONDETECT", "MOTION_ALARM_EX")
+    if hasattr(SDK_ALARM_TYPE, name)
+)
+
+_CHANNEL_FIELDS = ("nChannelID", "nChannel", "nChannelId")
+_ACTION_FIELDS = ("nEventAction", "nAction")
+
+
+class AlarmEvent(NamedTuple):
+    """一条报警事件"""
+
+    ip: str
+    command: int  # SDK_ALARM_TYPE
+    channel: int  # -1表示设备级事件
+    action: int  # ACTION_*
+    time_ms: int  # 接收时间(Unix毫秒)
+    event_id: int
+
+    @property
+    def timestamp(self) -> float:
+        return self.time_ms / 1000.0
+
+    @property
+    def time_str(self) -> str:
+        return datetime.fromtimestamp(self.time_ms / 1000.0).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+
+    @property
+    def type_name(self) -> str:
+        return alarm_type_name(self.command)
+
+    @property
+    def action_str(self) -> str:
+        return ACTION_NAMES.get(self.action, "未知(Unknown)")
+
+    @property
+    def channel_str(self) -> str:
+        return str(self.channel) if self.channel >= 0 else "-"
+
+
+def _enum_members() -> Dict[int, str]:
+    """SDK_ALARM_TYPE 的 值 -> 成员名"""
+    members = getattr(SDK_ALARM_TYPE, "__members__", None)
+    if members is None:
+        members = {
+            k: v for k, v in vars(SDK_ALARM_TYPE).items() if not k.startswith("_")
+        }
+    names = {}
+    for name, value in members.items():
+        try:
+            names.setdefault(int(value), name)
+        except (TypeError, ValueError):
+            continue
+    return names
+
+
+_ENUM_NAMES = _enum_members()
+_TYPE_NAMES: Dict[int, str] = {}
+
+
+def alarm_type_name(command: int) -> str:
+    """报警类型的显示名称"""
+    name = _TYPE_NAMES.get(command)
+    if name is None:
+        name = _ENUM_NAMES.get(command) or f"0x{command:04x}"
+    return name
+
+
+def _field(struct, candidates) -> Optional[str]:
+    names = {f[0] for f in getattr(struct, "_fields_", ())}
+    for candidate in candidates:
+        if candidate in names:
+            return candidate
+    return None
+
+
+def _struct_decoder(struct):
+    """按结构体读取通道和事件动作"""
+    pointer_type = POINTER(struct)
+    size = sizeof(struct)
+    channel_field = _field(struct, _CHANNEL_FIELDS)
+    action_field = _field(struct, _ACTION_FIELDS)
+
+    def decode(ip, command, buf, length, event_id, time_ms, states):
+        if length < size:
+            return (AlarmEvent(ip, command, -1, ACTION_UNKNOWN, time_ms, event_id),)
+        info = cast(buf, pointer_type).contents
+        channel = getattr(info, channel_field) if channel_field else -1
+        action = getattr(info, action_field) if action_field else ACTION_PULSE
+        return (AlarmEvent(ip, command, channel, action, time_ms, event_id),)
+
+    return decode
+
+
+def _decode_states(ip, command, buf, length, event_id, time_ms, states):
+    """每通道一个字节的状态数组，只为状态变化的通道生成事件"""
+    current = string_at(buf, length) if length > 0 else b""
+    previous = states.get(command, b"")
+    states[command] = current
+    if current == previous:
+        return ()
+    events = []
+    for channel in range(max(len(current), len(previous))):
+        now = channel < len(current) and current[channel] != 0
+        before = channel < len(previous) and previous[channel] != 0
+        if now != before:
+            action = ACTION_START if now else ACTION_STOP
+            events.append(AlarmEvent(ip, command, channel, action, time_ms, event_id))
+    return events
+
+
+def _decode_flag(ip, command, buf, length, event_id, time_ms, states):
+    action = ACTION_UNKNOWN
+    if length > 0:
+        action = ACTION_START if string_at(buf, 1) != b"\x00" else ACTION_STOP
+    return (AlarmEvent(ip, command, -1, action, time_ms, event_id),)
+
+
+def _decode_unknown(ip, command, buf, length, event_id, time_ms, states):
+    return (AlarmEvent(ip, command, -1, ACTION_UNKNOWN, time_ms, event_id),)
+
+
+def _build_decoders() -> Dict[int, Callable]:
+    decoders = {}
+    for type_name, (label, spec) in ALARM_TYPES.items():
+        command = getattr(SDK_ALARM_TYPE, type_name, None)
+        if command is None:
+            continue
+        command = int(command)
+        _TYPE_NAMES[command] = label
+        if spec == _STATES:
+            decoders[command] = _decode_states
+        elif spec == _FLAG:
+            decoders[command] = _decode_flag
+        else:
+            struct = getattr(SDK_Struct, spec, None)
+            decoders[command] = (
+                _struct_decoder(struct) if struct is not None else _decode_unknown
+            )
+    return decoders
+
+
+_DECODERS = _build_decoders()
+
+
+def decode_alarm(
+    ip: str,
+    command: int,
+    buf,
+    length: int,
+    states: Dict[int, bytes],
+    event_id: int = 0,
+) -> Iterable[AlarmEvent]:
+    """
+    解码一次报警回调(SDK线程)，可能生成0个或多个事件
+    :param states: 该设备各报警类型上次收到的通道状态(报警类型 -> 状态数组)，
+        由会话持有，重新开始监听时清空
+    """
+    time_ms = time.time_ns() // 1000000
+    decoder = _DECODERS.get(command, _decode_unknown)
+    return decoder(ip, command, buf, length, event_id, time_ms, states)
+
+
+def supported_commands() -> List[int]:
+    """解码表中的报警类型"""
+    return list(_DECODERS)
+
+
+class AlarmSubscription:
+    """一个订阅者的事件队列"""
+
+    def __init__(
+        self,
+        bus: "AlarmBus",
+        maxlen: int,
+        commands=None,
+        callback: Optional[Callable[[AlarmEvent], None]] = None,
+    ):
+        """
+        :param commands: 只接收这些报警类型，None表示全部
+        :param callback: 设置后在发布线程(SDK线程)中直接调用，不进入队列
+        """
+        self.bus = bus
+        self.commands = frozenset(commands) if commands is not None else None
+        self.callback = callback
+        self.maxlen = maxlen
+        self.received = 0
+        self.dropped = 0  # 队列满时丢弃的旧事件数
+        self._queue = deque(maxlen=maxlen)
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def _offer(self, event: AlarmEvent):
+        if self.commands is not None and event.command not in self.commands:
+            return
+        self.received += 1
+        if self.callback is not None:
+            try:
+                self.callback(event)
+            except Exception as e:
+                print(f"报警订阅回调错误: {e}")
+            return
+        if len(self._queue) >= self.maxlen:
+            self.dropped += 1
+        self._queue.append(event)
+
+    def poll(self, max_events: int = 0) -> List[AlarmEvent]:
+        """取出队列中的事件(不阻塞)，max_events为0表示全部"""
+        events = []
+        popleft = self._queue.popleft
+        count = max_events or len(self._queue)
+        try:
+            for _ in range(count):
+                events.append(popleft())
+        except IndexError:
+            pass
+        return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+class AlarmBus:
+    """报警事件分发(一个或多个发布线程，多个订阅者)"""
+
+    def __init__(self):
+        self._subscriptions: Tuple[AlarmSubscription, ...] = ()
+        self._lock = threading.Lock()  # 只用于修改订阅者列表
+        self.published = 0
+
+    def subscribe(
+        self,
+        maxlen: int = DEFAULT_QUEUE_SIZE,
+        commands=None,
+        callback: Optional[Callable[[AlarmEvent], None]] = None,
+    ) -> AlarmSubscription:
+        subscription = AlarmSubscription(self, maxlen, commands, callback)
+        with self._lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: AlarmSubscription):
+        with self._lock:
+            self._subscriptions = tuple(
+                s for s in self._subscriptions if s is not subscription
+            )
+
+    def publish(self, events: Iterable[AlarmEvent]):
+        """发布事件(SDK线程)，订阅者列表为不可变元组，发布时不加锁"""
+        subscriptions = self._subscriptions
+        for event in events:
+            self.published += 1
+            for subscription in subscriptions:
+                subscription._offer(event)
+
+
+# 进程内唯一的报警事件总线
+alarm_bus = AlarmBus()
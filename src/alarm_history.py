@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报警历史(SQLite)
+
+订阅报警事件总线(alarm_bus)，由后台线程把事件批量写入数据库(WAL模式)，
+每批一个事务，SDK线程和界面线程都不等待写入。
+按 (ip, channel, time)、(ip, time)、(command, time) 和 time 建索引，
+按设备、通道、类型和时间段查询只扫描索引范围，界面不需要在内存中保留全部记录。
+一个进程中的多个摄像机窗口通过 acquire_history/release_history 共享同一个写入器
+(引用计数)，每个事件只写入一次。
+
+示例:
+    python src/alarm_history.py --db alarm_history.db query --ip 192.168.1.108 \\
+        --channel 2 --type EVENT_MOTIONDETECT --from "2023-12-11 20:00" --to "2023-12-12 06:00"
+    python src/alarm_history.py prune --before "2023-11-01"
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from NetSDK.SDK_Enum import SDK_ALARM_TYPE
+except ImportError:
+    # 未安装NetSDK时(模拟器后端)使用模拟器提供的报警类型
+    from fake_sdk import SDK_ALARM_TYPE
+
+from alarm_events import AlarmBus, AlarmEvent, alarm_bus
+from media_catalog import parse_time
+
+HISTORY_NAME = "alarm_history.db"
+
+DEFAULT_FLUSH_INTERVAL = 0.5  # 写入间隔(秒)
+DEFAULT_BATCH_SIZE = 5000  # 每个事务最多写入的事件数
+DEFAULT_QUEUE_SIZE = 200000  # 等待写入的事件数上限，超过时丢弃最旧的事件
+PRUNE_INTERVAL = 3600.0  # 按保留期限清理的间隔(秒)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alarms (
+    id INTEGER PRIMARY KEY,
+    ip TEXT NOT NULL,
+    command INTEGER NOT NULL,
+    channel INTEGER NOT NULL,
+    action INTEGER NOT NULL,
+    time_ms INTEGER NOT NULL,
+    event_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_alarms_device_time ON alarms(ip, channel, time_ms);
+CREATE INDEX IF NOT EXISTS idx_alarms_ip_time ON alarms(ip, time_ms);
+CREATE INDEX IF NOT EXISTS idx_alarms_type_time ON alarms(command, time_ms);
+CREATE INDEX IF NOT EXISTS idx_alarms_time ON alarms(time_ms);
+"""
+
+_COLUMNS = "ip, command, channel, action, time_ms, event_id"
+
+
+def parse_alarm_type(text: str) -> int:
+    """解析报警类型: SDK_ALARM_TYPE 成员名或数值(支持0x前缀)"""
+    value = getattr(SDK_ALARM_TYPE, text, None)
+    if value is not None:
+        return int(value)
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"未知的报警类型: {text}")
+
+
+class AlarmHistory:
+    """报警历史数据库，线程安全"""
+
+    def __init__(
+        self,
+        db_path: str = HISTORY_NAME,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_age: float = 0.0,
+    ):
+        """
+        :param max_age: 保留时间(秒)，0表示不删除
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_age = max_age
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.last_batch_seconds = 0.0
+        self._last_prune = 0.0
+
+        self._subscription = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def start(self, bus: AlarmBus = alarm_bus, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """订阅报警事件总线并启动写入线程"""
+        if self._thread is not None:
+            return
+        self._subscription = bus.subscribe(maxlen=queue_size)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="AlarmHistory", daemon=True
+        )
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """写完已收到的事件后关闭数据库"""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join(timeout)
+            self._thread = None
+        if self._subscription is not None:
+            self._subscription.close()
+            self.flush()
+            self._subscription = None
+        with self._lock:
+            self._conn.close()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.max_age > 0:
+                    now = time.time()
+                    if now - self._last_prune >= PRUNE_INTERVAL:
+                        self._last_prune = now
+                        self.prune(now - self.max_age)
+            except Exception as e:
+                print(f"写入报警历史出错: {e}")
+        self.flush()
+
+    def flush(self) -> int:
+        """把订阅队列中的事件写入数据库，返回写入数量"""
+        subscription = self._subscription
+        if subscription is None:
+            return 0
+        total = 0
+        while True:
+            events = subscription.poll(self.batch_size)
+            if not events:
+                return total
+            self.add(events)
+            total += len(events)
+
+    def add(self, events: Sequence[AlarmEvent]):
+        """批量写入事件(一个事务)"""
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                self._conn.executemany(
+                    f"INSERT INTO alarms ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                    events,
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            print(f"写入报警历史失败({len(events)} 条): {e}")
+            return
+        self.written += len(events)
+        self.batches += 1
+        self.last_batch_seconds = time.perf_counter() - started
+
+    def prune(self, before: float) -> int:
+        """删除 before(Unix时间)之前的事件，返回删除数量"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM alarms WHERE time_ms < ?", (int(before * 1000),)
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            print(f"已清理 {cursor.rowcount} 条报警历史")
+        return cursor.rowcount
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _where(
+        ip: Optional[str],
+        channel: Optional[int],
+        commands: Optional[Iterable[int]],
+        action: Optional[int],
+        start: Optional[float],
+        end: Optional[float],
+    ) -> Tuple[str, list]:
+        where, params = [], []
+        if ip is not None:
+            where.append("ip = ?")
+            params.append(ip)
+        if channel is not None:
+            where.append("channel = ?")
+            params.append(channel)
+        if commands is not None:
+            commands = list(commands)
+            where.append(f"command IN ({', '.join('?' * len(commands))})")
+            params.extend(commands)
+        if action is not None:
+            where.append("action = ?")
+            params.append(action)
+        if start is not None:
+            where.append("time_ms >= ?")
+            params.append(int(start * 1000))
+        if end is not None:
+            where.append("time_ms < ?")
+            params.append(int(end * 1000))
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def query(
+        self,
+        ip: Optional[str] = None,
+        channel: Optional[int] = None,
+        commands: Optional[Iterable[int]] = None,
+        action: Optional[int] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False,
+    ) -> List[AlarmEvent]:
+        """
+        查询时间段 [start, end) 内的事件，按时间排序
+        :param commands: 报警类型(SDK_ALARM_TYPE)，None表示全部
+        """
+        where, params = self._where(ip, channel, commands, action, start, end)
+        sql = f"SELECT {_COLUMNS} FROM alarms{where} ORDER BY time_ms"
+        if newest_first:
+            sql += " DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [AlarmEvent(*row) for row in rows]
+
+    def count(
+        self,
+        ip: Optional[str] = None,
+        channel: Optional[int] = None,
+        commands: Optional[Iterable[int]] = None,
+        action: Optional[int] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> int:
+        where, params = self._where(ip, channel, commands, action, start, end)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM alarms{where}", params
+            ).fetchone()
+        return row[0]
+
+    def stats(self) -> dict:
+        subscription = self._subscription
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "last_batch_seconds": self.last_batch_seconds,
+            "pending": subscription.pending if subscription else 0,
+            "dropped": subscription.dropped if subscription else 0,
+        }
+
+
+_shared_lock = threading.Lock()
+_shared: Dict[str, List] = {}  # 数据库路径 -> [AlarmHistory, 引用数]
+
+
+def acquire_history(db_path: str = HISTORY_NAME) -> AlarmHistory:
+    """获取进程内共享的报警历史(按数据库路径引用计数)，首次获取时订阅总线并启动写入"""
+    db_path = os.path.abspath(db_path)
+    with _shared_lock:
+        entry = _shared.get(db_path)
+        if entry is None:
+            history = AlarmHistory(db_path)
+            history.start()
+            entry = _shared[db_path] = [history, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def release_history(history: AlarmHistory):
+    """释放共享的报警历史，最后一个使用者释放时写完并关闭"""
+    with _shared_lock:
+        entry = _shared.get(history.db_path)
+        if entry is None or entry[0] is not history:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _shared[history.db_path]
+    history.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="报警历史查询")
+    parser.add_argument("--db", default=HISTORY_NAME, help="报警历史数据库")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    query = commands.add_parser("query", help="按设备、类型和时间段查询")
+    query.add_argument("--ip")
+    query.add_argument("--channel", type=int)
+    query.add_argument(
+        "--type",
+        dest="types",
+        type=parse_alarm_type,
+        action="append",
+        help="报警类型(SDK_ALARM_TYPE成员名或数值)，可重复",
+    )
+    query.add_argument("--action", type=int, help="0脉冲 1开始 2结束")
+    query.add_argument("--from", dest="start", type=parse_time)
+    query.add_argument("--to", dest="end", type=parse_time)
+    query.add_argument("--limit", type=int, default=1000)
+    query.add_argument("--count", action="store_true", help="只输出数量")
+
+    prune = commands.add_parser("prune", help="删除指定时间之前的记录")
+    prune.add_argument("--before", type=parse_time, required=True)
+    args = parser.parse_args(argv)
+
+    history = AlarmHistory(args.db)
+    try:
+        if args.command == "prune":
+            print(f"已删除 {history.prune(args.before)} 条记录")
+            return 0
+        filters = (args.ip, args.channel, args.types, args.action, args.start, args.end)
+        started = time.perf_counter()
+        if args.count:
+            total = history.count(*filters)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"共 {total} 条记录 ({elapsed:.1f} ms)")
+            return 0
+        events = history.query(*filters, limit=args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        for event in events:
+            print(
+                f"{event.time_str}  {event.ip:<15}  ch{event.channel_str:<3}  "
+                f"{event.type_name:<24}  {event.action_str}"
+            )
+        print(f"共 {len(events)} 条记录 ({elapsed:.1f} ms)")
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+报警表格模型
+
+AlarmTableModel 把最近的报警事件(AlarmEvent元组)保存在固定容量的环形缓冲区中，
+QTableView 只为可见的行调用 data()，显示文字在这时才生成，不为每行创建表格项。
+append() 一次加入一批事件，每批只触发一次行插入(和超出容量时的一次行删除)，
+界面按定时器批量刷新，不随每个事件更新。
+"""
+
+from typing import List, Optional, Sequence
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from alarm_events import AlarmEvent
+
+DEFAULT_CAPACITY = 200000  # 表格保留的最近事件数
+
+COLUMN_NO = 0
+COLUMN_TIME = 1
+COLUMN_CHANNEL = 2
+COLUMN_TYPE = 3
+COLUMN_STATUS = 4
+
+HEADERS = [
+    "序号(No.)",
+    "时间(Time)",
+    "通道(Channel)",
+    "报警类型(Alarm Type)",
+    "状态(Status)",
+]
+
+
+class AlarmTableModel(QAbstractTableModel):
+    """最近报警事件的只读表格模型"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, parent=None):
+        super().__init__(parent)
+        if capacity <= 0:
+            raise ValueError("capacity 必须为正数")
+        self.capacity = capacity
+        self._ring: List[Optional[AlarmEvent]] = [None] * capacity
+        self._start = 0  # 第0行在环形缓冲区中的位置
+        self._count = 0
+        self._evicted = 0  # 因超出容量移出表格的事件数，用于计算序号
+
+    @property
+    def total(self) -> int:
+        """清空以来加入的事件总数"""
+        return self._evicted + self._count
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def event_at(self, row: int) -> AlarmEvent:
+        return self._ring[(self._start + row) % self.capacity]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        if row >= self._count:
+            return None
+        event = self._ring[(self._start + row) % self.capacity]
+        column = index.column()
+        if column == COLUMN_NO:
+            return str(self._evicted + row + 1)
+        if column == COLUMN_TIME:
+            return event.time_str
+        if column == COLUMN_CHANNEL:
+            return event.channel_str
+        if column == COLUMN_TYPE:
+            return event.type_name
+        if column == COLUMN_STATUS:
+            return event.action_str
+        return None
+
+    def append(self, events: Sequence[AlarmEvent]):
+        """在末尾加入一批事件，超出容量时移除最早的行"""
+        if not events:
+            return
+        if len(events) > self.capacity:
+            self._evicted += len(events) - self.capacity
+            events = events[-self.capacity :]
+        overflow = self._count + len(events) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for row in range(overflow):
+                self._ring[(self._start + row) % self.capacity] = None
+            self._start = (self._start + overflow) % self.capacity
+            self._count -= overflow
+            self._evicted += overflow
+            self.endRemoveRows()
+
+        first = self._count
+        self.beginInsertRows(QModelIndex(), first, first + len(events) - 1)
+        position = (self._start + first) % self.capacity
+        for event in events:
+            self._ring[position] = event
+            position += 1
+            if position == self.capacity:
+                position = 0
+        self._count += len(events)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._ring = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+        self._evicted = 0
+        self.endResetModel()
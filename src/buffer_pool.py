@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+可回收缓冲区池
+
+SDK回调(码流、抓拍等)中需要把C缓冲区的数据尽快拷贝出来再交给其他线程处理。
+BufferPool 预先分配/回收 bytearray，并缓存其内存地址，回调中只需一次 ctypes.memmove，
+不做逐包内存分配。池的缓冲区数量有上限，耗尽时 acquire 返回None，由调用方决定丢弃，
+保证磁盘卡顿等情况下回调线程不会阻塞，内存占用也不会无限增长。
+"""
+
+import threading
+from collections import deque
+from ctypes import addressof, c_char, memmove
+from typing import Optional
+
+
+class PooledBuffer:
+    """池中的一个缓冲区，使用完后调用 release() 归还"""
+
+    __slots__ = ("pool", "data", "address", "length", "lease")
+
+    def __init__(self, pool: Optional["BufferPool"], capacity: int):
+        self.pool = pool
+        self.data = bytearray(capacity)
+        # 缓存地址，memmove时不再创建ctypes对象
+        self.address = addressof((c_char * capacity).from_buffer(self.data))
+        self.length = 0  # 已使用的字节数
+        # 每次取出、归还或转交给其他线程时加1，持有者据此判断缓冲区是否已经交出
+        self.lease = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.data)
+
+    @property
+    def free(self) -> int:
+        return len(self.data) - self.length
+
+    def append(self, src, size: int) -> bool:
+        """把C缓冲区中的 size 字节追加到末尾，空间不足时返回False"""
+        if self.length + size > len(self.data):
+            return False
+        memmove(self.address + self.length, src, size)
+        self.length += size
+        return True
+
+    def view(self) -> memoryview:
+        """已使用部分的只读视图"""
+        return memoryview(self.data)[: self.length].toreadonly()
+
+    def hand_over(self):
+        """接收方(例如写入线程)接管缓冲区时调用，之后由接收方负责归还"""
+        self.lease += 1
+
+    def release(self):
+        """归还到所属的池"""
+        self.lease += 1
+        if self.pool is not None:
+            self.pool.release(self)
+
+
+class BufferPool:
+    """固定上限的缓冲区池，线程安全"""
+
+    def __init__(self, buffer_size: int, max_buffers: int, preallocate: int = 0):
+        """
+        :param buffer_size: 每个缓冲区的默认容量
+        :param max_buffers: 池最多分配的缓冲区数量
+        :param preallocate: 启动时预先分配的数量
+        """
+        if buffer_size <= 0 or max_buffers <= 0:
+            raise ValueError("buffer_size 和 max_buffers 必须为正数")
+        self.buffer_size = buffer_size
+        self.max_buffers = max_buffers
+        self._free = deque()
+        self._lock = threading.Lock()
+        self.allocated = 0  # 已分配的缓冲区数量
+        self.exhausted = 0  # 池耗尽导致 acquire 失败的次数
+        self.grown = 0  # 因请求容量超过缓冲区大小而重新分配的次数
+        for _ in range(min(preallocate, max_buffers)):
+            self._free.append(PooledBuffer(self, buffer_size))
+            self.allocated += 1
+
+    @property
+    def available(self) -> int:
+        """空闲缓冲区数量"""
+        return len(self._free)
+
+    @property
+    def in_use(self) -> int:
+        return self.allocated - len(self._free)
+
+    @property
+    def memory_bytes(self) -> int:
+        """已分配缓冲区的大致内存占用"""
+        return self.allocated * self.buffer_size
+
+    def acquire(self, size: int = 0) -> Optional[PooledBuffer]:
+        """
+        取一个容量不小于 size 的空缓冲区，池耗尽时返回None
+        """
+        try:
+            buffer = self._free.pop()
+        except IndexError:
+            with self._lock:
+                if self.allocated >= self.max_buffers:
+                    self.exhausted += 1
+                    return None
+                self.allocated += 1
+            buffer = PooledBuffer(self, max(size, self.buffer_size))
+        if buffer.capacity < size:
+            # 超过默认容量时扩大，之后这个缓冲区保持较大容量继续复用
+            self.grown += 1
+            buffer = PooledBuffer(self, size)
+        buffer.length = 0
+        buffer.lease += 1
+        return buffer
+
+    def release(self, buffer: PooledBuffer):
+        buffer.length = 0
+        self._free.append(buffer)
+
+    def stats(self) -> dict:
+        return {
+            "allocated": self.allocated,
+            "available": self.available,
+            "exhausted": self.exhausted,
+            "grown": self.grown,
+        }
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+SDK回调分发注册表
+
+NetSDK的抓拍、报警、断线等回调是进程全局的，回调中只带有登录句柄(lLoginID)
+和抓拍流水号(CmdSerial)。注册表把它们映射到所属的会话对象，保证多个摄像机
+窗口/会话同时存在时回调不会串台。
+
+读操作(回调线程中的查找)只做一次字典查找，不加锁；
+注册/注销等写操作很少发生，使用一把锁串行化。
+设备一直未返回的抓拍流水号在分配新流水号时按超时和数量上限清理。
+"""
+
+import itertools
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# SNAP_PARAMS.CmdSerial 为32位无符号整数
+_MAX_SNAP_SERIAL = 0xFFFFFFFF
+
+SNAP_TIMEOUT = 60.0  # 抓拍回调超过此时间(秒)未返回时丢弃流水号
+MAX_PENDING_SNAPS = 4096  # 记录的未返回抓拍流水号上限(所有会话)
+
+
+class CallbackRegistry:
+    """按登录句柄(以及抓拍流水号)路由SDK回调的注册表"""
+
+    def __init__(self):
+        self._write_lock = threading.Lock()
+        self._sessions: Dict[int, object] = {}
+        # CmdSerial -> (lLoginID, 会话, 分配时间, 抓拍请求)，按分配顺序排列
+        self._snaps: Dict[int, Tuple[int, object, float, object]] = {}
+        self._serials = itertools.count(1)
+
+    def register(self, login_id: int, session):
+        """登录成功后注册会话"""
+        if not login_id:
+            return
+        with self._write_lock:
+            self._sessions[login_id] = session
+
+    def unregister(self, login_id: int):
+        """登出或关闭时注销会话，同时丢弃其未返回的抓拍流水号"""
+        with self._write_lock:
+            self._sessions.pop(login_id, None)
+            stale = [s for s, entry in self._snaps.items() if entry[0] == login_id]
+            for serial in stale:
+                self._snaps.pop(serial, None)
+
+    def lookup(self, login_id: int):
+        """查找登录句柄对应的会话(无锁)"""
+        return self._sessions.get(login_id)
+
+    def sessions(self):
+        """当前已注册会话的快照"""
+        return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def next_snap_serial(self, login_id: int, session=None, request=None) -> int:
+        """
+        分配一个抓拍流水号并记录其所属会话，用于填写 SNAP_PARAMS.CmdSerial
+        :param session: 为None时使用登录句柄对应的会话
+        :param request: 抓拍请求的数据，例如 (通道, 调用方数据)，由 lookup_snap 取回
+        """
+        serial = next(self._serials) & _MAX_SNAP_SERIAL or next(self._serials)
+        now = time.monotonic()
+        with self._write_lock:
+            self._purge_snaps(now)
+            self._snaps[serial] = (
+                login_id,
+                session or self._sessions.get(login_id),
+                now,
+                request,
+            )
+        return serial
+
+    def _purge_snaps(self, now: float):
+        """丢弃超时或超出数量上限的最早流水号(持有写锁时调用)"""
+        excess = len(self._snaps) - MAX_PENDING_SNAPS + 1
+        # 回调线程可能同时取走条目，list()在GIL下是原子的
+        for serial, entry in list(self._snaps.items()):
+            if excess <= 0 and now - entry[2] < SNAP_TIMEOUT:
+                break
+            self._snaps.pop(serial, None)
+            excess -= 1
+
+    def discard_snap(self, serial: int):
+        """抓拍请求发送失败时丢弃流水号"""
+        self._snaps.pop(serial, None)
+
+    def lookup_snap(
+        self, login_id: int, serial: int
+    ) -> Tuple[object, Optional[object]]:
+        """
+        查找抓拍回调所属的会话并取走流水号(无锁)
+        优先按流水号匹配，未知流水号时退回按登录句柄匹配
+        :return: (会话, 抓拍请求)，未知流水号时抓拍请求为None，会话未找到时为None
+        """
+        entry = self._snaps.pop(serial, None)
+        if entry is not None and entry[0] == login_id and entry[1] is not None:
+            return entry[1], entry[3]
+        return self._sessions.get(login_id), None
+
+
+# 进程内唯一的注册表
+callback_registry = CallbackRegistry()
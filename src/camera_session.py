@@ -0,0 +1,794 @@
+# -*- coding: utf-8 -*-
+"""
+摄像机会话 - 与界面无关的单设备控制核心
+
+CameraSession 持有登录句柄、预览流、录制、抓拍、云台和报警订阅等全部会话状态，
+方法均为阻塞调用(界面中通过 SDKCommandExecutor 在工作线程中调用，
+后台程序可直接调用)。事件通过 SessionListener 通知使用者，会话本身不依赖Qt，
+一个进程可以同时驱动大量设备。
+"""
+
+import os
+import time
+from ctypes import POINTER, c_char, c_int, c_long, c_ubyte, c_uint, sizeof
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+try:
+    from NetSDK.SDK_Callback import CB_FUNCTYPE, fDecCBFun, fRealDataCallBackEx2
+    from NetSDK.SDK_Enum import (
+        EM_DEV_CFG_TYPE,
+        EM_LOGIN_SPAC_CAP_TYPE,
+        EM_REALDATA_FLAG,
+        SDK_RealPlayType,
+    )
+    from NetSDK.SDK_Struct import (
+        C_DWORD,
+        C_LDWORD,
+        C_LLONG,
+        NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY,
+        NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY,
+        NET_TIME,
+        SNAP_PARAMS,
+    )
+except ImportError:
+    # 未安装NetSDK时只能使用模拟器后端，使用模拟器提供的同名定义
+    from fake_sdk import (
+        C_DWORD,
+        C_LDWORD,
+        C_LLONG,
+        CB_FUNCTYPE,
+        EM_DEV_CFG_TYPE,
+        EM_LOGIN_SPAC_CAP_TYPE,
+        EM_REALDATA_FLAG,
+        NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY,
+        NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY,
+        NET_TIME,
+        SNAP_PARAMS,
+        SDK_RealPlayType,
+        fDecCBFun,
+        fRealDataCallBackEx2,
+    )
+
+from alarm_coalescer import AlarmCoalescer
+from alarm_events import AlarmEvent, alarm_bus, decode_alarm
+from buffer_pool import BufferPool, PooledBuffer
+from callback_registry import callback_registry
+from frame_ring import FRAME_TYPE_YUV420, FrameRing
+from frame_subscribers import POLICY_LATEST, FrameHub, FrameSubscription
+from preroll_buffer import DEFAULT_PREROLL_MAX_BYTES, PrerollBuffer
+from sdk_context import get_sdk_context
+from segment_writer import SegmentWriter
+from stream_tee import StreamTee
+
+DEFAULT_DEVICE_PORT = 37777
+SNAP_BUFFER_SIZE = 512 * 1024  # 抓拍缓冲区默认容量，更大的图片按 RevLen 扩大后复用
+MAX_SNAP_BUFFERS = 64  # 每个会话同时持有的抓拍缓冲区上限(等待写盘的图片数)
+
+# 录制的触发方式，随文件写入清单和索引
+TRIGGER_MANUAL = "manual"
+TRIGGER_MOTION = "motion"
+TRIGGER_CONTINUOUS = "continuous"
+
+
+def media_filename(
+    kind: str, ip: str, channel: int, ext: str, when=None, seq: Optional[int] = None
+) -> str:
+    """
+    生成抓拍/录制文件名，例如 capture_192_168_1_108_ch0_20231211_143025.jpg
+    :param kind: 文件类型前缀(capture/record)
+    :param seq: 录像分段序号，例如 record_192_168_1_108_ch0_20231211_143025_0002.dav
+    """
+    timestamp = (when or datetime.now()).strftime("%Y%m%d_%H%M%S")
+    suffix = f"_{seq:04d}" if seq is not None else ""
+    return f"{kind}_{ip.replace('.', '_')}_ch{channel}_{timestamp}{suffix}.{ext}"
+
+
+class SessionListener:
+    """会话事件监听接口，回调均在SDK线程中执行，不要做耗时操作"""
+
+    def session_disconnected(self, session, ip: str, port: int):
+        pass
+
+    def session_reconnected(self, session, ip: str, port: int):
+        pass
+
+    def snapshot_received(self, session, buffer: PooledBuffer, EncodeType, request):
+        """
+        抓拍图片到达，buffer 为回调中复制出的图片数据(buffer.view())，
+        归监听者所有，用完后必须调用 buffer.release() 归还缓冲池，
+        交给其他线程时由接收方调用 buffer.hand_over()；
+        抛出异常时若缓冲区既未归还也未转交，由会话归还
+        request 为 snap() 的 (通道, context)，设备返回未知流水号时为None
+        """
+        buffer.release()
+
+    def alarm_received(self, session, event: AlarmEvent):
+        """
+        报警事件(已解码并按通道合并)，在SDK线程或合并线程中调用，
+        同一事件也会发布到 alarm_bus
+        """
+        pass
+
+    def media_closed(self, session, entry: dict):
+        """
+        录像文件关闭(录制写入线程或停止录制的调用线程)
+        entry 与录像清单的字段相同: path、file、ip、channel、seq、start、end、bytes、event
+        """
+        pass
+
+
+# 抓拍回调函数
+@CB_FUNCTYPE(None, C_LLONG, POINTER(c_ubyte), c_uint, c_uint, C_DWORD, C_LDWORD)
+def CaptureCallBack(lLoginID, pBuf, RevLen, EncodeType, CmdSerial, dwUser):
+    """抓拍回调函数，按登录句柄和抓拍流水号分发给发起抓拍的会话"""
+    session, request = callback_registry.lookup_snap(lLoginID, CmdSerial)
+    if lLoginID == 0 or session is None:
+        return
+
+    # pBuf 只在回调期间有效，在这里复制一次，之后只传递缓冲区对象
+    buffer = session.snap_pool.acquire(RevLen)
+    if buffer is None:
+        print(f"抓拍缓冲区已用完，丢弃图片: {RevLen} 字节")
+        return
+    buffer.append(pBuf, RevLen)
+    lease = buffer.lease
+    try:
+        session.listener.snapshot_received(session, buffer, EncodeType, request)
+    except Exception as e:
+        print(f"抓拍回调错误: {e}")
+        if buffer.lease == lease:
+            # 监听者出错时还没有归还或转交缓冲区，在这里归还
+            buffer.release()
+
+
+# 报警回调函数
+@CB_FUNCTYPE(
+    None,
+    c_long,
+    C_LLONG,
+    POINTER(c_char),
+    C_DWORD,
+    POINTER(c_char),
+    c_long,
+    c_int,
+    c_long,
+    C_LDWORD,
+)
+def AlarmCallback(
+    lCommand,
+    lLoginID,
+    pBuf,
+    dwBufLen,
+    pchDVRIP,
+    nDVRPort,
+    bAlarmAckFlag,
+    nEventID,
+    dwUser,
+):
+    """报警回调函数，解码并合并后交给所属会话的监听者并发布到报警事件总线"""
+    session = callback_registry.lookup(lLoginID)
+    if lLoginID == 0 or session is None:
+        return
+
+    try:
+        events = decode_alarm(
+            session.ip, lCommand, pBuf, dwBufLen, session.alarm_states, nEventID
+        )
+        if events:
+            session.alarm_coalescer.publish(events)
+    except Exception as e:
+        print(f"报警回调错误: {e}")
+
+
+class PreviewStream:
+    """单个通道的实时预览流及其录制状态"""
+
+    def __init__(
+        self,
+        session,
+        channel: int,
+        stream_type: int,
+        use_playsdk: bool,
+        frame_slots: int = 3,
+    ):
+        self.session = session
+        self.channel = channel
+        self.stream_type = stream_type
+        self.use_playsdk = use_playsdk
+        self.play_id = 0
+        self.port = c_int()  # PlaySDK端口
+        self.record_id = 0  # 录制ID(StartSaveRealData)
+        self.record_writer = None  # 带预录的录制(StreamTee)，与record_id二选一
+        self.record_path = ""
+        self.record_start_time = None  # 录制开始时间
+        self.record_event = TRIGGER_MANUAL  # 录制的触发方式
+        # 解码帧环形缓冲区(仅PlaySDK模式)，槽位在收到第一帧时按帧大小分配
+        self.frames = FrameRing(frame_slots) if use_playsdk else None
+        self.frame_hub = None  # 解码帧订阅分发器，首次订阅时创建
+        self.tee = None  # 原始码流旁路写入(StreamTee)
+        self.packets = None  # 原始码流预录缓冲和分发(PrerollBuffer)，设置拉流回调时创建
+
+        # 拉流回调 - 获取原始流数据，输入到PlaySDK和/或旁路写入
+        self.m_RealDataCallBack = fRealDataCallBackEx2(self.RealDataCallBack)
+        # PlaySDK模式专用回调：解码回调 - 获取YUV数据
+        self.m_DecodingCallBack = fDecCBFun(self.DecodingCallBack)
+
+    @property
+    def is_recording(self) -> bool:
+        return self.record_id != 0 or self.record_writer is not None
+
+    @property
+    def realdata_enabled(self) -> bool:
+        """是否已设置拉流回调"""
+        return self.packets is not None
+
+    def close_writers(self):
+        """断开并关闭旁路写入和带预录的录制"""
+        for name in ("tee", "record_writer"):
+            writer = getattr(self, name)
+            if writer is None:
+                continue
+            setattr(self, name, None)
+            if self.packets is not None:
+                self.packets.detach(writer)
+            writer.close()
+            if name == "record_writer":
+                self.record_start_time = None
+
+    def stats(self) -> dict:
+        """预录缓冲、旁路写入和录制的统计信息"""
+        return {
+            "channel": self.channel,
+            "preroll": self.packets.stats() if self.packets is not None else None,
+            "tee": self.tee.stats() if self.tee is not None else None,
+            "record": (
+                self.record_writer.stats() if self.record_writer is not None else None
+            ),
+        }
+
+    def subscribe(
+        self, name: str, policy: str = POLICY_LATEST, **kwargs
+    ) -> FrameSubscription:
+        """
+        订阅解码帧(仅PlaySDK解码的预览流)
+        :param policy: 见 frame_subscribers 中的 POLICY_*
+        :param kwargs: maxsize、nth、callback，见 FrameHub.subscribe
+        """
+        if self.frames is None:
+            raise ValueError("预览流未启用解码，无法订阅解码帧")
+        if self.frame_hub is None:
+            self.frame_hub = FrameHub(self.frames, f"ch{self.channel}")
+        return self.frame_hub.subscribe(name, policy, **kwargs)
+
+    def close_subscriptions(self):
+        """停止分发并关闭所有订阅"""
+        if self.frame_hub is not None:
+            self.frame_hub.stop()
+            self.frame_hub = None
+
+    def RealDataCallBack(
+        self, lRealHandle, dwDataType, pBuffer, dwBufSize, param, dwUser
+    ):
+        """
+        拉流回调函数 - PlaySDK模式、预录或码流旁路写入时使用
+        作用：获取摄像头的原始视频流数据，输入到PlaySDK进行解码，并交给预录缓冲
+        流程：摄像头 -> SDK -> 此回调 -> PlaySDK解码器 -> DecodingCallBack -> 显示
+                                    -> 预录缓冲 -> 录制/旁路写入线程
+        """
+        if lRealHandle != self.play_id:
+            return
+        if self.use_playsdk:
+            # 将原始流数据输入到PlaySDK进行解码显示
+            self.session.sdk.InputData(self.port, pBuffer, dwBufSize)
+        packets = self.packets
+        if packets is not None:
+            # 只做内存拷贝，写文件由写入线程完成
+            packets.push(pBuffer, dwBufSize)
+
+    def DecodingCallBack(self, nPort, pBuf, nSize, pFrameInfo, pUserData, nReserved2):
+        """
+        PlaySDK解码回调函数 - 仅在PlaySDK模式下使用
+        作用：获取PlaySDK解码后的YUV数据，可以进行进一步处理
+        流程：RealDataCallBack -> PlaySDK解码器 -> 此回调 -> 帧环形缓冲区(self.frames)
+        """
+        # 注意：此回调在PlaySDK内部线程中执行，只做一次拷贝，处理交给 self.frames 的读者
+        info = pFrameInfo.contents
+        if info.nType == FRAME_TYPE_YUV420 and self.frames is not None:
+            self.frames.push(pBuf, nSize, info.nWidth, info.nHeight, info.nStamp)
+
+
+class CameraSession:
+    """单台设备的会话：登录、预览、录制、抓拍、云台与报警"""
+
+    def __init__(
+        self,
+        ip: str = "",
+        port: int = DEFAULT_DEVICE_PORT,
+        username: str = "",
+        password: str = "",
+        listener: Optional[SessionListener] = None,
+    ):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.listener = listener or SessionListener()
+
+        self.loginID = 0
+        self.channel_count = 0
+        self.device_info = None
+        self.is_alarm_listening = False
+        self.streams: Dict[int, PreviewStream] = {}
+        self.frame_slots = 3  # 每个PlaySDK预览流的解码帧槽位数
+        self.preroll_seconds = 0.0  # 预录时长(秒)，0表示不预录，对之后打开的预览生效
+        self.preroll_max_bytes = DEFAULT_PREROLL_MAX_BYTES  # 每路预录缓冲的内存上限
+        self.segment_seconds = 0.0  # 录像按时长分段(秒)，0表示不分段
+        self.segment_bytes = 0  # 录像按大小分段(字节)，0表示不分段
+        self.tee_dir = ""  # 原始码流旁路写入目录，空表示不写入，对之后打开的预览生效
+        # 抓拍图片在回调中复制到池化缓冲区，写盘后归还
+        self.snap_pool = BufferPool(SNAP_BUFFER_SIZE, MAX_SNAP_BUFFERS)
+        # 报警事件按通道合并后再通知监听者，合并窗口为 alarm_coalescer.window(秒)
+        self.alarm_coalescer = AlarmCoalescer(self._deliver_alarms)
+        # 各报警类型上次收到的通道状态，只在报警回调中读写，开始/停止监听时清空
+        self.alarm_states: Dict[int, bytes] = {}
+
+        # 获取进程共享的NetSDK对象，全局回调只注册一次
+        self.sdk_context = get_sdk_context()
+        self.sdk = self.sdk_context.acquire()
+        self.sdk_context.set_alarm_callback(AlarmCallback, 0)
+        self._closed = False
+
+    def set_credentials(self, ip: str, port: int, username: str, password: str):
+        """设置登录信息(登录前调用)"""
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+
+    @property
+    def is_logged_in(self) -> bool:
+        return self.loginID != 0
+
+    def _error(self, default: str = "") -> str:
+        return self.sdk.GetLastErrorMessage() or default
+
+    # ------------------------------------------------------------------
+    # 登录/登出
+    # ------------------------------------------------------------------
+    def login(self) -> Tuple[bool, str]:
+        """登录设备，返回(是否成功, 错误信息)"""
+        if self.loginID:
+            return True, ""
+        stuInParam = NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY()
+        stuInParam.dwSize = sizeof(NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY)
+        stuInParam.szIP = self.ip.encode()
+        stuInParam.nPort = self.port
+        stuInParam.szUserName = self.username.encode()
+        stuInParam.szPassword = self.password.encode()
+        stuInParam.emSpecCap = EM_LOGIN_SPAC_CAP_TYPE.TCP
+
+        stuOutParam = NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY()
+        stuOutParam.dwSize = sizeof(NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY)
+
+        login_id, device_info, error_msg = self.sdk.LoginWithHighLevelSecurity(
+            stuInParam, stuOutParam
+        )
+        if login_id == 0:
+            return False, error_msg
+        self.loginID = login_id
+        self.device_info = device_info
+        self.channel_count = int(device_info.nChanNum)
+        # 注册到回调分发表，抓拍、报警和断线回调按登录句柄路由到本会话
+        callback_registry.register(login_id, self)
+        return True, ""
+
+    def logout(self) -> bool:
+        """停止所有预览、录制和报警监听后登出"""
+        if not self.loginID:
+            return True
+        for channel in list(self.streams):
+            self.stop_preview(channel)
+        if self.is_alarm_listening:
+            self.stop_alarm_listen()
+        result = self.sdk.Logout(self.loginID)
+        if result:
+            callback_registry.unregister(self.loginID)
+            self.loginID = 0
+            self.device_info = None
+            self.channel_count = 0
+        return bool(result)
+
+    def reset(self):
+        """登出并丢弃本地状态，设备断线导致登出失败时也保证会话回到未登录状态"""
+        if not self.loginID:
+            return
+        self.logout()
+        if self.loginID:
+            callback_registry.unregister(self.loginID)
+            self.loginID = 0
+            self.device_info = None
+            self.channel_count = 0
+            for stream in self.streams.values():
+                stream.close_subscriptions()
+                stream.close_writers()
+            self.streams.clear()
+            self.is_alarm_listening = False
+            self.alarm_coalescer.close()
+
+    def close(self):
+        """登出并释放SDK引用，会话不可再使用"""
+        if self._closed:
+            return
+        try:
+            self.reset()
+        finally:
+            self._closed = True
+            self.sdk_context.release()
+
+    def on_disconnect(self, ip: str, port: int):
+        """断线回调(SDK线程)，由SDK上下文按登录句柄分发"""
+        self.listener.session_disconnected(self, ip, port)
+
+    def on_reconnect(self, ip: str, port: int):
+        """重连回调(SDK线程)，由SDK上下文按登录句柄分发"""
+        self.listener.session_reconnected(self, ip, port)
+
+    # ------------------------------------------------------------------
+    # 实时预览
+    # ------------------------------------------------------------------
+    def start_preview(
+        self,
+        channel: int,
+        stream_type=SDK_RealPlayType.Realplay,
+        hwnd: int = 0,
+        use_playsdk: bool = False,
+    ) -> Tuple[Optional[PreviewStream], str]:
+        """
+        打开一个通道的实时预览
+        :param hwnd: 渲染窗口句柄，0表示不渲染(后台录制)
+        :param use_playsdk: 是否使用PlaySDK解码(拉流回调 + 解码回调)
+        :return: (预览流, 错误信息)
+        """
+        if not self.loginID:
+            return None, "设备未登录"
+        if channel in self.streams:
+            return self.streams[channel], ""
+
+        stream = PreviewStream(
+            self, channel, stream_type, use_playsdk, self.frame_slots
+        )
+        if not use_playsdk:
+            stream.play_id = self.sdk.RealPlayEx(
+                self.loginID, channel, hwnd, stream_type
+            )
+            if stream.play_id == 0:
+                return None, self._error("打开预览失败")
+            if self.preroll_seconds > 0:
+                # 预录需要拉流回调持续填充缓冲
+                self._enable_realdata(stream)
+            self.streams[channel] = stream
+            self._auto_tee(channel)
+            return stream, ""
+
+        result, stream.port = self.sdk.GetFreePort()
+        if not result:
+            return None, "获取PlaySDK端口失败"
+
+        self.sdk.OpenStream(stream.port)
+        self.sdk.Play(stream.port, hwnd)
+
+        stream.play_id = self.sdk.RealPlayEx(self.loginID, channel, 0, stream_type)
+        if stream.play_id == 0:
+            error_msg = self._error("打开预览失败")
+            # 清理PlaySDK资源
+            self.sdk.Stop(stream.port)
+            self.sdk.CloseStream(stream.port)
+            self.sdk.ReleasePort(stream.port)
+            return None, error_msg
+
+        # 设置数据回调和解码回调
+        self._enable_realdata(stream)
+        self.sdk.SetDecCallBack(stream.port, stream.m_DecodingCallBack)
+        self.streams[channel] = stream
+        self._auto_tee(channel)
+        return stream, ""
+
+    def _auto_tee(self, channel: int):
+        """配置了 tee_dir 时，预览打开后把原始码流旁路写入该目录，失败不影响预览"""
+        if not self.tee_dir:
+            return
+        path = os.path.join(
+            self.tee_dir, media_filename("tee", self.ip, channel, "dav")
+        )
+        try:
+            os.makedirs(self.tee_dir, exist_ok=True)
+        except OSError as e:
+            print(f"创建码流旁路目录失败: {e}")
+            return
+        ok, error_msg = self.start_tee(channel, path)
+        if ok:
+            print(f"码流旁路写入: {path}")
+        else:
+            print(f"码流旁路写入失败: {error_msg}")
+
+    def _enable_realdata(self, stream: PreviewStream) -> bool:
+        """为预览流设置拉流回调(原始码流)，同时创建预录缓冲"""
+        if stream.packets is None:
+            packets = PrerollBuffer(self.preroll_seconds, self.preroll_max_bytes)
+            # 先创建缓冲再设置回调，回调线程看到的总是完整对象
+            stream.packets = packets
+            if not self.sdk.SetRealDataCallBackEx2(
+                stream.play_id,
+                stream.m_RealDataCallBack,
+                None,
+                EM_REALDATA_FLAG.RAW_DATA,
+            ):
+                stream.packets = None
+        return stream.realdata_enabled
+
+    def stop_preview(self, channel: int) -> bool:
+        """停止通道预览(正在录制时先停止录制)"""
+        stream = self.streams.get(channel)
+        if stream is None:
+            return True
+        if stream.is_recording:
+            self.stop_record(channel)
+        result = self.sdk.StopRealPlayEx(stream.play_id)
+        if result:
+            if stream.use_playsdk:
+                self.sdk.SetDecCallBack(stream.port, None)
+                self.sdk.Stop(stream.port)
+                self.sdk.CloseStream(stream.port)
+                self.sdk.ReleasePort(stream.port)
+            stream.close_subscriptions()
+            stream.close_writers()
+            del self.streams[channel]
+        return bool(result)
+
+    # ------------------------------------------------------------------
+    # 录制
+    # ------------------------------------------------------------------
+    def start_record(
+        self, channel: int, path: str, event: str = TRIGGER_MANUAL
+    ) -> Tuple[bool, str]:
+        """
+        把通道的预览流保存到文件
+        开启预录或分段时由本地写入线程录制(SegmentWriter)，文件从预录缓冲中最早的I帧开始，
+        分段在I帧处无缝切换；否则使用 StartSaveRealData
+        :param event: 触发方式(TRIGGER_*)，文件关闭时随 listener.media_closed 通知
+        """
+        stream = self.streams.get(channel)
+        if stream is None:
+            return False, "请先开始预览！"
+        if stream.is_recording:
+            return True, ""
+        preroll = stream.packets is not None and stream.packets.enabled
+        if preroll or self.segment_seconds > 0 or self.segment_bytes > 0:
+            # StartSaveRealData 无法无缝切换文件，分段录制也走拉流回调
+            if not self._enable_realdata(stream):
+                return False, self._error("设置拉流回调失败")
+            try:
+                writer = SegmentWriter(
+                    path,
+                    self.ip,
+                    channel,
+                    segment_seconds=self.segment_seconds,
+                    segment_bytes=self.segment_bytes,
+                    preroll_seconds=stream.packets.buffered_seconds,
+                    segment_name=lambda seq: media_filename(
+                        "record", self.ip, channel, "dav", seq=seq
+                    ),
+                    event=event,
+                    on_closed=self._media_closed,
+                )
+            except OSError as e:
+                return False, f"打开录制文件失败: {e}"
+            stream.record_writer = writer
+            stream.record_path = writer.first_path
+            stream.record_start_time = time.time()
+            stream.record_event = event
+            replayed = stream.packets.attach(writer)
+            if replayed:
+                print(f"录制包含预录数据: {replayed} 字节")
+            return True, ""
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 使用预览ID开始保存视频流 - 直接保存当前预览的流
+        record_id = self.sdk.StartSaveRealData(
+            stream.play_id, path.encode(), None, None
+        )
+        if record_id == 0:
+            return False, self._error("开始录制失败")
+        stream.record_id = record_id
+        stream.record_path = path
+        stream.record_start_time = time.time()
+        stream.record_event = event
+        return True, ""
+
+    def stop_record(self, channel: int) -> Tuple[bool, str]:
+        """停止通道录制"""
+        stream = self.streams.get(channel)
+        if stream is None or not stream.is_recording:
+            return True, ""
+        if stream.record_writer is not None:
+            writer, stream.record_writer = stream.record_writer, None
+            stream.packets.detach(writer)
+            writer.close()
+            stream.record_start_time = None
+            return True, ""
+        if not self.sdk.StopSaveRealData(stream.record_id):
+            return False, self._error("停止录制失败")
+        path = stream.record_path
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        self._media_closed(
+            {
+                "path": os.path.abspath(path),
+                "file": os.path.basename(path),
+                "ip": self.ip,
+                "channel": channel,
+                "seq": 0,
+                "start": round(stream.record_start_time, 3),
+                "end": round(time.time(), 3),
+                "bytes": size,
+                "event": stream.record_event,
+            }
+        )
+        stream.record_id = 0
+        stream.record_start_time = None
+        return True, ""
+
+    def _media_closed(self, entry: dict):
+        try:
+            self.listener.media_closed(self, entry)
+        except Exception as e:
+            print(f"录像关闭通知错误: {e}")
+
+    def start_tee(self, channel: int, path: str, **options) -> Tuple[bool, str]:
+        """
+        把通道的原始码流旁路写入文件(拉流回调 + 异步写入线程)
+        :param options: chunk_size、max_chunks、flush_interval、fsync_interval，见 StreamTee
+        """
+        stream = self.streams.get(channel)
+        if stream is None:
+            return False, "请先开始预览！"
+        if stream.tee is not None:
+            return True, ""
+        if not self._enable_realdata(stream):
+            return False, self._error("设置拉流回调失败")
+        try:
+            stream.tee = StreamTee(path, **options)
+        except OSError as e:
+            return False, f"打开码流文件失败: {e}"
+        stream.packets.attach(stream.tee, replay=False)
+        return True, ""
+
+    def stop_tee(self, channel: int) -> Tuple[bool, str]:
+        """停止旁路写入，写完缓存的数据后关闭文件"""
+        stream = self.streams.get(channel)
+        if stream is None or stream.tee is None:
+            return True, ""
+        tee, stream.tee = stream.tee, None
+        stream.packets.detach(tee)
+        tee.close()
+        return True, ""
+
+    # ------------------------------------------------------------------
+    # 抓拍、云台与设备控制
+    # ------------------------------------------------------------------
+    def snap(self, channel: int, quality: int = 1, context=None) -> Tuple[int, str]:
+        """
+        发送抓拍请求，图片通过 listener.snapshot_received 异步返回
+        :param context: 调用方数据(例如保存路径)，随 (通道, context) 交给 snapshot_received
+        :return: (抓拍流水号, 错误信息)，失败时流水号为0
+        """
+        if not self.loginID:
+            return 0, "设备未登录"
+        # 设置抓拍回调(全局只注册一次)，回调通过注册表按登录句柄分发
+        self.sdk_context.set_snap_callback(CaptureCallBack, 0)
+
+        snap_params = SNAP_PARAMS()
+        snap_params.Channel = channel
+        snap_params.Quality = quality  # 抓拍质量
+        snap_params.mode = 0  # 抓拍模式
+        # 流水号随抓拍回调返回，用于把图片路由回本会话
+        # 回调可能在 SnapPictureEx 返回前到达，发送前分配流水号并记录请求
+        serial = callback_registry.next_snap_serial(
+            self.loginID, self, (channel, context)
+        )
+        snap_params.CmdSerial = serial
+        if self.sdk.SnapPictureEx(self.loginID, snap_params):
+            return serial, ""
+        callback_registry.discard_snap(serial)
+        return 0, self._error("抓拍失败")
+
+    def ptz(self, channel: int, command, speed: int, stop: bool) -> bool:
+        """
+        调用 PTZControlEx2 实现云台控制.
+        :param command: SDK_PTZ_ControlType 枚举中的一个命令.
+        :param stop: True 表示停止动作, False 表示开始动作.
+        """
+        # 对于基础方向控制，param2 是速度
+        return bool(
+            self.sdk.PTZControlEx2(self.loginID, channel, command, 0, speed, 0, stop)
+        )
+
+    def get_device_time(self) -> Tuple[Optional[NET_TIME], str]:
+        """获取设备时间"""
+        device_time = NET_TIME()
+        result = self.sdk.GetDevConfig(
+            self.loginID,
+            int(EM_DEV_CFG_TYPE.TIMECFG),
+            -1,
+            device_time,
+            sizeof(NET_TIME),
+        )
+        if not result:
+            return None, self._error("获取时间失败")
+        return device_time, ""
+
+    def set_device_time(
+        self, year, month, day, hour, minute, second
+    ) -> Tuple[bool, str]:
+        """设置设备时间"""
+        device_time = NET_TIME()
+        device_time.dwYear = year
+        device_time.dwMonth = month
+        device_time.dwDay = day
+        device_time.dwHour = hour
+        device_time.dwMinute = minute
+        device_time.dwSecond = second
+        result = self.sdk.SetDevConfig(
+            self.loginID,
+            int(EM_DEV_CFG_TYPE.TIMECFG),
+            -1,
+            device_time,
+            sizeof(NET_TIME),
+        )
+        if not result:
+            return False, self._error("设置时间失败")
+        return True, ""
+
+    def reboot(self) -> Tuple[bool, str]:
+        """发送重启命令(本地预览和录制由调用方停止)"""
+        if not self.sdk.RebootDev(self.loginID):
+            return False, self._error("重启失败")
+        return True, ""
+
+    # ------------------------------------------------------------------
+    # 报警监听
+    # ------------------------------------------------------------------
+    def start_alarm_listen(self) -> Tuple[bool, str]:
+        """开始报警订阅，报警通过 listener.alarm_received 通知"""
+        if self.is_alarm_listening:
+            return True, ""
+        # 重新监听后设备重新上报状态，仍在报警中的通道要重新生成开始事件
+        self.alarm_states.clear()
+        self.alarm_coalescer.start()
+        if not self.sdk.StartListenEx(self.loginID):
+            self.alarm_coalescer.close()
+            return False, self._error("开启报警监听失败")
+        self.is_alarm_listening = True
+        return True, ""
+
+    def stop_alarm_listen(self) -> Tuple[bool, str]:
+        """停止报警订阅"""
+        if not self.is_alarm_listening:
+            return True, ""
+        if not self.sdk.StopListen(self.loginID):
+            return False, self._error("停止报警监听失败")
+        self.is_alarm_listening = False
+        self.alarm_states.clear()
+        # 发出暂存的结束事件，下游的报警区间都能结束
+        self.alarm_coalescer.close()
+        return True, ""
+
+    def _deliver_alarms(self, events):
+        """合并后的报警事件交给监听者并发布到报警事件总线"""
+        listener = self.listener
+        for event in events:
+            listener.alarm_received(self, event)
+        alarm_bus.publish(events)
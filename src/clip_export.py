@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按时间段导出录像片段(不解码)
+
+通过媒体索引找到覆盖时间段的录像文件，再用各文件的I帧索引(dav_reader)定位：
+从开始时间之前最近的I帧复制到结束时间之后的第一帧，多个分段按顺序拼接，
+得到可直接播放的DAV；导出MP4时再用 ffmpeg -c copy 转封装。
+只复制字节，导出速度取决于磁盘。
+
+示例:
+    python src/clip_export.py --db record/media_catalog.db --ip 192.168.1.108 \\
+        --channel 0 --from "2023-12-11 14:30:00" --to "2023-12-11 14:30:30" -o clip.mp4
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from dav_reader import DavReader
+from media_catalog import CATALOG_NAME, KIND_RECORD, MediaCatalog, parse_time
+from remux_pool import build_remux_command
+
+FORMAT_DAV = "dav"
+FORMAT_MP4 = "mp4"
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+
+class ClipPart(NamedTuple):
+    """片段在一个录像文件中的字节范围"""
+
+    path: str
+    offset: int
+    length: int
+    start: float  # 范围内第一帧(I帧)的时间
+    end: float  # 范围内最后一帧的时间
+
+
+class ClipResult(NamedTuple):
+    path: str
+    bytes: int
+    parts: int
+    start: float
+    end: float
+    elapsed: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def clip_range(reader: DavReader, start: float, end: float) -> Optional[ClipPart]:
+    """
+    计算一个录像文件中覆盖 [start, end] 的字节范围
+    起点为 start 之前最近的I帧，终点为最后一个时间不晚于 end 的帧之后
+    """
+    index = reader.index()
+    if not len(index) or index.end_time < start or index.start_time > end:
+        return None
+    begin = index.seek(start)
+    begin_time = index.times[index.keyframe_before(start)]
+
+    # 从结束时间之前最近的I帧开始解析，最多解析一个GOP
+    stop, last_time = index.scanned, index.end_time
+    if end < index.end_time:
+        scan_from = max(index.seek(end), begin)
+        for frame in reader.frames(scan_from, index.scanned):
+            if frame.timestamp > end:
+                stop = frame.offset
+                break
+            last_time = frame.timestamp
+    if stop <= begin:
+        return None
+    return ClipPart(reader.path, begin, stop - begin, begin_time, last_time)
+
+
+def plan_clip(
+    catalog: MediaCatalog, ip: str, channel: int, start: float, end: float
+) -> List[ClipPart]:
+    """找出覆盖时间段的DAV文件及其字节范围，按时间排序"""
+    parts = []
+    records = catalog.query(
+        ip=ip, channel=channel, kind=KIND_RECORD, start=start, end=end
+    )
+    for record in records:
+        if not record.path.lower().endswith(".dav"):
+            continue
+        try:
+            with DavReader(record.path) as reader:
+                part = clip_range(reader, start, end)
+        except (OSError, ValueError) as e:
+            print(f"读取录像失败({record.path}): {e}")
+            continue
+        if part is not None:
+            parts.append(part)
+    parts.sort(key=lambda p: p.start)
+    return parts
+
+
+def _copy_part(part: ClipPart, out) -> int:
+    """把字节范围复制到已打开的输出文件"""
+    with DavReader(part.path) as reader:
+        view = memoryview(reader.data)
+        try:
+            pos, stop = part.offset, part.offset + part.length
+            while pos < stop:
+                n = min(COPY_CHUNK, stop - pos)
+                out.write(view[pos : pos + n])
+                pos += n
+        finally:
+            view.release()
+    return part.length
+
+
+def export_clip(
+    catalog: MediaCatalog,
+    ip: str,
+    channel: int,
+    start: float,
+    end: float,
+    output: str,
+    fmt: Optional[str] = None,
+    ffmpeg: str = "ffmpeg",
+) -> Tuple[Optional[ClipResult], str]:
+    """
+    导出时间段 [start, end] 的录像
+    :param fmt: FORMAT_DAV 或 FORMAT_MP4，默认按输出文件扩展名
+    :return: (导出结果, 错误信息)
+    """
+    started = time.perf_counter()
+    if end <= start:
+        return None, "结束时间必须晚于开始时间"
+    fmt = fmt or os.path.splitext(output)[1].lstrip(".").lower() or FORMAT_DAV
+    if fmt not in (FORMAT_DAV, FORMAT_MP4):
+        return None, f"不支持的导出格式: {fmt}"
+    ffmpeg_path = ""
+    if fmt == FORMAT_MP4:
+        ffmpeg_path = shutil.which(ffmpeg)
+        if not ffmpeg_path:
+            return None, f"未找到ffmpeg({ffmpeg})，无法导出MP4"
+
+    parts = plan_clip(catalog, ip, channel, start, end)
+    if not parts:
+        return None, "该时间段没有录像"
+
+    output = os.path.abspath(output)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    dav_path = output + ".part" if fmt == FORMAT_DAV else output + ".dav.part"
+    size = 0
+    try:
+        with open(dav_path, "wb") as out:
+            for part in parts:
+                size += _copy_part(part, out)
+        if fmt == FORMAT_DAV:
+            os.replace(dav_path, output)
+        else:
+            temp = output + ".part"
+            command = build_remux_command(ffmpeg_path, dav_path, temp)
+            result = subprocess.run(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+            if result.returncode != 0 or not os.path.exists(temp):
+                message = result.stderr.decode("utf-8", "replace").strip()
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+                return None, f"转MP4失败: {message or result.returncode}"
+            os.replace(temp, output)
+            size = os.path.getsize(output)
+    except OSError as e:
+        return None, f"导出失败: {e}"
+    finally:
+        if os.path.exists(dav_path):
+            os.remove(dav_path)
+
+    elapsed = time.perf_counter() - started
+    return (
+        ClipResult(output, size, len(parts), parts[0].start, parts[-1].end, elapsed),
+        "",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按时间段导出录像片段(不解码)")
+    parser.add_argument("--db", default=CATALOG_NAME, help="媒体索引数据库")
+    parser.add_argument("--ip", required=True)
+    parser.add_argument("--channel", type=int, default=0)
+    parser.add_argument("--from", dest="start", type=parse_time, required=True)
+    parser.add_argument("--to", dest="end", type=parse_time, required=True)
+    parser.add_argument("-o", "--output", required=True, help="输出文件(.dav/.mp4)")
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    args = parser.parse_args(argv)
+
+    catalog = MediaCatalog(args.db)
+    try:
+        result, error_msg = export_clip(
+            catalog,
+            args.ip,
+            args.channel,
+            args.start,
+            args.end,
+            args.output,
+            ffmpeg=args.ffmpeg,
+        )
+    finally:
+        catalog.close()
+    if result is None:
+        print(f"导出失败: {error_msg}")
+        return 1
+    speed = result.bytes / result.elapsed / (1024 * 1024) if result.elapsed else 0
+    print(
+        f"已导出 {result.path}: {result.duration:.1f} 秒, {result.parts} 个文件, "
+        f"{result.bytes} 字节, {result.elapsed * 1000:.0f} ms ({speed:.0f} MB/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
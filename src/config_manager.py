@@ -37,14 +37,17 @@ class ConfigManager:
     def save_device_config(
         self, ip: str, port: int, username: str, password: str, **kwargs
     ):
-        """保存设备配置"""
-        config = {
-            "ip": ip,
-            "port": port,
-            "username": username,
-            "password": password,
-            "last_login": True,
-        }
+        """保存设备配置(保留已有的其他配置项，如录制选项)"""
+        config = dict(self.configs.get(ip, {}))
+        config.update(
+            {
+                "ip": ip,
+                "port": port,
+                "username": username,
+                "password": password,
+                "last_login": True,
+            }
+        )
         # 添加其他参数
         config.update(kwargs)
 
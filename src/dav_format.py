@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+大华DAV(DHAV)容器帧格式定义
+
+RAW_DATA回调和StartSaveRealData录制得到的码流都由DHAV帧组成：
+    24字节帧头 + 扩展头(ext_len) + 负载 + 8字节帧尾('dhav' + 帧长)
+"""
+
+import struct
+import time
+
+DAV_MAGIC = b"DHAV"
+DAV_TAIL_MAGIC = b"dhav"
+
+# 帧头: magic, type, sub_type, channel, sub_frame, frame_no, frame_len, date, ts_ms, ext_len, checksum
+DAV_HEADER = struct.Struct("<4sBBBBIIIHBB")
+DAV_HEADER_SIZE = DAV_HEADER.size  # 24
+DAV_TAIL = struct.Struct("<4sI")
+DAV_TAIL_SIZE = DAV_TAIL.size  # 8
+
+# 帧类型
+DAV_FRAME_I = 0xFD
+DAV_FRAME_P = 0xFC
+DAV_FRAME_B = 0xFE
+DAV_FRAME_AUDIO = 0xF0
+DAV_FRAME_AUX = 0xF1
+
+VIDEO_FRAME_TYPES = (DAV_FRAME_I, DAV_FRAME_P, DAV_FRAME_B)
+
+# 扩展头中的视频编码类型
+DAV_CODEC_NAMES = {
+    0x01: "MPEG4",
+    0x02: "H264",
+    0x04: "H264",
+    0x08: "H264",
+    0x0C: "H265",
+}
+DAV_CODEC_H264 = 0x02
+DAV_CODEC_H265 = 0x0C
+
+
+def pack_dav_date(timestamp: float) -> int:
+    """把Unix时间打包为DHAV帧头中的32位日期字段(本地时间)"""
+    t = time.localtime(timestamp)
+    return (
+        ((t.tm_year - 2000) & 0x3F) << 26
+        | (t.tm_mon & 0xF) << 22
+        | (t.tm_mday & 0x1F) << 17
+        | (t.tm_hour & 0x1F) << 12
+        | (t.tm_min & 0x3F) << 6
+        | (t.tm_sec & 0x3F)
+    )
+
+
+def unpack_dav_date(date: int) -> float:
+    """把DHAV帧头中的32位日期字段还原为Unix时间(秒)"""
+    try:
+        return time.mktime(
+            (
+                (date >> 26) + 2000,
+                (date >> 22) & 0xF,
+                (date >> 17) & 0x1F,
+                (date >> 12) & 0x1F,
+                (date >> 6) & 0x3F,
+                date & 0x3F,
+                0,
+                0,
+                -1,
+            )
+        )
+    except (OverflowError, ValueError):
+        return 0.0
+
+
+def is_dav_keyframe(data, offset: int = 0) -> bool:
+    """判断data[offset:]是否以DHAV I帧开头"""
+    return (
+        len(data) >= offset + 5
+        and data[offset : offset + 4] == DAV_MAGIC
+        and data[offset + 4] == DAV_FRAME_I
+    )
+
+
+def build_dav_frame(
+    frame_type: int,
+    frame_no: int,
+    timestamp: float,
+    payload: bytes,
+    channel: int = 0,
+    codec: int = DAV_CODEC_H264,
+    frame_rate: int = 25,
+) -> bytes:
+    """构造一个完整的DHAV帧(供模拟器和测试数据使用)"""
+    if frame_type in VIDEO_FRAME_TYPES:
+        # 0x81扩展: 保留, 编码类型, 帧率, 保留
+        ext = bytes((0x81, 0, codec & 0xFF, frame_rate & 0xFF))
+    else:
+        ext = b""
+    frame_len = DAV_HEADER_SIZE + len(ext) + len(payload) + DAV_TAIL_SIZE
+    header = DAV_HEADER.pack(
+        DAV_MAGIC,
+        frame_type,
+        0,
+        channel & 0xFF,
+        0,
+        frame_no & 0xFFFFFFFF,
+        frame_len,
+        pack_dav_date(timestamp),
+        int(timestamp * 1000) & 0xFFFF,
+        len(ext),
+        0,
+    )
+    return b"".join((header, ext, payload, DAV_TAIL.pack(DAV_TAIL_MAGIC, frame_len)))
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DAV文件解析和关键帧索引
+
+DavReader 用 mmap 打开录像文件，逐个读取DHAV帧头，得到帧类型、时间、编码和偏移，
+不读取负载数据。帧头损坏时向后查找下一个 'DHAV' 继续解析，末尾不完整的帧(录制中)忽略。
+
+KeyframeIndex 保存每个I帧的 (时间, 偏移)，写入录像旁的 .idx 文件(每个I帧16字节)，
+按时间查找I帧、计算时长、截取片段只需二分查找，不再扫描整个文件。
+索引记录文件大小和修改时间，文件变化后自动失效；文件只是变长(仍在录制)时从上次位置继续解析。
+
+示例:
+    python src/dav_reader.py info record_192_168_1_108_ch0_20231211_143025.dav
+    python src/dav_reader.py frames record.dav --limit 20
+    python src/dav_reader.py index /data/record/*.dav
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+from dav_format import (
+    DAV_CODEC_NAMES,
+    DAV_FRAME_I,
+    DAV_HEADER,
+    DAV_HEADER_SIZE,
+    DAV_MAGIC,
+    DAV_TAIL_SIZE,
+    VIDEO_FRAME_TYPES,
+    unpack_dav_date,
+)
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"DAVIDX01"
+# 索引头: magic, 文件大小, 修改时间(ns), 已解析到的偏移, 帧数, 首帧时间, 末帧时间, 编码, 帧率, I帧数
+INDEX_HEADER = struct.Struct("<8sQqQQddBBxxI")
+
+# 帧时间与帧头日期相差超过此值时重新对齐(设备校时、文件拼接等)
+RESYNC_SECONDS = 2.0
+
+# 扩展头中各类型的长度(字节)，与ffmpeg的dhav解析一致
+_EXT_SIZES = {
+    0x80: 4,
+    0x81: 4,
+    0x82: 8,
+    0x83: 4,
+    0x84: 4,
+    0x85: 4,
+    0x88: 8,
+    0x8B: 4,
+    0x8C: 8,
+    0x91: 8,
+    0x92: 8,
+    0x93: 8,
+    0x94: 4,
+    0x95: 8,
+    0x96: 4,
+    0x9A: 8,
+    0x9B: 8,
+    0xA0: 4,
+    0xB2: 4,
+    0xB3: 8,
+    0xB4: 4,
+}
+
+
+class DavFrame(NamedTuple):
+    offset: int  # 帧在文件中的偏移
+    length: int  # 整帧长度(含帧头帧尾)
+    type: int  # DAV_FRAME_*
+    frame_no: int
+    timestamp: float  # Unix时间(秒)
+    channel: int
+    codec: int  # 视频编码(扩展头0x81)，没有时为0
+    frame_rate: int
+
+    @property
+    def is_keyframe(self) -> bool:
+        return self.type == DAV_FRAME_I
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+
+def parse_dav_ext(data, start: int, length: int) -> Tuple[int, int]:
+    """解析帧头后的扩展头，返回 (视频编码, 帧率)，没有对应字段时为0"""
+    codec = frame_rate = 0
+    pos, end = start, start + length
+    while pos < end:
+        kind = data[pos]
+        size = _EXT_SIZES.get(kind)
+        if size is None or pos + size > end:
+            break
+        if kind == 0x81:
+            codec = data[pos + 2]
+            frame_rate = data[pos + 3]
+        pos += size
+    return codec, frame_rate
+
+
+class _Clock:
+    """把帧头中的日期(秒)和16位毫秒计数换算为连续的时间"""
+
+    __slots__ = ("base", "base_ms", "last_ms", "unwrapped", "last_date", "date_time")
+
+    def __init__(self):
+        self.base = None
+        self.last_date = None
+        self.date_time = 0.0
+
+    def time(self, date: int, ts_ms: int) -> float:
+        if date != self.last_date:
+            self.last_date = date
+            self.date_time = unpack_dav_date(date)
+        if self.base is not None:
+            self.unwrapped += (ts_ms - self.last_ms) & 0xFFFF
+            self.last_ms = ts_ms
+            t = self.base + (self.unwrapped - self.base_ms) / 1000.0
+            if abs(t - self.date_time) <= RESYNC_SECONDS:
+                return t
+        # 第一帧或时间不连续：以帧头日期为准
+        self.base = self.date_time
+        self.base_ms = self.unwrapped = self.last_ms = ts_ms
+        return self.base
+
+
+def iter_dav_frames(
+    data, start: int = 0, end: Optional[int] = None
+) -> Iterator[DavFrame]:
+    """
+    依次返回 data[start:end] 中的完整DHAV帧
+    :param data: bytes/bytearray/mmap
+    """
+    if end is None:
+        end = len(data)
+    unpack_from = DAV_HEADER.unpack_from
+    find = data.find
+    clock = _Clock()
+    offset = start
+    while offset + DAV_HEADER_SIZE <= end:
+        (
+            magic,
+            frame_type,
+            _sub_type,
+            channel,
+            _sub_frame,
+            frame_no,
+            frame_len,
+            date,
+            ts_ms,
+            ext_len,
+            _checksum,
+        ) = unpack_from(data, offset)
+        if magic != DAV_MAGIC or frame_len < DAV_HEADER_SIZE + ext_len + DAV_TAIL_SIZE:
+            # 数据损坏，查找下一个帧头
+            offset = find(DAV_MAGIC, offset + 1, end)
+            if offset < 0:
+                return
+            continue
+        if offset + frame_len > end:
+            # 不完整的帧(文件仍在写入或被截断)
+            return
+        codec = frame_rate = 0
+        if ext_len and frame_type in VIDEO_FRAME_TYPES:
+            codec, frame_rate = parse_dav_ext(data, offset + DAV_HEADER_SIZE, ext_len)
+        yield DavFrame(
+            offset,
+            frame_len,
+            frame_type,
+            frame_no,
+            clock.time(date, ts_ms),
+            channel,
+            codec,
+            frame_rate,
+        )
+        offset += frame_len
+
+
+def index_path(dav_path: str) -> str:
+    return dav_path + INDEX_SUFFIX
+
+
+def remove_index(dav_path: str):
+    """删除录像对应的索引文件(录像被删除时调用)"""
+    try:
+        os.remove(index_path(dav_path))
+    except OSError:
+        pass
+
+
+class KeyframeIndex:
+    """一个DAV文件的I帧 (时间, 偏移) 索引"""
+
+    def __init__(self):
+        self.times = array("d")
+        self.offsets = array("Q")
+        self.file_size = 0
+        self.mtime_ns = 0
+        self.scanned = 0  # 已解析到的偏移(最后一个完整帧之后)
+        self.frames = 0
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self.codec = 0
+        self.frame_rate = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def duration(self) -> float:
+        return max(self.end_time - self.start_time, 0.0)
+
+    @property
+    def codec_name(self) -> str:
+        return DAV_CODEC_NAMES.get(self.codec, f"0x{self.codec:02X}")
+
+    def update(self, data, file_size: int, mtime_ns: int):
+        """从上次解析的位置继续解析到 file_size"""
+        for frame in iter_dav_frames(data, self.scanned, file_size):
+            if self.frames == 0:
+                self.start_time = frame.timestamp
+            self.frames += 1
+            self.end_time = frame.timestamp
+            if frame.type == DAV_FRAME_I:
+                self.times.append(frame.timestamp)
+                self.offsets.append(frame.offset)
+                if frame.codec:
+                    self.codec = frame.codec
+                    self.frame_rate = frame.frame_rate
+            self.scanned = frame.end
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+
+    def keyframe_before(self, timestamp: float) -> int:
+        """时间不晚于 timestamp 的最后一个I帧的序号，全部晚于它时返回0"""
+        return max(bisect_right(self.times, timestamp) - 1, 0)
+
+    def keyframe_after(self, timestamp: float) -> int:
+        """时间不早于 timestamp 的第一个I帧的序号，没有时返回len(self)"""
+        return bisect_left(self.times, timestamp)
+
+    def seek(self, timestamp: float) -> int:
+        """从 timestamp 开始解码需要的起始偏移(之前最近的I帧)"""
+        if not self.offsets:
+            return 0
+        return self.offsets[self.keyframe_before(timestamp)]
+
+    def save(self, path: str):
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC,
+            self.file_size,
+            self.mtime_ns,
+            self.scanned,
+            self.frames,
+            self.start_time,
+            self.end_time,
+            self.codec,
+            self.frame_rate,
+            len(self.offsets),
+        )
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(header)
+            self.times.tofile(f)
+            self.offsets.tofile(f)
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["KeyframeIndex"]:
+        """读取索引文件，格式不符时返回None"""
+        try:
+            with open(path, "rb") as f:
+                header = f.read(INDEX_HEADER.size)
+                if len(header) != INDEX_HEADER.size:
+                    return None
+                fields = INDEX_HEADER.unpack(header)
+                if fields[0] != INDEX_MAGIC:
+                    return None
+                index = cls()
+                (
+                    _,
+                    index.file_size,
+                    index.mtime_ns,
+                    index.scanned,
+                    index.frames,
+                    index.start_time,
+                    index.end_time,
+                    index.codec,
+                    index.frame_rate,
+                    count,
+                ) = fields
+                index.times.fromfile(f, count)
+                index.offsets.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        if sys.byteorder != "little":
+            index.times.byteswap()
+            index.offsets.byteswap()
+        return index
+
+
+class DavReader:
+    """用mmap读取DAV文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        st = os.fstat(self._file.fileno())
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.data = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.size
+            else b""
+        )
+        self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b""
+        self._file.close()
+
+    def frames(self, start: int = 0, end: Optional[int] = None) -> Iterator[DavFrame]:
+        return iter_dav_frames(self.data, start, self.size if end is None else end)
+
+    def index(self, save: bool = True) -> KeyframeIndex:
+        """
+        读取或建立I帧索引
+        索引文件与录像大小、修改时间一致时直接使用；录像变长时继续解析新增部分
+        :param save: 建立或更新后写入 .idx 文件
+        """
+        if self._index is not None:
+            return self._index
+        sidecar = index_path(self.path)
+        index = KeyframeIndex.load(sidecar)
+        if index is not None and (
+            index.file_size == self.size and index.mtime_ns == self.mtime_ns
+        ):
+            self._index = index
+            return index
+        if index is None or index.scanned > self.size:
+            index = KeyframeIndex()
+        index.update(self.data, self.size, self.mtime_ns)
+        if save:
+            try:
+                index.save(sidecar)
+            except OSError as e:
+                print(f"写入索引文件失败({sidecar}): {e}")
+        self._index = index
+        return index
+
+
+def _format_time(timestamp: float) -> str:
+    if not timestamp:
+        return "-"
+    t = time.localtime(timestamp)
+    return (
+        time.strftime("%Y-%m-%d %H:%M:%S", t) + f".{int(timestamp * 1000) % 1000:03d}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DAV文件解析和I帧索引")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="显示时长、编码和I帧数")
+    info.add_argument("files", nargs="+")
+    frames = commands.add_parser("frames", help="列出帧")
+    frames.add_argument("file")
+    frames.add_argument("--limit", type=int, default=50)
+    build = commands.add_parser("index", help="建立/更新 .idx 索引文件")
+    build.add_argument("files", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "frames":
+        with DavReader(args.file) as reader:
+            for i, frame in enumerate(reader.frames()):
+                if i >= args.limit:
+                    break
+                print(
+                    f"{frame.offset:>12}  0x{frame.type:02X}  #{frame.frame_no:<8} "
+                    f"{_format_time(frame.timestamp)}  {frame.length:>8} 字节"
+                )
+        return 0
+
+    for path in args.files:
+        started = time.perf_counter()
+        try:
+            with DavReader(path) as reader:
+                index = reader.index(save=True)
+        except OSError as e:
+            print(f"{path}: {e}")
+            continue
+        elapsed = (time.perf_counter() - started) * 1000
+        if args.command == "index":
+            print(f"{path}: {len(index)} 个I帧 ({elapsed:.1f} ms)")
+            continue
+        print(path)
+        print(f"  开始: {_format_time(index.start_time)}")
+        print(f"  结束: {_format_time(index.end_time)}")
+        print(f"  时长: {index.duration:.3f} 秒, 帧数 {index.frames}, I帧 {len(index)}")
+        print(f"  编码: {index.codec_name}, 帧率 {index.frame_rate}")
+        print(f"  大小: {index.file_size} 字节 (索引 {elapsed:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,7 +21,7 @@ from init_device_dialog_ui import Ui_InitDeviceDialog
 from config_manager import ConfigManager
 from DahuaCamMain import DahuaCamWindow
 
-from NetSDK.NetSDK import NetClient
+from sdk_context import get_sdk_context
 
 from NetSDK.SDK_Enum import EM_SEND_SEARCH_TYPE
 from NetSDK.SDK_Struct import (
@@ -176,8 +176,9 @@ class DeviceSearchWindow(QMainWindow, Ui_DeviceSearchWindow):
         self.setupUi(self)
 
         # 初始化变量
-        self.sdk = NetClient()
-        self.sdk.InitEx(None, 0)
+        # 获取进程共享的NetSDK对象，摄像机窗口共用同一个SDK实例
+        self.sdk_context = get_sdk_context()
+        self.sdk = self.sdk_context.acquire()
 
         self.config_manager = ConfigManager()
         self.device_info_list = []
@@ -556,8 +557,8 @@ class DeviceSearchWindow(QMainWindow, Ui_DeviceSearchWindow):
             if window:
                 window.close()
 
-        # 清理SDK
-        self.sdk.Cleanup()
+        # 释放SDK引用(所有窗口都关闭后才会真正清理SDK)
+        self.sdk_context.release()
 
         event.accept()
 
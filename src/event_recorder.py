@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+动检触发录制
+
+动检 Start 事件为通道打开一个录像片段(开启预录时片段从预录缓冲开始)，
+Stop 事件后再录 post_roll 秒才关闭；关闭前的新事件会延长当前片段，不新建文件。
+
+报警回调(SDK线程)中只把事件放入队列，片段的打开/关闭由本模块的工作线程决定，
+实际的会话调用通过 submit 执行：后台程序直接在工作线程中调用，
+界面中传入 SDKCommandExecutor，保证会话只在一个线程中被调用。
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from alarm_events import MOTION_COMMANDS, AlarmEvent
+from camera_session import TRIGGER_MOTION, media_filename
+
+# 动检事件动作(AlarmEvent.action，即 nEventAction)
+MOTION_PULSE = 0
+MOTION_START = 1
+MOTION_STOP = 2
+
+DEFAULT_POST_ROLL = 10.0  # Stop之后继续录制的时间(秒)
+
+_STOP = object()
+_RESET = object()
+
+
+def _run_inline(fn, *args):
+    fn(*args)
+
+
+class _Clip:
+    """一个动检录像片段"""
+
+    __slots__ = (
+        "path",
+        "started",
+        "active",
+        "close_at",
+        "events",
+        "owned",
+        "generation",
+    )
+
+    def __init__(self, path: str, started: float, generation: int):
+        self.path = path
+        self.started = started
+        self.generation = generation  # 创建时的会话代数，会话重置后的片段操作不再执行
+        self.active = 0  # 尚未收到Stop的Start事件数
+        self.close_at = None  # 计划关闭时间(monotonic)，None表示动检仍在进行
+        self.events = 0  # 片段内的事件数
+        self.owned = False  # 是否由本模块开始录制(通道已在手动录制时为False)
+
+
+class EventRecorder:
+    """按动检事件为会话的各通道录制片段"""
+
+    def __init__(
+        self,
+        session,
+        output_dir: str,
+        post_roll: float = DEFAULT_POST_ROLL,
+        channels: Optional[Iterable[int]] = None,
+        stream_type: int = 0,
+        auto_preview: bool = True,
+        submit: Optional[Callable] = None,
+    ):
+        """
+        :param channels: 只响应这些通道的事件，None表示全部通道
+        :param auto_preview: 通道没有预览时是否自动打开(不渲染)
+        :param submit: submit(fn, *args) 执行会话调用，默认在工作线程中直接调用
+        """
+        self.session = session
+        self.output_dir = output_dir
+        self.post_roll = max(post_roll, 0.0)
+        self.channels = set(channels) if channels is not None else None
+        self.stream_type = stream_type
+        self.auto_preview = auto_preview
+        self._submit = submit or _run_inline
+        self._events = queue.SimpleQueue()
+        self._clips = {}  # 通道 -> _Clip，只在工作线程中访问
+        self._generation = 0  # 会话重置次数，只在工作线程中修改
+
+        self.events = 0  # 收到的动检事件数
+        self.clips_opened = 0
+        self.clips_extended = 0  # 因重叠事件延长片段的次数
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"EventRecorder-{session.ip}", daemon=True
+        )
+        self._thread.start()
+
+    def on_alarm(self, event: AlarmEvent):
+        """报警回调中调用(SDK线程)，只处理动检事件"""
+        if event.command in MOTION_COMMANDS:
+            self.motion(event.channel, event.action)
+
+    def motion(self, channel: int, action: int):
+        """提交一个动检事件(任意线程)"""
+        self._events.put((channel, action, time.monotonic()))
+
+    def reset(self, timeout: float = 5.0):
+        """
+        丢弃片段状态，在会话重置(登出)之前调用，等待工作线程处理完已收到的事件；
+        之前的片段尚未执行的打开/关闭操作不再执行(录制随预览一起关闭)
+        """
+        done = threading.Event()
+        self._events.put((_RESET, done))
+        if self._thread is not threading.current_thread():
+            done.wait(timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """关闭所有片段并停止工作线程"""
+        self._events.put(_STOP)
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def active_channels(self):
+        return sorted(self._clips)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._events.get(timeout=self._next_timeout())
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is None:
+                pass
+            elif item[0] is _RESET:
+                self._generation += 1
+                self._clips.clear()
+                item[1].set()
+            else:
+                self._handle(*item)
+            self._close_due(time.monotonic())
+
+        for channel in list(self._clips):
+            self._close(channel)
+
+    def _next_timeout(self) -> Optional[float]:
+        deadlines = [c.close_at for c in self._clips.values() if c.close_at is not None]
+        if not deadlines:
+            return None
+        return max(min(deadlines) - time.monotonic(), 0.0)
+
+    def _handle(self, channel: int, action: int, when: float):
+        if self.channels is not None and channel not in self.channels:
+            return
+        if action not in (MOTION_PULSE, MOTION_START, MOTION_STOP):
+            return
+        self.events += 1
+        clip = self._clips.get(channel)
+        if clip is None:
+            if action == MOTION_STOP:
+                # 片段已关闭后才到达的Stop
+                return
+            path = os.path.join(
+                self.output_dir,
+                media_filename("record", self.session.ip, channel, "dav"),
+            )
+            clip = self._clips[channel] = _Clip(path, when, self._generation)
+            self.clips_opened += 1
+            self._submit(self._open_clip, channel, clip)
+        elif clip.close_at is not None and action != MOTION_STOP:
+            # 处于post_roll阶段的新事件：延长当前片段
+            self.clips_extended += 1
+
+        clip.events += 1
+        if action == MOTION_START:
+            clip.active += 1
+            clip.close_at = None
+        elif action == MOTION_STOP:
+            clip.active = max(clip.active - 1, 0)
+        if clip.active == 0 and action != MOTION_START:
+            clip.close_at = when + self.post_roll
+
+    def _close_due(self, now: float):
+        for channel, clip in list(self._clips.items()):
+            if clip.close_at is not None and clip.close_at <= now:
+                self._close(channel)
+
+    def _close(self, channel: int):
+        clip = self._clips.pop(channel)
+        self._submit(self._close_clip, channel, clip)
+
+    # 以下两个方法通过 submit 执行，会话调用都在这里
+    def _open_clip(self, channel: int, clip: _Clip):
+        if clip.generation != self._generation:
+            return
+        session = self.session
+        stream = session.streams.get(channel)
+        if stream is None and self.auto_preview:
+            stream, error_msg = session.start_preview(channel, self.stream_type)
+            if stream is None:
+                print(f"[{session.ip}] 通道{channel}动检录制打开预览失败: {error_msg}")
+                return
+        if stream is None:
+            print(f"[{session.ip}] 通道{channel}未预览，忽略动检事件")
+            return
+        if stream.is_recording:
+            print(f"[{session.ip}] 通道{channel}已在录制，动检事件并入当前录制")
+            return
+        ok, error_msg = session.start_record(channel, clip.path, event=TRIGGER_MOTION)
+        clip.owned = ok
+        if ok:
+            print(f"[{session.ip}] 通道{channel}动检录制开始: {clip.path}")
+        else:
+            print(f"[{session.ip}] 通道{channel}动检录制失败: {error_msg}")
+
+    def _close_clip(self, channel: int, clip: _Clip):
+        if not clip.owned or clip.generation != self._generation:
+            return
+        clip.owned = False
+        ok, error_msg = self.session.stop_record(channel)
+        duration = time.monotonic() - clip.started
+        if ok:
+            print(
+                f"[{self.session.ip}] 通道{channel}动检录制结束: {clip.path} "
+                f"({duration:.0f}秒, {clip.events}个事件)"
+            )
+        else:
+            print(f"[{self.session.ip}] 通道{channel}停止动检录制失败: {error_msg}")
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "clips_opened": self.clips_opened,
+            "clips_extended": self.clips_extended,
+            "active_channels": self.active_channels(),
+        }
@@ -0,0 +1,789 @@
+# -*- coding: utf-8 -*-
+"""
+NetSDK模拟器 - 纯Python实现的NetClient替身
+
+无需真实摄像机即可在Linux上运行应用和压测回调代码：
+按配置的速率产生DHAV码流、解码后的YUV帧、抓拍图片、动检报警和设备搜索应答，
+并统计每类回调在"SDK线程"中占用的时间。
+
+启用方式: 设置环境变量 DAHUA_SDK_BACKEND=fake (见 sdk_backend.py)
+"""
+
+import ctypes
+import itertools
+import os
+import threading
+import time
+from ctypes import (
+    CFUNCTYPE,
+    POINTER,
+    Structure,
+    c_char,
+    c_int,
+    c_long,
+    c_longlong,
+    c_ubyte,
+    c_uint,
+    c_ulonglong,
+    c_void_p,
+    cast,
+    pointer,
+    string_at,
+)
+from dataclasses import dataclass, field, fields
+from enum import IntEnum
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+
+from dav_format import (
+    DAV_FRAME_I,
+    DAV_FRAME_P,
+    DAV_MAGIC,
+    VIDEO_FRAME_TYPES,
+    build_dav_frame,
+)
+
+# ----------------------------------------------------------------------
+# NetSDK类型
+# 未安装NetSDK时使用下面的简化替身(仅包含应用和模拟器用到的成员和字段)，
+# camera_session、alarm_events 等模块导入NetSDK失败时从这里导入同名定义，
+# 模拟器后端因此可以在没有NetSDK的环境中运行
+# ----------------------------------------------------------------------
+try:
+    from NetSDK import SDK_Struct
+    from NetSDK.SDK_Callback import CB_FUNCTYPE, fDecCBFun, fRealDataCallBackEx2
+    from NetSDK.SDK_Enum import (
+        EM_DEV_CFG_TYPE,
+        EM_LOGIN_SPAC_CAP_TYPE,
+        EM_REALDATA_FLAG,
+        SDK_ALARM_TYPE,
+        SDK_RealPlayType,
+    )
+    from NetSDK.SDK_Struct import (
+        ALARM_MOTIONDETECT_INFO,
+        C_DWORD,
+        C_LDWORD,
+        C_LLONG,
+        DEVICE_NET_INFO_EX,
+        DEVICE_NET_INFO_EX2,
+        FRAME_INFO,
+        NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY,
+        NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY,
+        NET_TIME,
+        SNAP_PARAMS,
+    )
+except Exception:
+    C_LLONG = c_longlong
+    C_DWORD = c_uint
+    C_LDWORD = c_ulonglong
+
+    class EM_DEV_CFG_TYPE(IntEnum):
+        TIMECFG = 8
+
+    class EM_LOGIN_SPAC_CAP_TYPE(IntEnum):
+        TCP = 0
+
+    class EM_REALDATA_FLAG(IntEnum):
+        RAW_DATA = 1
+
+    class SDK_ALARM_TYPE(IntEnum):
+        EVENT_MOTIONDETECT = 0x218F
+
+    class SDK_RealPlayType(IntEnum):
+        Realplay = 0
+        Realplay_1 = 1
+
+    class NET_IN_LOGIN_WITH_HIGHLEVEL_SECURITY(Structure):
+        _fields_ = [
+            ("dwSize", C_DWORD),
+            ("szIP", c_char * 64),
+            ("nPort", c_int),
+            ("szUserName", c_char * 64),
+            ("szPassword", c_char * 64),
+            ("emSpecCap", c_int),
+        ]
+
+    class NET_OUT_LOGIN_WITH_HIGHLEVEL_SECURITY(Structure):
+        _fields_ = [("dwSize", C_DWORD)]
+
+    class NET_TIME(Structure):
+        _fields_ = [
+            (name, C_DWORD)
+            for name in (
+                "dwYear",
+                "dwMonth",
+                "dwDay",
+                "dwHour",
+                "dwMinute",
+                "dwSecond",
+            )
+        ]
+
+    class SNAP_PARAMS(Structure):
+        _fields_ = [
+            ("Channel", c_uint),
+            ("Quality", c_uint),
+            ("ImageSize", c_uint),
+            ("mode", c_uint),
+            ("InterSnap", c_uint),
+            ("CmdSerial", c_uint),
+            ("Reserved", c_uint * 4),
+        ]
+
+    class ALARM_MOTIONDETECT_INFO(Structure):
+        _fields_ = [("nChannelID", c_int), ("nEventAction", c_int)]
+
+    class FRAME_INFO(Structure):
+        _fields_ = [
+            ("nWidth", c_long),
+            ("nHeight", c_long),
+            ("nStamp", c_long),
+            ("nType", c_long),
+            ("nFrameRate", c_long),
+            ("dwFrameNum", c_uint),
+        ]
+
+    class DEVICE_NET_INFO_EX(Structure):
+        _fields_ = [
+            ("iIPVersion", c_int),
+            ("szIP", c_char * 64),
+            ("nPort", c_int),
+            ("szSubmask", c_char * 64),
+            ("szGateway", c_char * 64),
+            ("szMac", c_char * 40),
+            ("szDeviceType", c_char * 32),
+            ("byInitStatus", c_ubyte),
+            ("byPwdResetWay", c_ubyte),
+            ("nHttpPort", c_int),
+            ("szDetailType", c_char * 32),
+        ]
+
+    class DEVICE_NET_INFO_EX2(Structure):
+        _fields_ = [("stuDevInfo", DEVICE_NET_INFO_EX), ("szLocalIP", c_char * 64)]
+
+    # 模拟器直接在Python中调用回调，使用CFUNCTYPE即可
+    CB_FUNCTYPE = CFUNCTYPE
+    fRealDataCallBackEx2 = CFUNCTYPE(
+        None, C_LLONG, C_DWORD, POINTER(c_ubyte), C_DWORD, C_LLONG, C_LDWORD
+    )
+    fDecCBFun = CFUNCTYPE(
+        None, c_long, POINTER(c_ubyte), c_long, POINTER(FRAME_INFO), c_void_p, c_long
+    )
+
+    # alarm_events 按结构体名查找报警结构体
+    SDK_Struct = SimpleNamespace(ALARM_MOTIONDETECT_INFO=ALARM_MOTIONDETECT_INFO)
+
+EVENT_MOTIONDETECT = int(SDK_ALARM_TYPE.EVENT_MOTIONDETECT)
+
+# PlaySDK解码帧类型: YUV420
+FRAME_TYPE_YUV = 3
+# 实时数据回调中的原始码流类型
+REALDATA_TYPE_RAW = 0
+# 抓拍编码类型: JPEG
+SNAP_ENCODE_JPEG = 0
+
+
+@dataclass
+class SimulatorConfig:
+    """模拟器参数，所有速率均为每秒次数"""
+
+    channels: int = 4
+    login_delay: float = 0.05  # 登录耗时(秒)
+    call_delay: float = 0.0  # 其他阻塞调用耗时(秒)
+    unreachable: str = ""  # 逗号分隔的不可达IP，登录会在login_delay后失败
+    frame_rate: float = 25.0
+    gop: int = 50  # I帧间隔(帧)
+    bitrate_kbps: int = 2048
+    width: int = 640  # 解码输出分辨率
+    height: int = 360
+    snap_delay: float = 0.2  # 抓拍应答延迟(秒)
+    snap_size: int = 64 * 1024
+    motion_rate: float = 1.0  # 每个监听中登录句柄的动检事件速率
+    discovery_devices: int = 8
+    discovery_rate: float = 50.0
+    reboot_delay: float = 5.0  # 重启后多久触发重连回调
+
+    @classmethod
+    def from_env(cls, prefix: str = "DAHUA_FAKE_") -> "SimulatorConfig":
+        """从环境变量读取参数，例如 DAHUA_FAKE_FRAME_RATE=30"""
+        config = cls()
+        for f in fields(cls):
+            value = os.environ.get(prefix + f.name.upper())
+            if value is None:
+                continue
+            try:
+                setattr(config, f.name, type(getattr(config, f.name))(value))
+            except ValueError:
+                print(f"忽略无效的模拟器参数 {prefix + f.name.upper()}={value}")
+        return config
+
+
+class FakeDeviceInfo:
+    """登录返回的设备信息(NET_DEVICEINFO_Ex的简化版)"""
+
+    def __init__(self, channels: int, serial: str):
+        self.nChanNum = channels
+        self.sSerialNumber = serial.encode()
+
+
+@dataclass
+class CallbackStats:
+    """单类回调的调用次数与耗时统计"""
+
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+
+    def add(self, elapsed_ns: int):
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    @property
+    def avg_us(self) -> float:
+        return self.total_ns / self.calls / 1000 if self.calls else 0.0
+
+
+@dataclass
+class _PlayState:
+    login_id: int
+    channel: int
+    hwnd: int
+    stop_event: threading.Event = field(default_factory=threading.Event)
+    data_callback: object = None
+    data_user: int = 0
+    save_files: Dict[int, object] = field(default_factory=dict)
+
+
+def _coerce(arg, argtype):
+    """按CFUNCTYPE的参数类型转换参数，使模拟器能直接调用应用注册的ctypes回调"""
+    if argtype is None or not isinstance(
+        arg, (ctypes.Array, Structure, ctypes._Pointer)
+    ):
+        return arg
+    if isinstance(arg, Structure):
+        arg = pointer(arg)
+    if isinstance(argtype, type) and issubclass(argtype, ctypes._Pointer):
+        return cast(arg, argtype)
+    if argtype is ctypes.c_void_p:
+        return cast(arg, ctypes.c_void_p)
+    return arg
+
+
+class FakeNetClient:
+    """NetClient模拟实现，方法签名与应用中使用的NetClient方法保持一致"""
+
+    def __init__(self, config: Optional[SimulatorConfig] = None):
+        self.config = config or SimulatorConfig.from_env()
+        self._ids = itertools.count(0x10000001)
+        self._lock = threading.Lock()
+        self._last_error = ""
+
+        self._disconnect_cb = None
+        self._disconnect_user = 0
+        self._reconnect_cb = None
+        self._reconnect_user = 0
+        self._alarm_cb = None
+        self._alarm_user = 0
+        self._snap_cb = None
+        self._snap_user = 0
+
+        self._logins: Dict[int, Tuple[str, int]] = {}
+        self._plays: Dict[int, _PlayState] = {}
+        self._records: Dict[int, int] = {}  # recordID -> playID
+        self._ports: Dict[int, dict] = {}
+        self._listens: Dict[int, threading.Event] = {}
+        self._searches: Dict[int, threading.Event] = {}
+
+        self.stats: Dict[str, CallbackStats] = {}
+        self._payload_cache: Dict[int, bytes] = {}
+        self._yuv_frames = None
+
+    # ------------------------------------------------------------------
+    # 内部工具
+    # ------------------------------------------------------------------
+    def _invoke(self, kind: str, callback, *args):
+        """调用应用回调并记录耗时，回调异常不会中断模拟线程"""
+        if callback is None:
+            return
+        argtypes = getattr(callback, "argtypes", None)
+        if argtypes:
+            args = tuple(_coerce(a, t) for a, t in zip(args, argtypes))
+        start = time.perf_counter_ns()
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"模拟器{kind}回调异常: {e}")
+        elapsed = time.perf_counter_ns() - start
+        with self._lock:
+            self.stats.setdefault(kind, CallbackStats()).add(elapsed)
+
+    def _delay(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _fail(self, message: str):
+        self._last_error = message
+        return 0
+
+    def _last_error_for(self, message: str) -> str:
+        self._last_error = message
+        return message
+
+    def _payload(self, size: int) -> bytes:
+        data = self._payload_cache.get(size)
+        if data is None:
+            data = bytes(i & 0xFF for i in range(size))
+            self._payload_cache[size] = data
+        return data
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    # ------------------------------------------------------------------
+    # 初始化与日志
+    # ------------------------------------------------------------------
+    def InitEx(self, call_back=None, user_data=0, init_param=None):
+        self._disconnect_cb = call_back
+        self._disconnect_user = user_data
+        return True
+
+    def SetAutoReconnect(self, call_back=None, user_data=0):
+        self._reconnect_cb = call_back
+        self._reconnect_user = user_data
+
+    def SetDVRMessCallBackEx1(self, call_back=None, user_data=0):
+        self._alarm_cb = call_back
+        self._alarm_user = user_data
+
+    def SetSnapRevCallBack(self, call_back=None, user_data=0):
+        self._snap_cb = call_back
+        self._snap_user = user_data
+
+    def Cleanup(self):
+        for play_id in list(self._plays):
+            self.StopRealPlayEx(play_id)
+        for event in list(self._listens.values()) + list(self._searches.values()):
+            event.set()
+        self._listens.clear()
+        self._searches.clear()
+        self._logins.clear()
+
+    def LogOpen(self, log_info):
+        return True
+
+    def LogClose(self):
+        return True
+
+    def GetLastErrorMessage(self):
+        return self._last_error
+
+    # ------------------------------------------------------------------
+    # 登录与设备控制
+    # ------------------------------------------------------------------
+    def LoginWithHighLevelSecurity(self, stuInParam, stuOutParam):
+        ip = bytes(stuInParam.szIP).split(b"\0", 1)[0].decode()
+        self._delay(self.config.login_delay)
+        unreachable = [s.strip() for s in self.config.unreachable.split(",")]
+        if ip in unreachable:
+            return 0, None, self._last_error_for(f"连接设备超时: {ip}")
+        login_id = next(self._ids)
+        self._logins[login_id] = (ip, int(stuInParam.nPort))
+        return login_id, FakeDeviceInfo(self.config.channels, f"FAKE{login_id:X}"), ""
+
+    def Logout(self, lLoginID):
+        self.StopListen(lLoginID)
+        for play_id, play in list(self._plays.items()):
+            if play.login_id == lLoginID:
+                self.StopRealPlayEx(play_id)
+        return self._logins.pop(lLoginID, None) is not None
+
+    def GetDevConfig(self, lLoginID, dwCommand, lChannel, lpOutBuffer, dwOutBufferSize):
+        self._delay(self.config.call_delay)
+        if lLoginID not in self._logins:
+            return self._fail("无效的登录句柄")
+        now = time.localtime()
+        for name, value in (
+            ("dwYear", now.tm_year),
+            ("dwMonth", now.tm_mon),
+            ("dwDay", now.tm_mday),
+            ("dwHour", now.tm_hour),
+            ("dwMinute", now.tm_min),
+            ("dwSecond", now.tm_sec),
+        ):
+            if hasattr(lpOutBuffer, name):
+                setattr(lpOutBuffer, name, value)
+        return True
+
+    def SetDevConfig(self, lLoginID, dwCommand, lChannel, lpInBuffer, dwInBufferSize):
+        self._delay(self.config.call_delay)
+        return True if lLoginID in self._logins else self._fail("无效的登录句柄")
+
+    def PTZControlEx2(
+        self, lLoginID, nChannelID, dwPTZCommand, lParam1, lParam2, lParam3, dwStop
+    ):
+        self._delay(self.config.call_delay)
+        return True if lLoginID in self._logins else self._fail("无效的登录句柄")
+
+    def RebootDev(self, lLoginID):
+        self._delay(self.config.call_delay)
+        if lLoginID not in self._logins:
+            return self._fail("无效的登录句柄")
+        self.simulate_disconnect(lLoginID, self.config.reboot_delay)
+        return True
+
+    def simulate_disconnect(
+        self, login_id: int, reconnect_after: Optional[float] = None
+    ):
+        """模拟设备断线，可选在指定秒数后触发重连回调"""
+        ip, port = self._logins.get(login_id, ("0.0.0.0", 0))
+        self._invoke(
+            "disconnect",
+            self._disconnect_cb,
+            login_id,
+            ip.encode(),
+            port,
+            self._disconnect_user,
+        )
+        if reconnect_after is not None:
+            timer = threading.Timer(
+                reconnect_after,
+                self._invoke,
+                (
+                    "reconnect",
+                    self._reconnect_cb,
+                    login_id,
+                    ip.encode(),
+                    port,
+                    self._reconnect_user,
+                ),
+            )
+            timer.daemon = True
+            timer.start()
+
+    # ------------------------------------------------------------------
+    # 实时预览与录制
+    # ------------------------------------------------------------------
+    def RealPlayEx(self, lLoginID, nChannelID, hWnd, rType=0):
+        self._delay(self.config.call_delay)
+        if lLoginID not in self._logins:
+            return self._fail("无效的登录句柄")
+        if not 0 <= nChannelID < self.config.channels:
+            return self._fail(f"无效的通道号: {nChannelID}")
+        play_id = next(self._ids)
+        play = _PlayState(login_id=lLoginID, channel=nChannelID, hwnd=hWnd)
+        self._plays[play_id] = play
+        self._spawn(self._stream_loop, play_id, play)
+        return play_id
+
+    def StopRealPlayEx(self, lRealHandle):
+        play = self._plays.pop(lRealHandle, None)
+        if play is None:
+            return False
+        play.stop_event.set()
+        for record_id in list(play.save_files):
+            self.StopSaveRealData(record_id)
+        return True
+
+    def SetRealDataCallBackEx2(self, lRealHandle, cbRealData, dwUser, dwFlag):
+        play = self._plays.get(lRealHandle)
+        if play is None:
+            return False
+        play.data_callback = cbRealData
+        play.data_user = dwUser or 0
+        return True
+
+    def StartSaveRealData(self, lRealHandle, pchFileName, *args):
+        play = self._plays.get(lRealHandle)
+        if play is None:
+            return self._fail("无效的预览句柄")
+        path = pchFileName.decode() if isinstance(pchFileName, bytes) else pchFileName
+        try:
+            handle = open(path, "ab", buffering=1024 * 1024)
+        except OSError as e:
+            return self._fail(f"打开录制文件失败: {e}")
+        record_id = next(self._ids)
+        play.save_files[record_id] = handle
+        self._records[record_id] = lRealHandle
+        return record_id
+
+    def StopSaveRealData(self, lRealHandle):
+        play_id = self._records.pop(lRealHandle, None)
+        play = self._plays.get(play_id)
+        handle = play.save_files.pop(lRealHandle, None) if play else None
+        if handle is None:
+            return False
+        handle.close()
+        return True
+
+    def _stream_loop(self, play_id: int, play: _PlayState):
+        """按帧率产生DHAV帧，交给数据回调、录制文件"""
+        cfg = self.config
+        interval = 1.0 / max(cfg.frame_rate, 0.1)
+        p_size = max(int(cfg.bitrate_kbps * 1000 / 8 / max(cfg.frame_rate, 0.1)), 64)
+        frame_no = 0
+        next_time = time.monotonic()
+        while not play.stop_event.is_set():
+            frame_type = DAV_FRAME_I if frame_no % max(cfg.gop, 1) == 0 else DAV_FRAME_P
+            payload = self._payload(p_size * 4 if frame_type == DAV_FRAME_I else p_size)
+            packet = build_dav_frame(
+                frame_type,
+                frame_no,
+                time.time(),
+                payload,
+                play.channel,
+                frame_rate=int(cfg.frame_rate),
+            )
+            frame_no += 1
+            buf = (c_ubyte * len(packet)).from_buffer_copy(packet)
+            self._invoke(
+                "realdata",
+                play.data_callback,
+                play_id,
+                REALDATA_TYPE_RAW,
+                buf,
+                len(packet),
+                0,
+                play.data_user,
+            )
+            for handle in list(play.save_files.values()):
+                try:
+                    handle.write(packet)
+                except (OSError, ValueError):
+                    pass
+
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                play.stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # PlaySDK解码
+    # ------------------------------------------------------------------
+    def GetFreePort(self):
+        port = len(self._ports) + 1
+        while port in self._ports:
+            port += 1
+        self._ports[port] = {"dec_cb": None, "frames": 0}
+        return True, c_int(port)
+
+    def OpenStream(self, nPort, *args):
+        return self._port_id(nPort) in self._ports
+
+    def Play(self, nPort, hWnd=0):
+        return self._port_id(nPort) in self._ports
+
+    def Stop(self, nPort):
+        return True
+
+    def CloseStream(self, nPort):
+        return True
+
+    def ReleasePort(self, nPort):
+        return self._ports.pop(self._port_id(nPort), None) is not None
+
+    def SetDecCallBack(self, nPort, DecCBFun):
+        state = self._ports.get(self._port_id(nPort))
+        if state is None:
+            return False
+        state["dec_cb"] = DecCBFun
+        return True
+
+    def _port_id(self, nPort) -> int:
+        return int(getattr(nPort, "value", nPort))
+
+    def InputData(self, nPort, pBuf, nSize):
+        """每输入一个视频帧，同步"解码"出一帧YUV420并调用解码回调"""
+        port = self._port_id(nPort)
+        state = self._ports.get(port)
+        if state is None:
+            return False
+        if state["dec_cb"] is None or nSize < 5:
+            return True
+        head = (
+            string_at(pBuf, 5)
+            if not isinstance(pBuf, (bytes, bytearray))
+            else bytes(pBuf[:5])
+        )
+        if head[:4] != DAV_MAGIC or head[4] not in VIDEO_FRAME_TYPES:
+            return True
+
+        frames = self._synthetic_yuv()
+        yuv = frames[state["frames"] % len(frames)]
+        state["frames"] += 1
+        info = FRAME_INFO()
+        info.nWidth = self.config.width
+        info.nHeight = self.config.height
+        info.nType = FRAME_TYPE_YUV
+        info.nFrameRate = int(self.config.frame_rate)
+        info.nStamp = int(time.monotonic() * 1000) & 0x7FFFFFFF
+        if hasattr(info, "dwFrameNum"):
+            info.dwFrameNum = state["frames"]
+        self._invoke(
+            "decode",
+            state["dec_cb"],
+            port,
+            cast(yuv, POINTER(c_char)),
+            len(yuv),
+            pointer(info),
+            None,
+            0,
+        )
+        return True
+
+    def _synthetic_yuv(self):
+        """预先生成几帧亮度不同的I420图像，循环输出"""
+        if self._yuv_frames is None:
+            w, h = self.config.width, self.config.height
+            y_size, c_size = w * h, (w // 2) * (h // 2)
+            frames = []
+            for level in (16, 80, 144, 208):
+                data = bytes([level]) * y_size + bytes([128]) * (2 * c_size)
+                frames.append((c_ubyte * len(data)).from_buffer_copy(data))
+            self._yuv_frames = frames
+        return self._yuv_frames
+
+    # ------------------------------------------------------------------
+    # 抓拍
+    # ------------------------------------------------------------------
+    def SnapPictureEx(self, lLoginID, par, reserved=0):
+        self._delay(self.config.call_delay)
+        if lLoginID not in self._logins:
+            return self._fail("无效的登录句柄")
+        serial = int(getattr(par, "CmdSerial", 0))
+        timer = threading.Timer(
+            self.config.snap_delay, self._deliver_snap, (lLoginID, serial)
+        )
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _deliver_snap(self, login_id: int, serial: int):
+        size = max(self.config.snap_size, 4)
+        jpeg = b"\xff\xd8" + self._payload(size - 4) + b"\xff\xd9"
+        buf = (c_ubyte * len(jpeg)).from_buffer_copy(jpeg)
+        self._invoke(
+            "snap",
+            self._snap_cb,
+            login_id,
+            buf,
+            len(jpeg),
+            SNAP_ENCODE_JPEG,
+            serial,
+            self._snap_user,
+        )
+
+    # ------------------------------------------------------------------
+    # 报警监听
+    # ------------------------------------------------------------------
+    def StartListenEx(self, lLoginID):
+        if lLoginID not in self._logins:
+            return self._fail("无效的登录句柄")
+        if lLoginID not in self._listens:
+            stop_event = threading.Event()
+            self._listens[lLoginID] = stop_event
+            self._spawn(self._alarm_loop, lLoginID, stop_event)
+        return True
+
+    def StopListen(self, lLoginID):
+        stop_event = self._listens.pop(lLoginID, None)
+        if stop_event is None:
+            return False
+        stop_event.set()
+        return True
+
+    def _alarm_loop(self, login_id: int, stop_event: threading.Event):
+        """轮流在各通道上产生 开始 -> 脉冲 -> 结束 的动检事件"""
+        if self.config.motion_rate <= 0:
+            return
+        interval = 1.0 / self.config.motion_rate
+        ip, port = self._logins.get(login_id, ("0.0.0.0", 0))
+        actions = (1, 0, 2)
+        for n in itertools.count():
+            if stop_event.wait(interval):
+                break
+            info = ALARM_MOTIONDETECT_INFO()
+            info.nChannelID = (n // len(actions)) % self.config.channels
+            info.nEventAction = actions[n % len(actions)]
+            self._invoke(
+                "alarm",
+                self._alarm_cb,
+                EVENT_MOTIONDETECT,
+                login_id,
+                cast(pointer(info), POINTER(c_char)),
+                ctypes.sizeof(info),
+                ip.encode(),
+                port,
+                0,
+                n,
+                self._alarm_user,
+            )
+
+    # ------------------------------------------------------------------
+    # 设备搜索与初始化
+    # ------------------------------------------------------------------
+    def _fake_device(self, info, index: int, ip: Optional[str] = None):
+        info.iIPVersion = 4
+        info.szIP = (ip or f"192.168.1.{100 + index % 150}").encode()
+        info.nPort = 37777
+        info.szSubmask = b"255.255.255.0"
+        info.szGateway = b"192.168.1.1"
+        info.szMac = f"02:00:00:00:{index // 256 % 256:02x}:{index % 256:02x}".encode()
+        info.szDeviceType = b"IPC"
+        info.szDetailType = b"FAKE-IPC"
+        info.byInitStatus = 2
+        info.byPwdResetWay = 0
+        info.nHttpPort = 80
+        return info
+
+    def StartSearchDevicesEx(self, pInBuf, pOutBuf):
+        search_id = next(self._ids)
+        stop_event = threading.Event()
+        self._searches[search_id] = stop_event
+        local_ip = bytes(pInBuf.szLocalIp).split(b"\0", 1)[0]
+        self._spawn(
+            self._search_loop, search_id, pInBuf.cbSearchDevices, local_ip, stop_event
+        )
+        return search_id
+
+    def StopSearchDevices(self, lSearchHandle):
+        stop_event = self._searches.pop(lSearchHandle, None)
+        if stop_event is not None:
+            stop_event.set()
+        return True
+
+    def _search_loop(self, search_id, callback, local_ip, stop_event):
+        interval = 1.0 / max(self.config.discovery_rate, 0.1)
+        for i in range(self.config.discovery_devices):
+            if stop_event.wait(interval):
+                break
+            info = DEVICE_NET_INFO_EX2()
+            self._fake_device(info.stuDevInfo, i)
+            info.szLocalIP = local_ip
+            self._invoke("search", callback, search_id, pointer(info), None)
+
+    def SearchDevicesByIPs(
+        self, pIpSearchInfo, cbSearchDevices, dwUserData, szLocalIp, dwWaitTime
+    ):
+        ips = [
+            bytes(pIpSearchInfo.szIP[i].IP).split(b"\0", 1)[0].decode()
+            for i in range(pIpSearchInfo.nIpNum)
+        ]
+        self._spawn(self._search_by_ip_loop, ips, cbSearchDevices, dwUserData)
+        return True
+
+    def _search_by_ip_loop(self, ips, callback, user_data):
+        interval = 1.0 / max(self.config.discovery_rate, 0.1)
+        for i, ip in enumerate(ips[: self.config.discovery_devices]):
+            time.sleep(interval)
+            info = self._fake_device(DEVICE_NET_INFO_EX(), i, ip)
+            self._invoke("search", callback, pointer(info), user_data)
+
+    def InitDevAccount(self, pInitAccountIn, pInitAccountOut, dwWaitTime, szLocalIp):
+        self._delay(self.config.call_delay)
+        return True
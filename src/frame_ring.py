@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+解码帧环形缓冲区
+
+PlaySDK解码回调(DecodingCallBack)中把YUV帧用一次 memmove 拷贝进预先分配的固定槽位，
+不做逐帧内存分配。每帧分配一个递增的序号，消费者可以取最新帧，也可以按序号读取。
+
+写入端(解码线程)不等待任何读者：每个槽位带有序号，写入前置为-1，写完再写入新序号；
+读者拷贝前后各检查一次槽位序号(seqlock)，期间被覆盖的读取直接作废，不会阻塞解码线程。
+"""
+
+import threading
+import time
+from ctypes import c_char, memmove
+from typing import Optional
+
+# PlaySDK解码帧类型: YUV420(I420)
+FRAME_TYPE_YUV420 = 3
+
+
+class DecodedFrame:
+    """一帧解码后的图像(数据为读取时拷贝出来的副本)"""
+
+    __slots__ = ("seq", "width", "height", "timestamp", "data")
+
+    def __init__(self, seq: int, width: int, height: int, timestamp: int, data):
+        self.seq = seq
+        self.width = width
+        self.height = height
+        self.timestamp = timestamp  # 解码器时间戳(毫秒)
+        self.data = data
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+class _Slot:
+    __slots__ = ("seq", "buffer", "size", "width", "height", "timestamp")
+
+    def __init__(self):
+        self.seq = 0  # 0: 空, -1: 写入中
+        self.buffer = None
+        self.size = 0
+        self.width = 0
+        self.height = 0
+        self.timestamp = 0
+
+
+class FrameRing:
+    """固定槽位数的解码帧环形缓冲区，一个写入者，多个读者"""
+
+    def __init__(self, slot_count: int = 3, slot_bytes: int = 0):
+        """
+        :param slot_count: 槽位数量
+        :param slot_bytes: 每个槽位的初始容量，0表示按第一帧大小分配
+        """
+        if slot_count < 2:
+            raise ValueError("slot_count 至少为2")
+        self._slots = [_Slot() for _ in range(slot_count)]
+        if slot_bytes > 0:
+            for slot in self._slots:
+                slot.buffer = (c_char * slot_bytes)()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._waiters = 0
+        self.dropped = 0  # 读取时已被覆盖的次数
+        self.reallocations = 0  # 分辨率变大导致的槽位重新分配次数
+
+    @property
+    def slot_count(self) -> int:
+        return len(self._slots)
+
+    @property
+    def latest_seq(self) -> int:
+        """最新完整帧的序号，0表示还没有帧"""
+        return self._seq
+
+    def push(self, src, size: int, width: int, height: int, timestamp: int = 0) -> int:
+        """
+        写入一帧(解码线程中调用)，返回该帧序号
+        :param src: 指向YUV数据的ctypes指针或地址
+        """
+        seq = self._seq + 1
+        slot = self._slots[seq % len(self._slots)]
+        slot.seq = -1
+        if slot.buffer is None or len(slot.buffer) < size:
+            # 只在首帧或分辨率变大时分配
+            if slot.buffer is not None:
+                self.reallocations += 1
+            slot.buffer = (c_char * size)()
+        memmove(slot.buffer, src, size)
+        slot.size = size
+        slot.width = width
+        slot.height = height
+        slot.timestamp = timestamp
+        slot.seq = seq
+        self._seq = seq
+
+        if self._waiters:
+            with self._cond:
+                self._cond.notify_all()
+        return seq
+
+    def read_into(self, seq: int, out) -> Optional[DecodedFrame]:
+        """
+        把指定序号的帧拷贝到调用者提供的缓冲区(bytearray等可写缓冲)，不分配帧数据
+        :return: 帧信息(data为out的memoryview切片)，帧不存在或已被覆盖时返回None
+        """
+        if seq <= 0 or seq > self._seq:
+            return None
+        slot = self._slots[seq % len(self._slots)]
+        if slot.seq != seq:
+            self.dropped += 1
+            return None
+        size, width, height, timestamp = (
+            slot.size,
+            slot.width,
+            slot.height,
+            slot.timestamp,
+        )
+        if len(out) < size:
+            raise ValueError(f"缓冲区太小: {len(out)} < {size}")
+        view = memoryview(out)
+        memmove((c_char * size).from_buffer(view), slot.buffer, size)
+        if slot.seq != seq:
+            # 拷贝期间被解码线程覆盖
+            self.dropped += 1
+            return None
+        return DecodedFrame(seq, width, height, timestamp, view[:size])
+
+    def get(self, seq: int) -> Optional[DecodedFrame]:
+        """读取指定序号的帧(拷贝一份数据)，帧不存在或已被覆盖时返回None"""
+        if seq <= 0 or seq > self._seq:
+            return None
+        slot = self._slots[seq % len(self._slots)]
+        buffer = bytearray(slot.size)
+        return self.read_into(seq, buffer)
+
+    def latest(self) -> Optional[DecodedFrame]:
+        """读取最新的一帧，没有帧时返回None"""
+        for _ in range(len(self._slots)):
+            seq = self._seq
+            if seq == 0:
+                return None
+            frame = self.get(seq)
+            if frame is not None:
+                return frame
+        return None
+
+    def wait(self, after_seq: int, timeout: Optional[float] = None) -> int:
+        """
+        等待序号大于 after_seq 的新帧，返回最新序号(超时返回当前序号)
+        """
+        if self._seq > after_seq:
+            return self._seq
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiters += 1
+            try:
+                while self._seq <= after_seq:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+        return self._seq
+
+    def reset(self):
+        """清空所有帧(保留已分配的槽位)"""
+        for slot in self._slots:
+            slot.seq = 0
+            slot.size = 0
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+解码帧订阅 - 多个消费者共享同一路解码流
+
+FrameHub 在自己的分发线程中从 FrameRing 读取新帧(每帧只拷贝一次)，
+把同一个 DecodedFrame 对象交给每个订阅者。分发只做非阻塞的入队操作，
+慢的消费者只会丢掉自己的帧，不会拖慢解码线程、显示或其他消费者。
+
+订阅策略:
+    POLICY_LATEST     只保留最新一帧
+    POLICY_QUEUE      有界队列，满时丢弃最旧的帧
+    POLICY_EVERY_NTH  每N帧取一帧，再放入有界队列
+
+消费者可以用 get()/poll() 拉取帧，也可以传入 callback，由订阅自己的线程回调。
+"""
+
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from frame_ring import DecodedFrame, FrameRing
+
+POLICY_LATEST = "latest"
+POLICY_QUEUE = "queue"
+POLICY_EVERY_NTH = "every_nth"
+POLICIES = (POLICY_LATEST, POLICY_QUEUE, POLICY_EVERY_NTH)
+
+
+class FrameSubscription:
+    """单个消费者的订阅，统计各自的丢帧情况"""
+
+    def __init__(
+        self,
+        hub: "FrameHub",
+        name: str,
+        policy: str = POLICY_LATEST,
+        maxsize: int = 1,
+        nth: int = 1,
+        callback: Optional[Callable[[DecodedFrame], None]] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的订阅策略: {policy}")
+        if maxsize < 1 or nth < 1:
+            raise ValueError("maxsize 和 nth 必须为正整数")
+        self.hub = hub
+        self.name = name
+        self.policy = policy
+        self.nth = nth if policy == POLICY_EVERY_NTH else 1
+        self.capacity = 1 if policy == POLICY_LATEST else maxsize
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.offered = 0  # 分发给本订阅的帧数
+        self.delivered = 0  # 被消费者取走的帧数
+        self.dropped = 0  # 消费者来不及处理而被丢弃的帧数
+        self.skipped = 0  # 按每N帧策略跳过的帧数
+
+        self._thread = None
+        if callback is not None:
+            self._thread = threading.Thread(
+                target=self._run_callback,
+                args=(callback,),
+                name=f"FrameSubscriber-{name}",
+                daemon=True,
+            )
+            self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def pending(self) -> int:
+        """尚未取走的帧数"""
+        return len(self._frames)
+
+    def _offer(self, frame: DecodedFrame):
+        """分发线程调用，不阻塞"""
+        self.offered += 1
+        if self.nth > 1 and (self.offered - 1) % self.nth:
+            self.skipped += 1
+            return
+        with self._cond:
+            if len(self._frames) >= self.capacity:
+                self._frames.popleft()
+                self.dropped += 1
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[DecodedFrame]:
+        """取下一帧，超时或订阅已关闭时返回None"""
+        with self._cond:
+            if not self._frames and not self._closed and timeout != 0:
+                self._cond.wait_for(lambda: self._frames or self._closed, timeout)
+            if not self._frames:
+                return None
+            self.delivered += 1
+            return self._frames.popleft()
+
+    def poll(self) -> Optional[DecodedFrame]:
+        """非阻塞取帧"""
+        return self.get(timeout=0)
+
+    def close(self):
+        """取消订阅"""
+        self.hub.unsubscribe(self)
+        with self._cond:
+            self._closed = True
+            self._frames.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "policy": self.policy,
+            "offered": self.offered,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "pending": self.pending,
+        }
+
+    def _run_callback(self, callback):
+        while not self._closed:
+            frame = self.get(timeout=0.5)
+            if frame is None:
+                continue
+            try:
+                callback(frame)
+            except Exception as e:
+                print(f"帧订阅回调错误({self.name}): {e}")
+
+
+class FrameHub:
+    """一路解码流的订阅分发器"""
+
+    def __init__(self, ring: FrameRing, name: str = ""):
+        self.ring = ring
+        self.name = name
+        self._subscriptions: List[FrameSubscription] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.missed = 0  # 分发线程读取前已被解码线程覆盖的帧数
+
+    def subscribe(
+        self,
+        name: str,
+        policy: str = POLICY_LATEST,
+        maxsize: int = 1,
+        nth: int = 1,
+        callback: Optional[Callable[[DecodedFrame], None]] = None,
+    ) -> FrameSubscription:
+        """添加一个订阅，首次订阅时启动分发线程"""
+        subscription = FrameSubscription(self, name, policy, maxsize, nth, callback)
+        with self._lock:
+            # 复制后替换，分发线程遍历时无需加锁
+            self._subscriptions = self._subscriptions + [subscription]
+            if self._thread is None and not self._stop_event.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"FrameHub-{self.name}", daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: FrameSubscription):
+        with self._lock:
+            self._subscriptions = [
+                s for s in self._subscriptions if s is not subscription
+            ]
+
+    def subscriptions(self) -> List[FrameSubscription]:
+        return list(self._subscriptions)
+
+    def stop(self):
+        """停止分发并关闭所有订阅"""
+        self._stop_event.set()
+        for subscription in self.subscriptions():
+            subscription.close()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        last = self.ring.latest_seq
+        while not self._stop_event.is_set():
+            seq = self.ring.wait(last, timeout=0.5)
+            if seq == last:
+                continue
+            subscriptions = self._subscriptions
+            if not subscriptions:
+                last = seq
+                continue
+            # 依次分发尚留在环形缓冲区中的帧，已被覆盖的计入 missed
+            first = max(last + 1, seq - self.ring.slot_count + 1)
+            self.missed += first - last - 1
+            for current in range(first, seq + 1):
+                frame = self.ring.get(current)
+                if frame is None:
+                    self.missed += 1
+                    continue
+                for subscription in subscriptions:
+                    subscription._offer(frame)
+            last = seq
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+录像/抓拍索引(SQLite)
+
+记录每个文件的路径、设备IP、通道、类型、起止时间、大小和触发方式，
+按 (ip, channel, start) 建索引，按设备和时间段查询不需要遍历目录。
+
+文件关闭时由会话通知写入索引(录像分段、抓拍)；程序外新增或删除的文件通过 rescan() 增量同步：
+记录每个目录的修改时间，目录未变化时不再列出其中的文件。
+
+示例:
+    python src/media_catalog.py --db media_catalog.db rescan capture
+    python src/media_catalog.py query --ip 192.168.1.108 --channel 0 \\
+        --from "2023-12-11 14:00" --to "2023-12-11 15:00"
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from segment_writer import MANIFEST_NAME, read_manifest
+
+CATALOG_NAME = "media_catalog.db"
+
+KIND_RECORD = "record"
+KIND_CAPTURE = "capture"
+
+# 没有清单记录时录像结束时间取修改时间，超过此时长视为复制/修改过的文件，不可信
+MAX_INFERRED_DURATION = 6 * 3600
+
+MEDIA_EXTENSIONS = {
+    ".dav": KIND_RECORD,
+    ".mp4": KIND_RECORD,
+    ".jpg": KIND_CAPTURE,
+    ".jpeg": KIND_CAPTURE,
+    ".png": KIND_CAPTURE,
+}
+
+# media_filename 生成的文件名: {kind}_{ip}_ch{n}_{%Y%m%d_%H%M%S}[_{seq}].{ext}
+_FILENAME_RE = re.compile(
+    r"^(?P<kind>[a-z]+)_(?P<ip>\d+_\d+_\d+_\d+)_ch(?P<channel>\d+)_"
+    r"(?P<ts>\d{8}_\d{6})(?:_(?P<seq>\d+))?\.(?P<ext>\w+)$"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    dir TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    channel INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0,
+    event TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_media_device_time ON media(ip, channel, start);
+CREATE INDEX IF NOT EXISTS idx_media_start ON media(start);
+CREATE INDEX IF NOT EXISTS idx_media_end ON media(end);
+CREATE INDEX IF NOT EXISTS idx_media_device_end ON media(ip, end);
+CREATE INDEX IF NOT EXISTS idx_media_dir ON media(dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+_COLUMNS = "path, ip, channel, kind, start, end, size, seq, event"
+
+
+class MediaRecord(NamedTuple):
+    path: str
+    ip: str
+    channel: int
+    kind: str
+    start: float
+    end: float
+    size: int
+    seq: int
+    event: str
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def parse_media_filename(name: str) -> Optional[dict]:
+    """解析 media_filename 生成的文件名，不匹配时返回None"""
+    match = _FILENAME_RE.match(name)
+    if match is None:
+        return None
+    try:
+        start = time.mktime(time.strptime(match.group("ts"), "%Y%m%d_%H%M%S"))
+    except ValueError:
+        return None
+    return {
+        "kind": match.group("kind"),
+        "ip": match.group("ip").replace("_", "."),
+        "channel": int(match.group("channel")),
+        "start": start,
+        "seq": int(match.group("seq") or 0),
+        "ext": match.group("ext"),
+    }
+
+
+def parse_time(text: str) -> float:
+    """解析命令行中的时间: Unix时间或 'YYYY-mm-dd HH:MM[:SS]'"""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法解析时间: {text}")
+
+
+class MediaCatalog:
+    """录像/抓拍索引，线程安全"""
+
+    def __init__(self, db_path: str = CATALOG_NAME):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            row = self._conn.execute("SELECT MAX(end - start) FROM media").fetchone()
+        # 最长文件时长，用于把时间段重叠查询限制在索引范围内
+        self._max_duration = row[0] or 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def add(
+        self,
+        path: str,
+        ip: str,
+        channel: int,
+        kind: str,
+        start: float,
+        end: float,
+        size: int,
+        seq: int = 0,
+        event: str = "",
+        mtime: Optional[float] = None,
+    ):
+        """添加或更新一个文件"""
+        path = os.path.abspath(path)
+        if mtime is None:
+            # 与扫描时比较的修改时间一致，避免下次扫描重复更新
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                mtime = end
+        row = (path, os.path.dirname(path), ip, channel, kind, start, end, size)
+        with self._lock:
+            self._upsert([row + (mtime, seq, event)])
+            self._conn.commit()
+
+    def add_entry(self, entry: dict):
+        """按会话的文件关闭通知(与录像清单的字段相同，另含完整路径path)添加"""
+        path = entry["path"]
+        kind = entry.get("kind") or MEDIA_EXTENSIONS.get(
+            os.path.splitext(path)[1].lower(), KIND_RECORD
+        )
+        self.add(
+            path,
+            entry.get("ip", ""),
+            int(entry.get("channel", -1)),
+            kind,
+            float(entry["start"]),
+            float(entry.get("end", entry["start"])),
+            int(entry.get("bytes", 0)),
+            seq=int(entry.get("seq", 0)),
+            event=entry.get("event", ""),
+        )
+
+    def add_file(self, path: str, event: str = "") -> Optional[MediaRecord]:
+        """按文件名和文件属性添加一个已存在的文件"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        row = self._row_from_file(os.path.abspath(path), st, {})
+        if row is None:
+            return None
+        if event:
+            row = row[:-1] + (event,)
+        with self._lock:
+            self._upsert([row])
+            self._conn.commit()
+        return MediaRecord(row[0], *row[2:8], *row[9:])
+
+    def remove(self, paths: Iterable[str]) -> int:
+        """从索引中删除文件(不删除磁盘文件)"""
+        rows = [(os.path.abspath(p),) for p in paths]
+        with self._lock:
+            cursor = self._conn.executemany("DELETE FROM media WHERE path = ?", rows)
+            self._conn.commit()
+        return cursor.rowcount
+
+    def _upsert(self, rows):
+        self._conn.executemany(
+            """
+            INSERT INTO media (path, dir, ip, channel, kind, start, end, size, mtime, seq, event)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                ip = excluded.ip, channel = excluded.channel, kind = excluded.kind,
+                start = excluded.start, end = excluded.end, size = excluded.size,
+                mtime = excluded.mtime, seq = excluded.seq,
+                event = CASE WHEN excluded.event != '' THEN excluded.event ELSE event END
+            """,
+            rows,
+        )
+        for row in rows:
+            duration = row[6] - row[5]
+            if duration > self._max_duration:
+                self._max_duration = duration
+
+    @staticmethod
+    def _row_from_file(path: str, st, manifest: Dict[str, dict]):
+        name = os.path.basename(path)
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in MEDIA_EXTENSIONS:
+            return None
+        info = parse_media_filename(name)
+        entry = manifest.get(name)
+        if entry is not None:
+            ip, channel = entry.get("ip", ""), int(entry.get("channel", -1))
+            start, end = float(entry["start"]), float(entry["end"])
+            seq, event = int(entry.get("seq", 0)), entry.get("event", "")
+            kind = info["kind"] if info else MEDIA_EXTENSIONS[ext]
+        elif info is not None:
+            ip, channel, kind, seq, event = (
+                info["ip"],
+                info["channel"],
+                info["kind"],
+                info["seq"],
+                "",
+            )
+            start = info["start"]
+            # 录像结束时间取最后修改时间，图片为瞬时
+            end = start
+            if MEDIA_EXTENSIONS[ext] == KIND_RECORD:
+                if 0 < st.st_mtime - start <= MAX_INFERRED_DURATION:
+                    end = st.st_mtime
+        else:
+            # 程序外的文件：没有设备信息，按修改时间计
+            ip, channel, kind, seq, event = "", -1, MEDIA_EXTENSIONS[ext], 0, ""
+            start = end = st.st_mtime
+        return (
+            path,
+            os.path.dirname(path),
+            ip,
+            channel,
+            kind,
+            start,
+            end,
+            st.st_size,
+            st.st_mtime,
+            seq,
+            event,
+        )
+
+    # ------------------------------------------------------------------
+    # 增量扫描
+    # ------------------------------------------------------------------
+    def rescan(self, root: str, full: bool = False) -> dict:
+        """
+        把目录树与索引同步
+        :param full: True时忽略目录修改时间，重新列出所有目录(用于检测文件内容变化)
+        :return: 统计 added/updated/removed/scanned_dirs/skipped_dirs
+        """
+        root = os.path.abspath(root)
+        stats = dict(added=0, updated=0, removed=0, scanned_dirs=0, skipped_dirs=0)
+        with self._lock:
+            prefix = root.rstrip(os.sep) + os.sep
+            known_dirs = dict(
+                self._conn.execute(
+                    "SELECT path, mtime FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (root, len(prefix), prefix),
+                ).fetchall()
+            )
+        children = {}
+        for path in known_dirs:
+            children.setdefault(os.path.dirname(path), []).append(path)
+
+        seen_dirs = set()
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                dir_mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            seen_dirs.add(directory)
+            if not full and known_dirs.get(directory) == dir_mtime:
+                # 目录内没有增删文件，只需继续检查已知的子目录
+                stats["skipped_dirs"] += 1
+                stack.extend(children.get(directory, ()))
+                continue
+            stats["scanned_dirs"] += 1
+            self._scan_dir(directory, dir_mtime, stack, stats)
+
+        removed_dirs = [(d,) for d in known_dirs if d not in seen_dirs]
+        if removed_dirs:
+            with self._lock:
+                for (directory,) in removed_dirs:
+                    cursor = self._conn.execute(
+                        "DELETE FROM media WHERE dir = ?", (directory,)
+                    )
+                    stats["removed"] += cursor.rowcount
+                self._conn.executemany("DELETE FROM dirs WHERE path = ?", removed_dirs)
+                self._conn.commit()
+        return stats
+
+    def _scan_dir(self, directory: str, dir_mtime: float, stack: list, stats: dict):
+        files = {}
+        manifest = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name == MANIFEST_NAME:
+                        manifest = self._load_manifest(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in MEDIA_EXTENSIONS:
+                        files[entry.path] = entry
+        except OSError as e:
+            print(f"扫描目录失败({directory}): {e}")
+            return
+
+        with self._lock:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in self._conn.execute(
+                    "SELECT path, size, mtime FROM media WHERE dir = ?", (directory,)
+                )
+            }
+        rows = []
+        for path, entry in files.items():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            old = known.get(path)
+            if old == (st.st_size, st.st_mtime):
+                continue
+            row = self._row_from_file(path, st, manifest)
+            if row is None:
+                continue
+            rows.append(row)
+            stats["updated" if old is not None else "added"] += 1
+        missing = [(path,) for path in known if path not in files]
+
+        with self._lock:
+            if rows:
+                self._upsert(rows)
+            if missing:
+                self._conn.executemany("DELETE FROM media WHERE path = ?", missing)
+                stats["removed"] += len(missing)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)",
+                (directory, dir_mtime),
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _load_manifest(path: str) -> Dict[str, dict]:
+        """清单按文件名建立映射"""
+        try:
+            entries = read_manifest(path)
+        except OSError:
+            return {}
+        return {e["file"]: e for e in entries if isinstance(e, dict) and "file" in e}
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def query(
+        self,
+        ip: Optional[str] = None,
+        channel: Optional[int] = None,
+        kind: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        event: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[MediaRecord]:
+        """
+        查询与时间段 [start, end) 有重叠的文件，按开始时间排序
+        """
+        where, params = [], []
+        if ip is not None:
+            where.append("ip = ?")
+            params.append(ip)
+        if channel is not None:
+            where.append("channel = ?")
+            params.append(channel)
+        if kind is not None:
+            where.append("kind = ?")
+            params.append(kind)
+        if event is not None:
+            where.append("event = ?")
+            params.append(event)
+        if end is not None:
+            where.append("start < ?")
+            params.append(end)
+        if start is not None:
+            # 开始时间不早于 start - 最长时长，查询只扫描索引的一个范围
+            where.append("start >= ? AND end >= ?")
+            params.extend((start - self._max_duration, start))
+        sql = f"SELECT {_COLUMNS} FROM media"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY start"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [MediaRecord(*row) for row in rows]
+
+    def oldest(
+        self,
+        limit: int = 100,
+        ip: Optional[str] = None,
+        before: Optional[float] = None,
+        root: Optional[str] = None,
+    ) -> List[MediaRecord]:
+        """
+        最早的文件(按结束时间)，用于清理
+        :param before: 只返回结束时间早于此时间的文件
+        :param root: 只返回此目录树下的文件
+        """
+        where, params = self._root_clause(root)
+        if ip is not None:
+            where.append("ip = ?")
+            params.append(ip)
+        if before is not None:
+            where.append("end < ?")
+            params.append(before)
+        sql = f"SELECT {_COLUMNS} FROM media"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY end LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [MediaRecord(*row) for row in rows]
+
+    def usage(self, root: Optional[str] = None) -> Dict[str, int]:
+        """各设备占用的字节数，root 限定目录树"""
+        where, params = self._root_clause(root)
+        sql = "SELECT ip, SUM(size) FROM media"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY ip"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return {ip: size or 0 for ip, size in rows}
+
+    @staticmethod
+    def _root_clause(root: Optional[str]):
+        if root is None:
+            return [], []
+        root = os.path.abspath(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        return ["(dir = ? OR substr(dir, 1, ?) = ?)"], [root, len(prefix), prefix]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="录像/抓拍索引")
+    parser.add_argument("--db", default=CATALOG_NAME, help="索引数据库文件")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rescan = commands.add_parser("rescan", help="同步目录到索引")
+    rescan.add_argument("roots", nargs="+")
+    rescan.add_argument("--full", action="store_true", help="重新列出所有目录")
+
+    query = commands.add_parser("query", help="按设备和时间段查询")
+    query.add_argument("--ip")
+    query.add_argument("--channel", type=int)
+    query.add_argument("--kind", choices=(KIND_RECORD, KIND_CAPTURE))
+    query.add_argument("--event")
+    query.add_argument("--from", dest="start", type=parse_time)
+    query.add_argument("--to", dest="end", type=parse_time)
+    query.add_argument("--limit", type=int)
+    args = parser.parse_args(argv)
+
+    catalog = MediaCatalog(args.db)
+    try:
+        if args.command == "rescan":
+            for root in args.roots:
+                started = time.perf_counter()
+                stats = catalog.rescan(root, full=args.full)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"{root}: {stats} ({elapsed:.0f} ms)")
+            print(f"索引文件数: {catalog.count()}")
+        else:
+            started = time.perf_counter()
+            records = catalog.query(
+                args.ip,
+                args.channel,
+                args.kind,
+                args.start,
+                args.end,
+                args.event,
+                args.limit,
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+            for record in records:
+                begin = datetime.fromtimestamp(record.start).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                )
+                print(
+                    f"{begin}  {record.duration:8.1f}s  {record.size:>12}  "
+                    f"{record.event or '-':<10}  {record.path}"
+                )
+            print(f"共 {len(records)} 个文件 ({elapsed:.1f} ms)")
+    finally:
+        catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
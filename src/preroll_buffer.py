@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+预录缓冲 - 保留最近N秒的原始码流
+
+拉流回调中的每个数据包拷贝进一块预先分配的环形内存(一次 memmove，不逐包分配)，
+按时间和字节上限淘汰旧数据。淘汰以GOP为单位，缓冲区中最旧的数据包始终是I帧，
+录制开始时从这个I帧回放，得到的文件可以直接解码。
+
+PrerollBuffer 同时负责把数据包分发给已连接的写入端(StreamTee等)：
+attach() 在同一把锁内先回放预录数据再加入实时分发，预录和实时数据之间不丢包也不重复。
+"""
+
+import threading
+import time
+from collections import deque
+from ctypes import addressof, c_char, memmove, string_at
+from typing import List
+
+from dav_format import is_dav_keyframe
+
+DEFAULT_PREROLL_MAX_BYTES = 16 * 1024 * 1024  # 每路码流预录缓冲的内存上限
+
+
+class _Packet:
+    __slots__ = ("offset", "size", "time", "key")
+
+    def __init__(self, offset: int, size: int, when: float, key: bool):
+        self.offset = offset
+        self.size = size
+        self.time = when
+        self.key = key
+
+
+class PrerollBuffer:
+    """一路码流的预录环形缓冲和数据包分发"""
+
+    def __init__(
+        self, seconds: float = 0.0, max_bytes: int = DEFAULT_PREROLL_MAX_BYTES
+    ):
+        """
+        :param seconds: 预录时长，0表示不缓存(只做分发)
+        :param max_bytes: 缓冲内存上限，预先一次性分配
+        """
+        self.seconds = max(seconds, 0.0)
+        self.capacity = max_bytes if self.seconds > 0 else 0
+        self._ring = bytearray(self.capacity)
+        self._base = (
+            addressof((c_char * self.capacity).from_buffer(self._ring))
+            if self.capacity
+            else 0
+        )
+        self._packets = deque()
+        self._key_times = deque()  # 缓冲区中各I帧的时间
+        self._head = 0  # 下一个数据包的写入位置
+        self._lock = threading.Lock()
+        self._sinks: List = []
+
+        self.buffered_bytes = 0
+        self.packets = 0  # 收到的数据包数
+        self.evicted_packets = 0  # 因超出时长或内存上限被淘汰的数据包数
+        self.oversized_packets = 0  # 大于整个缓冲区而无法缓存的数据包数
+
+    @property
+    def enabled(self) -> bool:
+        """是否缓存预录数据"""
+        return self.capacity > 0
+
+    @property
+    def buffered_seconds(self) -> float:
+        packets = self._packets
+        if not packets:
+            return 0.0
+        return max(packets[-1].time - packets[0].time, 0.0)
+
+    def push(self, src, size: int):
+        """
+        写入一个数据包(拉流回调中调用)
+        :param src: 指向数据的ctypes指针或地址
+        """
+        if size <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.packets += 1
+            if self.capacity:
+                self._store(src, size, now)
+            for sink in self._sinks:
+                sink.write(src, size)
+
+    def attach(self, sink, replay: bool = True) -> int:
+        """
+        连接一个写入端(需提供 write(src, size))，之后的数据包实时写入
+        :param replay: 是否先写入缓冲中的预录数据
+        :return: 回放的字节数
+        """
+        replayed = 0
+        with self._lock:
+            if replay:
+                for packet in self._packets:
+                    sink.write(self._base + packet.offset, packet.size)
+                    replayed += packet.size
+            self._sinks = self._sinks + [sink]
+        return replayed
+
+    def detach(self, sink):
+        """断开写入端，返回后不会再向其写入数据"""
+        with self._lock:
+            self._sinks = [s for s in self._sinks if s is not sink]
+
+    def clear(self):
+        with self._lock:
+            self._drop_all()
+
+    def _store(self, src, size: int, now: float):
+        key = is_dav_keyframe(string_at(src, min(size, 5)))
+        if not self._packets and not key:
+            # 缓冲区总是从I帧开始，没有I帧之前的数据无法解码
+            return
+        if size > self.capacity:
+            self.oversized_packets += 1
+            self._drop_all()
+            return
+
+        offset = self._reserve(size)
+        if offset < 0:
+            # 为腾出空间淘汰了当前GOP，当前数据包也不再是完整GOP的一部分
+            if not key:
+                return
+            offset = self._reserve(size)
+        memmove(self._base + offset, src, size)
+        self._head = offset + size
+        self._packets.append(_Packet(offset, size, now, key))
+        self.buffered_bytes += size
+        if key:
+            self._key_times.append(now)
+
+        # 按时长淘汰：第二个I帧已早于预录起点时，最旧的GOP不再需要
+        cutoff = now - self.seconds
+        while len(self._key_times) >= 2 and self._key_times[1] <= cutoff:
+            self._evict_gop()
+
+    def _reserve(self, size: int) -> int:
+        """找到能放下 size 字节的连续空间，必要时淘汰旧GOP，返回偏移(-1表示淘汰后缓冲已空)"""
+        while self._packets:
+            tail = self._packets[0].offset
+            head = self._head
+            if tail < head:
+                # 数据位于 [tail, head)，可写在末尾或绕回开头
+                if head + size <= self.capacity:
+                    return head
+                if size <= tail:
+                    return 0
+            elif head + size <= tail:
+                # 已绕回：数据位于 [tail, 末尾) 和 [0, head)
+                return head
+            self._evict_gop()
+            if not self._packets:
+                return -1
+        self._head = 0
+        return 0
+
+    def _evict_gop(self):
+        """淘汰最旧的I帧及其后的非I帧数据包"""
+        packets = self._packets
+        first = True
+        while packets and (first or not packets[0].key):
+            packet = packets.popleft()
+            if packet.key:
+                self._key_times.popleft()
+            self.buffered_bytes -= packet.size
+            self.evicted_packets += 1
+            first = False
+        if not packets:
+            self._head = 0
+
+    def _drop_all(self):
+        self.evicted_packets += len(self._packets)
+        self._packets.clear()
+        self._key_times.clear()
+        self.buffered_bytes = 0
+        self._head = 0
+
+    def stats(self) -> dict:
+        return {
+            "seconds": self.seconds,
+            "memory_bytes": self.capacity,
+            "buffered_bytes": self.buffered_bytes,
+            "buffered_seconds": self.buffered_seconds,
+            "keyframes": len(self._key_times),
+            "packets": self.packets,
+            "evicted_packets": self.evicted_packets,
+            "oversized_packets": self.oversized_packets,
+            "sinks": len(self._sinks),
+        }
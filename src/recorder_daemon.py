@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无界面录制守护进程
+
+示例:
+    python src/recorder_daemon.py --config camera_configs.json --output /data/record
+    python main.py --daemon --output /data/record
+
+从配置文件读取设备列表，为每台设备的各个通道打开预览并录制。
+不导入Qt；连续录制时码流由SDK直接写入文件(StartSaveRealData)，Python侧不处理每帧数据。
+动检录制模式(--mode motion)只在动检事件期间录制片段，可配合预录保留事件前的画面。
+一个监督线程管理所有设备，每台设备的会话调用(登录、打开预览、动检片段的开始/结束)
+都在该设备的单个线程中按提交顺序执行，同时登录的设备数受 --workers 限制，
+内存占用不随运行时间增长。
+登录失败或断线超时后按指数退避重连。
+
+配置文件中的设备可使用以下可选字段(命令行参数优先):
+    record_enabled     是否录制，默认 true
+    record_channels    录制的通道列表，默认全部通道
+    record_mode        continuous(连续录制) 或 motion(动检录制)，默认 continuous
+    preroll_seconds    预录时长(秒)，默认 0
+    post_roll_seconds  动检结束后继续录制的时长(秒)，默认 10
+    segment_minutes    录像按时长分段(分钟)，默认 0 不分段
+    segment_mb         录像按大小分段(MB)，默认 0 不分段
+    quota_gb           设备录像配额(GB)，超出时删除该设备最早的录像，默认 0 不限制
+    alarm_window_seconds  报警合并窗口(秒)，窗口内重复的报警不再触发录制和写入历史，
+                       默认 1，0 不合并
+    tee_path           原始码流旁路写入目录，预览打开后另存一份码流，默认不写入
+
+录像文件关闭后写入索引(默认 <output>/media_catalog.db)，启动时增量扫描录像目录。
+后台按配额、保留天数和磁盘剩余空间删除最早的录像(--quota-gb/--max-age-days/--min-free-gb)。
+--remux 开启后，每个录像分段关闭后在后台转为MP4(ffmpeg -c copy)。
+收到的报警事件写入报警历史(默认 <output>/alarm_history.db)。
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from camera_session import (
+    DEFAULT_DEVICE_PORT,
+    TRIGGER_CONTINUOUS,
+    CameraSession,
+    SessionListener,
+    media_filename,
+)
+from config_manager import ConfigManager
+from event_recorder import DEFAULT_POST_ROLL, EventRecorder
+from alarm_coalescer import DEFAULT_WINDOW as DEFAULT_ALARM_WINDOW
+from alarm_history import HISTORY_NAME, AlarmHistory
+from media_catalog import CATALOG_NAME, MediaCatalog
+from remux_pool import EVENT_PRIORITY, JOB_DONE, PRIORITY_NORMAL, RemuxPool
+from retention_manager import GB, RetentionManager
+
+RECORD_CONTINUOUS = "continuous"
+RECORD_MOTION = "motion"
+RECORD_MODES = (RECORD_CONTINUOUS, RECORD_MOTION)
+
+
+class DeviceRecorder(SessionListener):
+    """单台设备的录制状态"""
+
+    def __init__(
+        self,
+        config: dict,
+        output_dir: str,
+        channels: Optional[List[int]] = None,
+        stream_type: int = 0,
+        retry_min: float = 5.0,
+        retry_max: float = 300.0,
+        mode: str = RECORD_CONTINUOUS,
+        preroll: float = 0.0,
+        post_roll: float = DEFAULT_POST_ROLL,
+        segment_seconds: float = 0.0,
+        segment_bytes: int = 0,
+        alarm_window: float = DEFAULT_ALARM_WINDOW,
+        catalog: Optional[MediaCatalog] = None,
+        remux: Optional[RemuxPool] = None,
+    ):
+        if mode not in RECORD_MODES:
+            raise ValueError(f"未知的录制模式: {mode}")
+        self.ip = config["ip"]
+        self.output_dir = output_dir
+        self.channels = channels
+        self.stream_type = stream_type
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.mode = mode
+        self.post_roll = post_roll
+        self.catalog = catalog
+        self.remux = remux
+
+        self.session = CameraSession(
+            self.ip,
+            int(config.get("port", DEFAULT_DEVICE_PORT)),
+            config.get("username", ""),
+            config.get("password", ""),
+            listener=self,
+        )
+        self.session.preroll_seconds = preroll
+        self.session.segment_seconds = segment_seconds
+        self.session.segment_bytes = segment_bytes
+        self.session.alarm_coalescer.window = alarm_window
+        self.session.tee_dir = str(config.get("tee_path") or "")
+        # 会话只在这个线程中调用，监督线程只读取 previewing/recording
+        self.worker = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"Device-{self.ip}"
+        )
+        self.previewing = ()  # 已打开预览的通道(设备线程每次会话调用后更新)
+        self.recording = ()  # 正在录制的通道
+        self.events = None  # 动检录制(EventRecorder)，登录后创建
+        self.future = None  # 正在执行的连接/重置任务
+        self.disconnected_at = None  # 断线时间(monotonic)，在线时为None
+        self.retry_delay = retry_min
+        self.next_attempt = 0.0
+        self.failures = 0
+
+    def session_disconnected(self, session, ip, port):
+        print(f"[{self.ip}] 设备断线，等待SDK自动重连")
+        self.disconnected_at = time.monotonic()
+
+    def session_reconnected(self, session, ip, port):
+        print(f"[{self.ip}] 设备已重连")
+        self.disconnected_at = None
+
+    def alarm_received(self, session, event):
+        if self.events is not None:
+            self.events.on_alarm(event)
+
+    def media_closed(self, session, entry):
+        if self.catalog is not None:
+            self.catalog.add_entry(entry)
+        if self.remux is not None:
+            priority = EVENT_PRIORITY.get(entry.get("event"), PRIORITY_NORMAL)
+            self.remux.submit(entry["path"], priority=priority, context=entry)
+
+    def submit(self, fn, *args) -> Future:
+        """在设备线程中执行会话调用(任意线程)"""
+        return self.worker.submit(self._call, fn, args)
+
+    def _call(self, fn, args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"[{self.ip}] 会话调用失败: {e}")
+            raise
+        finally:
+            streams = self.session.streams
+            self.previewing = tuple(streams)
+            self.recording = tuple(ch for ch, s in streams.items() if s.is_recording)
+
+    def wanted_channels(self) -> List[int]:
+        """需要录制的通道"""
+        if self.channels is not None:
+            return [ch for ch in self.channels if ch < self.session.channel_count]
+        return list(range(self.session.channel_count))
+
+    def recording_channels(self) -> List[int]:
+        return list(self.recording)
+
+    def ready_channels(self) -> List[int]:
+        """已就绪的通道：连续录制为正在录制，动检录制为已打开预览"""
+        if self.mode == RECORD_MOTION:
+            return list(self.previewing)
+        return self.recording_channels()
+
+    def needs_attention(self, now: float, reconnect_timeout: float) -> bool:
+        """是否需要(重新)建立登录或补开录制"""
+        if self.future is not None and not self.future.done():
+            return False
+        if now < self.next_attempt:
+            return False
+        if not self.session.is_logged_in:
+            return True
+        if self.disconnected_at is not None:
+            return now - self.disconnected_at >= reconnect_timeout
+        if self.mode == RECORD_MOTION and not self.session.is_alarm_listening:
+            return True
+        return len(self.ready_channels()) < len(self.wanted_channels())
+
+    def ensure_recording(self):
+        """登录并为缺少录制的通道开启录制(设备线程中执行)"""
+        if self.disconnected_at is not None:
+            # 断线超时：放弃旧句柄，重新登录
+            print(f"[{self.ip}] 断线超时，重新登录")
+            if self.events is not None:
+                # 先让动检录制处理完已收到的事件，旧片段的操作不再作用于新登录
+                self.events.reset()
+            self.session.reset()
+            self.disconnected_at = None
+
+        ok = self._start_all()
+        if ok:
+            self.failures = 0
+            self.retry_delay = self.retry_min
+            self.next_attempt = 0.0
+        else:
+            self.failures += 1
+            self.next_attempt = time.monotonic() + self.retry_delay
+            print(
+                f"[{self.ip}] {self.retry_delay:.0f}秒后重试(第{self.failures}次失败)"
+            )
+            self.retry_delay = min(self.retry_delay * 2, self.retry_max)
+
+    def _start_all(self) -> bool:
+        if not self.session.is_logged_in:
+            ok, error_msg = self.session.login()
+            if not ok:
+                print(f"[{self.ip}] 登录失败: {error_msg}")
+                return False
+            print(f"[{self.ip}] 登录成功, 通道数: {self.session.channel_count}")
+
+        all_ok = True
+        for channel in self.wanted_channels():
+            stream = self.session.streams.get(channel)
+            if stream is not None and stream.is_recording:
+                continue
+            if stream is None:
+                stream, error_msg = self.session.start_preview(
+                    channel, self.stream_type
+                )
+                if stream is None:
+                    print(f"[{self.ip}] 通道{channel}打开预览失败: {error_msg}")
+                    all_ok = False
+                    continue
+            if self.mode == RECORD_MOTION:
+                continue
+            path = os.path.join(
+                self.output_dir, media_filename("record", self.ip, channel, "dav")
+            )
+            ok, error_msg = self.session.start_record(
+                channel, path, event=TRIGGER_CONTINUOUS
+            )
+            if ok:
+                print(f"[{self.ip}] 通道{channel}开始录制: {path}")
+            else:
+                print(f"[{self.ip}] 通道{channel}开始录制失败: {error_msg}")
+                all_ok = False
+        if self.mode == RECORD_MOTION:
+            all_ok = self._start_motion() and all_ok
+        return all_ok
+
+    def _start_motion(self) -> bool:
+        """开启报警订阅，由动检事件驱动录制"""
+        if self.events is None:
+            self.events = EventRecorder(
+                self.session,
+                self.output_dir,
+                post_roll=self.post_roll,
+                channels=self.wanted_channels(),
+                stream_type=self.stream_type,
+                auto_preview=False,
+                submit=self.submit,
+            )
+        if self.session.is_alarm_listening:
+            return True
+        ok, error_msg = self.session.start_alarm_listen()
+        if ok:
+            print(f"[{self.ip}] 已开启报警订阅，等待动检事件")
+        else:
+            print(f"[{self.ip}] 开启报警订阅失败: {error_msg}")
+        return ok
+
+    def close(self) -> Future:
+        """
+        关闭动检片段并登出(监督线程中调用)
+        :return: 登出的 Future，登出排在已提交的片段操作之后执行
+        """
+        if self.events is not None:
+            self.events.stop()
+            self.events = None
+        future = self.submit(self.session.close)
+        self.worker.shutdown(wait=False)
+        return future
+
+
+class RecorderDaemon:
+    """管理多台设备录制的守护进程"""
+
+    def __init__(
+        self,
+        recorders: List[DeviceRecorder],
+        connect_workers: int = 4,
+        reconnect_timeout: float = 60.0,
+        status_interval: float = 60.0,
+        remux: Optional[RemuxPool] = None,
+    ):
+        self.recorders = recorders
+        self.remux = remux
+        self.reconnect_timeout = reconnect_timeout
+        self.status_interval = status_interval
+        self.stop_event = threading.Event()
+        # 限制同时登录/打开录制的设备数
+        self._connect_slots = threading.BoundedSemaphore(max(1, connect_workers))
+
+    def run(self, tick: float = 1.0):
+        """监督循环，直到 stop() 被调用"""
+        print(f"录制守护进程启动，设备数: {len(self.recorders)}")
+        last_status = time.monotonic()
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for recorder in self.recorders:
+                if recorder.needs_attention(now, self.reconnect_timeout):
+                    recorder.future = recorder.submit(self._connect, recorder)
+            if self.status_interval > 0 and now - last_status >= self.status_interval:
+                self.print_status()
+                last_status = now
+            self.stop_event.wait(tick)
+        self._shutdown()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _connect(self, recorder: DeviceRecorder):
+        with self._connect_slots:
+            recorder.ensure_recording()
+
+    def print_status(self):
+        online = sum(1 for r in self.recorders if r.session.is_logged_in)
+        streams = sum(len(r.recording_channels()) for r in self.recorders)
+        print(f"状态: 在线设备 {online}/{len(self.recorders)}, 录制中通道 {streams}")
+        received = sum(r.session.alarm_coalescer.received for r in self.recorders)
+        if received:
+            emitted = sum(r.session.alarm_coalescer.emitted for r in self.recorders)
+            print(f"报警: 收到 {received}, 合并后 {emitted}")
+        if self.remux is not None:
+            stats = self.remux.stats()
+            print(
+                f"转MP4: 排队 {stats['queued']}, 进行中 {len(stats['running'])}, "
+                f"完成 {stats['completed']}, 失败 {stats['failed']}, "
+                f"{stats['bytes_per_sec'] / (1024 * 1024):.1f} MB/s"
+            )
+
+    def _shutdown(self):
+        """停止所有录制并登出"""
+        print("正在停止所有录制...")
+        # 取消排队中的连接任务，等待正在执行的任务结束后再关闭会话
+        running = [
+            r.future
+            for r in self.recorders
+            if r.future is not None and not r.future.cancel()
+        ]
+        wait(running)
+        # 登出失败已由设备线程打印
+        wait([r.close() for r in self.recorders])
+        if self.remux is not None:
+            # 最后的分段已提交，等待转换完成
+            self.remux.close(wait=True, timeout=60.0)
+        print("录制守护进程已退出")
+
+
+def _parse_channels(text: str) -> Optional[List[int]]:
+    if not text:
+        return None
+    return [int(ch) for ch in text.split(",") if ch.strip()]
+
+
+def build_recorders(
+    args,
+    catalog: Optional[MediaCatalog] = None,
+    remux: Optional[RemuxPool] = None,
+) -> List[DeviceRecorder]:
+    """根据配置文件和命令行参数创建设备录制器"""
+    config_manager = ConfigManager(args.config)
+    only = {ip.strip() for ip in args.devices.split(",") if ip.strip()}
+    recorders = []
+    for ip, config in config_manager.get_all_configs().items():
+        if only and ip not in only:
+            continue
+        if not config.get("record_enabled", True):
+            continue
+        channels = _parse_channels(args.channels)
+        if channels is None and config.get("record_channels") is not None:
+            channels = [int(ch) for ch in config["record_channels"]]
+        mode = args.mode or config.get("record_mode", RECORD_CONTINUOUS)
+        preroll = args.preroll
+        if preroll is None:
+            preroll = float(config.get("preroll_seconds", 0.0))
+        post_roll = args.post_roll
+        if post_roll is None:
+            post_roll = float(config.get("post_roll_seconds", DEFAULT_POST_ROLL))
+        segment_minutes = args.segment_minutes
+        if segment_minutes is None:
+            segment_minutes = float(config.get("segment_minutes", 0))
+        segment_mb = args.segment_mb
+        if segment_mb is None:
+            segment_mb = float(config.get("segment_mb", 0))
+        alarm_window = args.alarm_window
+        if alarm_window is None:
+            alarm_window = float(
+                config.get("alarm_window_seconds", DEFAULT_ALARM_WINDOW)
+            )
+        recorders.append(
+            DeviceRecorder(
+                config,
+                args.output,
+                channels=channels,
+                stream_type=args.stream_type,
+                retry_min=args.retry_min,
+                retry_max=args.retry_max,
+                mode=mode,
+                preroll=preroll,
+                post_roll=post_roll,
+                segment_seconds=segment_minutes * 60,
+                segment_bytes=int(segment_mb * 1024 * 1024),
+                alarm_window=alarm_window,
+                catalog=catalog,
+                remux=remux,
+            )
+        )
+    return recorders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="大华摄像机无界面录制守护进程")
+    parser.add_argument("--config", default="camera_configs.json", help="设备配置文件")
+    parser.add_argument("--output", default="record", help="录像保存目录")
+    parser.add_argument("--devices", default="", help="只录制这些IP(逗号分隔)")
+    parser.add_argument("--channels", default="", help="录制的通道(逗号分隔)")
+    parser.add_argument(
+        "--stream-type", type=int, default=0, help="0: 主码流, 1: 辅码流"
+    )
+    parser.add_argument(
+        "--mode", choices=RECORD_MODES, default=None, help="录制模式，默认读取配置"
+    )
+    parser.add_argument("--preroll", type=float, default=None, help="预录时长(秒)")
+    parser.add_argument(
+        "--post-roll", type=float, default=None, help="动检结束后继续录制的时长(秒)"
+    )
+    parser.add_argument(
+        "--segment-minutes", type=float, default=None, help="录像按时长分段(分钟)"
+    )
+    parser.add_argument(
+        "--segment-mb", type=float, default=None, help="录像按大小分段(MB)"
+    )
+    parser.add_argument(
+        "--alarm-window", type=float, default=None, help="报警合并窗口(秒)，0不合并"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="并发连接数")
+    parser.add_argument("--retry-min", type=float, default=5.0)
+    parser.add_argument("--retry-max", type=float, default=300.0)
+    parser.add_argument(
+        "--reconnect-timeout", type=float, default=60.0, help="断线多久后重新登录(秒)"
+    )
+    parser.add_argument("--status-interval", type=float, default=60.0)
+    parser.add_argument(
+        "--catalog", default="", help=f"录像索引文件，默认 <output>/{CATALOG_NAME}"
+    )
+    parser.add_argument(
+        "--alarm-history",
+        default="",
+        help=f"报警历史数据库，默认 <output>/{HISTORY_NAME}",
+    )
+    parser.add_argument(
+        "--quota-gb", type=float, default=0, help="录像目录总配额(GB)，0表示不限制"
+    )
+    parser.add_argument(
+        "--max-age-days", type=float, default=0, help="录像保留天数，0表示不限制"
+    )
+    parser.add_argument(
+        "--min-free-gb", type=float, default=1.0, help="磁盘最小剩余空间(GB)"
+    )
+    parser.add_argument("--remux", action="store_true", help="录像分段转为MP4")
+    parser.add_argument("--remux-workers", type=int, default=2, help="ffmpeg进程数")
+    parser.add_argument(
+        "--remux-delete", action="store_true", help="转换成功后删除DAV文件"
+    )
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg可执行文件")
+    args = parser.parse_args(argv)
+
+    args.output = os.path.abspath(args.output)
+    os.makedirs(args.output, exist_ok=True)
+
+    catalog = MediaCatalog(args.catalog or os.path.join(args.output, CATALOG_NAME))
+    remux = None
+    if args.remux:
+
+        def remux_done(job):
+            if job.state != JOB_DONE:
+                return
+            catalog.add_entry(
+                dict(
+                    job.context,
+                    path=job.target,
+                    file=os.path.basename(job.target),
+                    bytes=job.output_bytes,
+                )
+            )
+            if args.remux_delete:
+                catalog.remove([job.source])
+
+        remux = RemuxPool(
+            workers=args.remux_workers,
+            ffmpeg=args.ffmpeg,
+            delete_source=args.remux_delete,
+            on_done=remux_done,
+        )
+    recorders = build_recorders(args, catalog, remux)
+    if not recorders:
+        print(f"配置文件中没有需要录制的设备: {args.config}")
+        catalog.close()
+        return 1
+    stats = catalog.rescan(args.output)
+    print(f"录像索引已同步: {stats}")
+
+    retention = RetentionManager(
+        catalog,
+        args.output,
+        max_bytes=int(args.quota_gb * GB),
+        max_age=args.max_age_days * 86400,
+        min_free_bytes=int(args.min_free_gb * GB),
+    )
+    for ip, config in ConfigManager(args.config).get_all_configs().items():
+        retention.set_device_quota(ip, int(float(config.get("quota_gb", 0)) * GB))
+    retention.start()
+    history = AlarmHistory(
+        args.alarm_history or os.path.join(args.output, HISTORY_NAME)
+    )
+    history.start()
+
+    daemon = RecorderDaemon(
+        recorders,
+        connect_workers=args.workers,
+        reconnect_timeout=args.reconnect_timeout,
+        status_interval=args.status_interval,
+        remux=remux,
+    )
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    daemon.run()
+    retention.stop()
+    history.close()
+    print(f"报警历史: {history.stats()}")
+    catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+DAV转MP4(不重新编码)
+
+RemuxPool 维护一个按优先级排序的任务队列和固定数量的工作线程，
+每个工作线程同时只运行一个 ffmpeg 子进程(-c copy，只重新封装)，
+录像分段关闭后提交任务，几分钟内即可得到通用播放器能打开的MP4。
+
+ffmpeg 通过 -progress 输出进度，按已写入字节数/源文件大小估算完成比例；
+失败的任务在退避后重试，超过次数后标记为失败，源文件保留不动。
+先写入临时文件，成功后再改名，不会留下不完整的MP4。
+"""
+
+import heapq
+import itertools
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from dav_reader import remove_index
+
+PRIORITY_HIGH = 0  # 手动录制/导出
+PRIORITY_NORMAL = 10  # 动检片段
+PRIORITY_LOW = 20  # 连续录制
+
+# 录制触发方式(camera_session.TRIGGER_*) -> 优先级
+EVENT_PRIORITY = {
+    "manual": PRIORITY_HIGH,
+    "motion": PRIORITY_NORMAL,
+    "continuous": PRIORITY_LOW,
+}
+
+DEFAULT_WORKERS = 2
+DEFAULT_RETRIES = 2
+RETRY_DELAY = 5.0  # 第一次重试前等待的时间(秒)，之后每次加倍
+THROUGHPUT_WINDOW = 60.0  # 吞吐量统计窗口(秒)
+PROGRESS_INTERVAL = 0.5  # 进度回调最短间隔(秒)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Windows下不弹出控制台
+
+
+class RemuxJob:
+    """一个转封装任务"""
+
+    __slots__ = (
+        "source",
+        "target",
+        "priority",
+        "attempts",
+        "state",
+        "progress",
+        "error",
+        "source_bytes",
+        "output_bytes",
+        "submitted",
+        "started",
+        "finished",
+        "context",
+    )
+
+    def __init__(self, source: str, target: str, priority: int, context=None):
+        self.source = source
+        self.target = target
+        self.priority = priority
+        self.attempts = 0
+        self.state = JOB_QUEUED
+        self.progress = 0.0  # 0~1
+        self.error = ""
+        self.source_bytes = 0
+        self.output_bytes = 0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.context = context  # 提交者附带的信息(例如录像清单记录)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+def remux_target(source: str) -> str:
+    """默认输出路径：同目录同名的 .mp4"""
+    return os.path.splitext(source)[0] + ".mp4"
+
+
+def build_remux_command(
+    ffmpeg: str, source: str, output: str, audio_codec: Optional[str] = None
+) -> List[str]:
+    """
+    生成转封装命令
+    :param audio_codec: DAV中的音频多为G.711，MP4不支持直接复制；为None时丢弃音频，
+        否则按此编码器转码音频(例如 aac)，视频始终不重新编码
+    """
+    command = [
+        ffmpeg,
+        "-hide_banner",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-y",
+        "-f",
+        "dhav",
+        "-i",
+        source,
+        "-map",
+        "0:v",
+        "-c:v",
+        "copy",
+    ]
+    if audio_codec:
+        command += ["-map", "0:a?", "-c:a", audio_codec]
+    else:
+        command += ["-an"]
+    command += [
+        "-movflags",
+        "+faststart",
+        "-f",
+        "mp4",
+        "-progress",
+        "pipe:1",
+        "-nostats",
+        output,
+    ]
+    return command
+
+
+class RemuxPool:
+    """DAV转MP4任务队列和ffmpeg进程池"""
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        ffmpeg: str = "ffmpeg",
+        retries: int = DEFAULT_RETRIES,
+        audio_codec: Optional[str] = None,
+        delete_source: bool = False,
+        on_progress: Optional[Callable[[RemuxJob], None]] = None,
+        on_done: Optional[Callable[[RemuxJob], None]] = None,
+    ):
+        """
+        :param workers: 同时运行的ffmpeg进程数
+        :param retries: 失败后的重试次数
+        :param delete_source: 转换成功后删除DAV文件
+        :param on_progress: on_progress(任务) 进度更新(工作线程)
+        :param on_done: on_done(任务) 任务成功或最终失败(工作线程)
+        """
+        self.ffmpeg = shutil.which(ffmpeg) or ""
+        self.retries = max(retries, 0)
+        self.audio_codec = audio_codec
+        self.delete_source = delete_source
+        self.on_progress = on_progress
+        self.on_done = on_done
+
+        self._heap = []
+        self._order = itertools.count()  # 同优先级按提交顺序
+        self._cond = threading.Condition()
+        self._running = {}  # 任务 -> ffmpeg进程
+        self._retrying = set()  # 等待重试的任务
+        self._closed = False
+        self._created = time.monotonic()
+        self._finished = deque()  # (完成时间monotonic, 源文件字节数)，用于吞吐量
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.bytes_done = 0
+
+        if not self.ffmpeg:
+            print(f"未找到ffmpeg({ffmpeg})，DAV转MP4不可用")
+        self._threads = [
+            threading.Thread(target=self._run, name=f"RemuxWorker-{i}", daemon=True)
+            for i in range(max(workers, 1) if self.ffmpeg else 0)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.ffmpeg)
+
+    def submit(
+        self,
+        source: str,
+        target: Optional[str] = None,
+        priority: int = PRIORITY_NORMAL,
+        context=None,
+    ) -> Optional[RemuxJob]:
+        """提交一个DAV文件，返回任务(ffmpeg不可用或已关闭时返回None)"""
+        if not self.ffmpeg:
+            return None
+        job = RemuxJob(source, target or remux_target(source), priority, context)
+        with self._cond:
+            if self._closed:
+                return None
+            self._push(job)
+            self.submitted += 1
+            self._cond.notify()
+        return job
+
+    def cancel(self, job: RemuxJob) -> bool:
+        """取消排队中的任务，正在运行的任务会终止ffmpeg进程"""
+        with self._cond:
+            for i, entry in enumerate(self._heap):
+                if entry[2] is job:
+                    self._heap.pop(i)
+                    heapq.heapify(self._heap)
+                    job.state = JOB_CANCELLED
+                    return True
+            if job in self._retrying:
+                self._retrying.discard(job)
+                job.state = JOB_CANCELLED
+                return True
+            process = self._running.get(job)
+        if process is not None:
+            job.state = JOB_CANCELLED
+            process.terminate()
+            return True
+        return False
+
+    def close(self, wait: bool = True, timeout: float = 10.0):
+        """
+        停止接受任务
+        :param wait: True时等待队列中的任务完成，False时丢弃排队任务并终止正在运行的进程
+        """
+        with self._cond:
+            self._closed = True
+            if not wait:
+                for job in [e[2] for e in self._heap] + list(self._retrying):
+                    job.state = JOB_CANCELLED
+                self._heap.clear()
+                self._retrying.clear()
+                for job, process in self._running.items():
+                    job.state = JOB_CANCELLED
+                    process.terminate()
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0.0))
+
+    def _push(self, job: RemuxJob):
+        heapq.heappush(self._heap, (job.priority, next(self._order), job))
+
+    def _next_job(self) -> Optional[RemuxJob]:
+        """取出优先级最高的任务，已关闭且没有剩余任务时返回None"""
+        with self._cond:
+            while not self._heap:
+                if self._closed and not self._retrying:
+                    return None
+                self._cond.wait()
+            job = heapq.heappop(self._heap)[2]
+            job.state = JOB_RUNNING
+            return job
+
+    def _requeue(self, job: RemuxJob):
+        """重试时间到，重新排队"""
+        with self._cond:
+            if job in self._retrying:
+                self._retrying.discard(job)
+                self._push(job)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            job.attempts += 1
+            job.started = time.time()
+            ok = self._remux(job)
+            with self._cond:
+                self._running.pop(job, None)
+                if job.state == JOB_CANCELLED:
+                    continue
+                if not ok and job.attempts <= self.retries and not self._closed:
+                    # 退避后重试
+                    job.state = JOB_QUEUED
+                    job.progress = 0.0
+                    self.retried += 1
+                    self._retrying.add(job)
+                    timer = threading.Timer(
+                        RETRY_DELAY * 2 ** (job.attempts - 1), self._requeue, (job,)
+                    )
+                    timer.daemon = True
+                    timer.start()
+                    print(
+                        f"转MP4失败，稍后重试({job.attempts}/{self.retries}): {job.error}"
+                    )
+                    continue
+                job.finished = time.time()
+                if ok:
+                    job.state = JOB_DONE
+                    job.progress = 1.0
+                    self.completed += 1
+                    self.bytes_done += job.source_bytes
+                    self._finished.append((time.monotonic(), job.source_bytes))
+                else:
+                    job.state = JOB_FAILED
+                    self.failed += 1
+            if ok:
+                print(f"转MP4完成: {job.target} ({job.elapsed:.1f}秒)")
+                if self.delete_source:
+                    try:
+                        os.remove(job.source)
+                        remove_index(job.source)
+                    except OSError as e:
+                        print(f"删除DAV文件失败({job.source}): {e}")
+            else:
+                print(f"转MP4失败: {job.source}: {job.error}")
+            if self.on_done is not None:
+                try:
+                    self.on_done(job)
+                except Exception as e:
+                    print(f"转MP4完成回调错误: {e}")
+
+    def _remux(self, job: RemuxJob) -> bool:
+        try:
+            job.source_bytes = os.path.getsize(job.source)
+        except OSError as e:
+            job.error = str(e)
+            return False
+        temp = job.target + ".part"
+        command = build_remux_command(self.ffmpeg, job.source, temp, self.audio_codec)
+        try:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                creationflags=_NO_WINDOW,
+            )
+        except OSError as e:
+            job.error = f"启动ffmpeg失败: {e}"
+            return False
+        with self._cond:
+            self._running[job] = process
+
+        messages = deque(maxlen=5)  # 保留最后几行错误输出
+        last_report = 0.0
+        for raw in process.stdout:
+            line = raw.decode("utf-8", "replace").strip()
+            key, sep, value = line.partition("=")
+            if not sep or " " in key:
+                if line:
+                    messages.append(line)
+                continue
+            if key == "total_size" and value.isdigit():
+                job.output_bytes = int(value)
+                if job.source_bytes:
+                    # 只重新封装，输出大小与源文件接近
+                    job.progress = min(job.output_bytes / job.source_bytes, 0.99)
+            elif key == "progress":
+                now = time.monotonic()
+                if self.on_progress is not None and (
+                    value == "end" or now - last_report >= PROGRESS_INTERVAL
+                ):
+                    last_report = now
+                    try:
+                        self.on_progress(job)
+                    except Exception as e:
+                        print(f"转MP4进度回调错误: {e}")
+        returncode = process.wait()
+
+        if returncode == 0 and os.path.exists(temp):
+            try:
+                os.replace(temp, job.target)
+                job.output_bytes = os.path.getsize(job.target)
+                return True
+            except OSError as e:
+                job.error = str(e)
+        else:
+            job.error = "; ".join(messages) or f"ffmpeg退出码 {returncode}"
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return False
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            while self._finished and self._finished[0][0] < now - THROUGHPUT_WINDOW:
+                self._finished.popleft()
+            window_bytes = sum(size for _, size in self._finished)
+            window = min(THROUGHPUT_WINDOW, now - self._created) or 1.0
+            queued = len(self._heap) + len(self._retrying)
+            running = [
+                {"source": job.source, "progress": round(job.progress, 3)}
+                for job in self._running
+            ]
+        return {
+            "workers": len(self._threads),
+            "queued": queued,
+            "running": running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "bytes_done": self.bytes_done,
+            # 最近一段时间内完成的源文件字节数/秒
+            "bytes_per_sec": window_bytes / window,
+        }
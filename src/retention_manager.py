@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+磁盘配额与保留期限
+
+RetentionManager 在后台线程中定期检查保存目录，按以下规则删除最早的录像/抓拍文件:
+    - 每台设备的配额(字节)
+    - 目录总配额(字节)
+    - 最长保留时间
+    - 磁盘最小剩余空间
+
+待删除的文件按结束时间从媒体索引(MediaCatalog)中分批取出，不遍历目录。
+删除只在本线程中进行，录制写入线程不等待清理；结束时间在 min_age 秒内的文件
+(可能仍在写入)不会被删除。
+
+一个进程中的多个摄像机窗口通过 acquire_retention/release_retention 共享
+同一保存目录的管理器(引用计数)，每个目录只有一个线程删除文件。
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dav_reader import remove_index
+from media_catalog import MediaCatalog
+
+GB = 1024 * 1024 * 1024
+
+DEFAULT_MIN_FREE_BYTES = 1 * GB  # 磁盘剩余空间低于此值时删除最早的文件
+DEFAULT_INTERVAL = 60.0  # 检查间隔(秒)
+DEFAULT_MIN_AGE = 60.0  # 结束不足此时间的文件不删除(秒)
+DELETE_BATCH = 200  # 每次从索引取出的文件数
+
+
+class RetentionManager:
+    """保存目录的配额和保留期限管理(后台线程)"""
+
+    def __init__(
+        self,
+        catalog: MediaCatalog,
+        root: str,
+        max_bytes: int = 0,
+        max_age: float = 0.0,
+        min_free_bytes: int = DEFAULT_MIN_FREE_BYTES,
+        device_quotas: Optional[Dict[str, int]] = None,
+        interval: float = DEFAULT_INTERVAL,
+        min_age: float = DEFAULT_MIN_AGE,
+    ):
+        """
+        :param root: 管理的目录，只删除索引中此目录树下的文件
+        :param max_bytes: 目录总配额，0表示不限制
+        :param max_age: 最长保留时间(秒)，0表示不限制
+        :param min_free_bytes: 磁盘最小剩余空间，0表示不检查
+        :param device_quotas: 设备IP -> 配额(字节)
+        """
+        self.catalog = catalog
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_free_bytes = min_free_bytes
+        self.device_quotas = dict(device_quotas or {})
+        self.interval = interval
+        self.min_age = min_age
+
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.delete_errors = 0
+        self.passes = 0
+        self.last_pass_seconds = 0.0
+
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def set_device_quota(self, ip: str, max_bytes: int):
+        """设置设备配额，0表示不限制"""
+        if max_bytes > 0:
+            self.device_quotas[ip] = max_bytes
+        else:
+            self.device_quotas.pop(ip, None)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="RetentionManager", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self):
+        """立即执行一次检查(例如更换保存目录后)"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"清理录像文件出错: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def run_once(self) -> dict:
+        """执行一次检查，返回本次删除的文件数和字节数"""
+        started = time.monotonic()
+        now = time.time()
+        # 结束时间晚于此时的文件可能仍在写入
+        newest = now - self.min_age
+        result = {"files": 0, "bytes": 0}
+        skipped = set()  # 本次删除失败的文件，避免反复尝试
+
+        if self.max_age > 0:
+            cutoff = min(now - self.max_age, newest)
+            self._prune(result, skipped, lambda size: True, before=cutoff)
+
+        usage = self.catalog.usage(self.root)
+        for ip, quota in list(self.device_quotas.items()):
+            used = [usage.get(ip, 0)]
+            if used[0] <= quota:
+                continue
+
+            def over_device_quota(size, used=used, quota=quota):
+                used[0] -= size
+                return used[0] > quota
+
+            self._prune(result, skipped, over_device_quota, before=newest, ip=ip)
+            if used[0] > quota:
+                print(f"设备{ip}超出配额且没有可删除的文件: {used[0]} / {quota} 字节")
+
+        if self.max_bytes > 0:
+            total = [sum(self.catalog.usage(self.root).values())]
+
+            def over_quota(size):
+                total[0] -= size
+                return total[0] > self.max_bytes
+
+            if total[0] > self.max_bytes:
+                self._prune(result, skipped, over_quota, before=newest)
+
+        if self.min_free_bytes > 0 and os.path.isdir(self.root):
+
+            def low_on_space(size=0):
+                return shutil.disk_usage(self.root).free < self.min_free_bytes
+
+            if low_on_space():
+                self._prune(result, skipped, low_on_space, before=newest)
+                if low_on_space():
+                    print(f"磁盘剩余空间不足且没有可删除的文件: {self.root}")
+
+        self.passes += 1
+        self.last_pass_seconds = time.monotonic() - started
+        if result["files"]:
+            print(
+                f"已清理 {result['files']} 个文件，释放 "
+                f"{result['bytes'] / (1024 * 1024):.1f} MB"
+            )
+        return result
+
+    def _prune(self, result, skipped, should_continue, before, ip=None):
+        """
+        按结束时间从早到晚删除文件，每删除一个文件调用 should_continue(文件大小)，
+        返回False时停止
+        """
+        while True:
+            records = [
+                r
+                for r in self.catalog.oldest(
+                    DELETE_BATCH + len(skipped), ip=ip, before=before, root=self.root
+                )
+                if r.path not in skipped
+            ]
+            if not records:
+                return
+            removed = []
+            done = False
+            for record in records:
+                if self._stopped.is_set():
+                    done = True
+                    break
+                try:
+                    os.remove(record.path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"删除文件失败({record.path}): {e}")
+                    skipped.add(record.path)
+                    self.delete_errors += 1
+                    continue
+                remove_index(record.path)
+                removed.append(record.path)
+                result["files"] += 1
+                result["bytes"] += record.size
+                self.deleted_files += 1
+                self.deleted_bytes += record.size
+                if not should_continue(record.size):
+                    done = True
+                    break
+            self.catalog.remove(removed)
+            if done:
+                return
+
+    def stats(self) -> dict:
+        usage = self.catalog.usage(self.root)
+        try:
+            free = shutil.disk_usage(self.root).free
+        except OSError:
+            free = -1
+        return {
+            "root": self.root,
+            "used_bytes": sum(usage.values()),
+            "device_bytes": usage,
+            "free_bytes": free,
+            "deleted_files": self.deleted_files,
+            "deleted_bytes": self.deleted_bytes,
+            "delete_errors": self.delete_errors,
+            "passes": self.passes,
+            "last_pass_seconds": self.last_pass_seconds,
+        }
+
+
+_shared_lock = threading.Lock()
+_shared: Dict[str, List] = {}  # 目录 -> [RetentionManager, 引用数]
+
+
+def acquire_retention(catalog_path: str, root: str) -> RetentionManager:
+    """
+    获取保存目录的进程内共享管理器(按目录引用计数)，首次获取时创建并启动
+    管理器使用自己的索引连接，不依赖调用方的 MediaCatalog
+    """
+    root = os.path.abspath(root)
+    with _shared_lock:
+        entry = _shared.get(root)
+        if entry is None:
+            manager = RetentionManager(MediaCatalog(catalog_path), root)
+            manager.start()
+            entry = _shared[root] = [manager, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def release_retention(manager: RetentionManager):
+    """释放共享管理器，最后一个使用者释放时停止线程并关闭索引连接"""
+    with _shared_lock:
+        entry = _shared.get(manager.root)
+        if entry is None or entry[0] is not manager:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _shared[manager.root]
+    manager.stop()
+    manager.catalog.close()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+SDK后端选择
+
+应用中所有NetClient实例都通过 create_net_client() 创建，
+设置环境变量 DAHUA_SDK_BACKEND=fake 时使用 fake_sdk.FakeNetClient 模拟器，
+否则使用大华NetSDK的 NetClient。
+"""
+
+import os
+from typing import Optional, Protocol
+
+SDK_BACKEND_ENV = "DAHUA_SDK_BACKEND"
+BACKEND_NETSDK = "netsdk"
+BACKEND_FAKE = "fake"
+
+
+class NetClientBackend(Protocol):
+    """应用使用到的NetClient接口，真实SDK与模拟器都需要提供这些方法"""
+
+    # 初始化与全局回调
+    def InitEx(self, call_back=None, user_data=0, init_param=None): ...
+    def SetAutoReconnect(self, call_back=None, user_data=0): ...
+    def SetDVRMessCallBackEx1(self, call_back=None, user_data=0): ...
+    def SetSnapRevCallBack(self, call_back=None, user_data=0): ...
+    def Cleanup(self): ...
+    def GetLastErrorMessage(self): ...
+    def LogOpen(self, log_info): ...
+    def LogClose(self): ...
+
+    # 登录与设备控制
+    def LoginWithHighLevelSecurity(self, stuInParam, stuOutParam): ...
+    def Logout(self, lLoginID): ...
+    def GetDevConfig(
+        self, lLoginID, dwCommand, lChannel, lpOutBuffer, dwOutBufferSize
+    ): ...
+    def SetDevConfig(
+        self, lLoginID, dwCommand, lChannel, lpInBuffer, dwInBufferSize
+    ): ...
+    def RebootDev(self, lLoginID): ...
+    def PTZControlEx2(
+        self, lLoginID, nChannelID, dwPTZCommand, lParam1, lParam2, lParam3, dwStop
+    ): ...
+
+    # 实时预览、录制与抓拍
+    def RealPlayEx(self, lLoginID, nChannelID, hWnd, rType=0): ...
+    def StopRealPlayEx(self, lRealHandle): ...
+    def SetRealDataCallBackEx2(self, lRealHandle, cbRealData, dwUser, dwFlag): ...
+    def StartSaveRealData(self, lRealHandle, pchFileName, *args): ...
+    def StopSaveRealData(self, lRealHandle): ...
+    def SnapPictureEx(self, lLoginID, par, reserved=0): ...
+
+    # PlaySDK
+    def GetFreePort(self): ...
+    def OpenStream(self, nPort, *args): ...
+    def Play(self, nPort, hWnd=0): ...
+    def Stop(self, nPort): ...
+    def CloseStream(self, nPort): ...
+    def ReleasePort(self, nPort): ...
+    def SetDecCallBack(self, nPort, DecCBFun): ...
+    def InputData(self, nPort, pBuf, nSize): ...
+
+    # 报警监听
+    def StartListenEx(self, lLoginID): ...
+    def StopListen(self, lLoginID): ...
+
+    # 设备搜索与初始化
+    def StartSearchDevicesEx(self, pInBuf, pOutBuf): ...
+    def StopSearchDevices(self, lSearchHandle): ...
+    def SearchDevicesByIPs(
+        self, pIpSearchInfo, cbSearchDevices, dwUserData, szLocalIp, dwWaitTime
+    ): ...
+    def InitDevAccount(
+        self, pInitAccountIn, pInitAccountOut, dwWaitTime, szLocalIp
+    ): ...
+
+
+def get_backend_name() -> str:
+    """获取当前配置的SDK后端名称"""
+    return os.environ.get(SDK_BACKEND_ENV, BACKEND_NETSDK).strip().lower()
+
+
+def is_fake_backend() -> bool:
+    """是否使用模拟器后端"""
+    return get_backend_name() == BACKEND_FAKE
+
+
+def create_net_client(backend: Optional[str] = None) -> NetClientBackend:
+    """创建NetClient实例，backend为None时按环境变量选择"""
+    name = (backend or get_backend_name()).lower()
+    if name == BACKEND_FAKE:
+        from fake_sdk import FakeNetClient
+
+        print("使用NetSDK模拟器后端(Fake NetClient)")
+        return FakeNetClient()
+    if name != BACKEND_NETSDK:
+        print(f"未知的SDK后端: {name}，使用NetSDK")
+
+    from NetSDK.NetSDK import NetClient
+
+    return NetClient()
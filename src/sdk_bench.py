@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NetSDK模拟器压测工具
+
+示例:
+    python src/sdk_bench.py --devices 50 --seconds 10 --frame-rate 25
+
+使用 fake_sdk 模拟器后端登录多个设备，由应用自己的 CameraSession 打开预览(含预录缓冲)、
+报警监听和抓拍，模拟器直接调用应用注册的回调(PreviewStream.RealDataCallBack、
+AlarmCallback、CaptureCallBack)，统计码流吞吐量以及各类回调在SDK线程中的平均/最大耗时。
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from sdk_backend import BACKEND_FAKE, SDK_BACKEND_ENV
+
+# 压测只使用模拟器，需在创建会话(初始化SDK)之前设置
+os.environ[SDK_BACKEND_ENV] = BACKEND_FAKE
+
+from camera_session import CameraSession, SessionListener
+
+
+class _Counter:
+    """线程安全的计数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.bytes = 0
+
+    def add(self, size: int = 0):
+        with self.lock:
+            self.count += 1
+            self.bytes += size
+
+
+class _BenchListener(SessionListener):
+    """统计会话通知的抓拍和报警"""
+
+    def __init__(self):
+        self.snaps = _Counter()
+        self.alarms = _Counter()
+
+    def snapshot_received(self, session, buffer, EncodeType, request):
+        self.snaps.add(buffer.length)
+        buffer.release()
+
+    def alarm_received(self, session, event):
+        self.alarms.add()
+
+
+def _configure_simulator(args):
+    """通过环境变量设置模拟器参数(SimulatorConfig.from_env)"""
+    for name, value in (
+        ("LOGIN_DELAY", 0.0),
+        ("FRAME_RATE", args.frame_rate),
+        ("BITRATE_KBPS", args.bitrate),
+        ("MOTION_RATE", args.motion_rate),
+    ):
+        os.environ[f"DAHUA_FAKE_{name}"] = str(value)
+
+
+def _snap_loop(sessions, rate: float, stop_event: threading.Event):
+    """按速率轮流向各设备发送抓拍请求"""
+    interval = 1.0 / (rate * len(sessions))
+    index = 0
+    while not stop_event.wait(interval):
+        session = sessions[index % len(sessions)]
+        index += 1
+        session.snap(0)
+
+
+def run_benchmark(args) -> dict:
+    """运行一次压测，返回统计结果"""
+    _configure_simulator(args)
+    listener = _BenchListener()
+    sessions, streams = [], []
+    for i in range(args.devices):
+        session = CameraSession(
+            f"10.0.{i // 250}.{i % 250 + 1}", 37777, "admin", "", listener=listener
+        )
+        # 预录缓冲使拉流回调持续工作(与动检录制相同的数据路径)
+        session.preroll_seconds = args.preroll
+        sessions.append(session)
+        ok, error_msg = session.login()
+        if not ok:
+            print(f"登录失败: {error_msg}")
+            continue
+        stream, error_msg = session.start_preview(0, use_playsdk=args.decode)
+        if stream is None:
+            print(f"打开预览失败: {error_msg}")
+            continue
+        streams.append(stream)
+        if args.motion_rate > 0:
+            session.start_alarm_listen()
+
+    stop_event = threading.Event()
+    snapper = None
+    online = [s for s in sessions if s.is_logged_in]
+    if args.snap_rate > 0 and online:
+        snapper = threading.Thread(
+            target=_snap_loop, args=(online, args.snap_rate, stop_event), daemon=True
+        )
+        snapper.start()
+
+    start = time.perf_counter()
+    time.sleep(args.seconds)
+    elapsed = time.perf_counter() - start
+    stop_event.set()
+    if snapper is not None:
+        snapper.join()
+
+    sdk = sessions[0].sdk if sessions else None
+    callbacks = dict(sdk.stats) if sdk is not None else {}
+    realdata = callbacks.get("realdata")
+    alarms_raw = sum(s.alarm_coalescer.received for s in sessions)
+    for session in sessions:
+        session.close()
+
+    return {
+        "streams": len(streams),
+        "packets_per_sec": (realdata.calls if realdata else 0) / elapsed,
+        "alarms_raw": alarms_raw,
+        "alarms_delivered": listener.alarms.count,
+        "snaps": listener.snaps.count,
+        "snap_bytes": listener.snaps.bytes,
+        "callbacks": callbacks,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NetSDK模拟器压测")
+    parser.add_argument("--devices", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--frame-rate", type=float, default=25.0)
+    parser.add_argument("--bitrate", type=int, default=2048, help="kbps")
+    parser.add_argument("--motion-rate", type=float, default=1.0)
+    parser.add_argument(
+        "--snap-rate", type=float, default=1.0, help="每台设备每秒抓拍次数"
+    )
+    parser.add_argument("--preroll", type=float, default=2.0, help="预录时长(秒)")
+    parser.add_argument(
+        "--decode", action="store_true", help="使用PlaySDK解码(解码回调写入帧缓冲)"
+    )
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args)
+    print(f"码流数: {result['streams']}")
+    print(f"吞吐量: {result['packets_per_sec']:.0f} 包/秒")
+    print(
+        f"报警: 收到 {result['alarms_raw']}, 合并后 {result['alarms_delivered']}; "
+        f"抓拍: {result['snaps']} 张, {result['snap_bytes'] / 1024:.0f} KB"
+    )
+    for kind, stats in sorted(result["callbacks"].items()):
+        print(
+            f"回调 {kind:<10} 次数: {stats.calls:<8} "
+            f"平均: {stats.avg_us:8.1f} us  最大: {stats.max_ns / 1000:8.1f} us"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+进程级NetSDK生命周期管理
+
+NetSDK的 InitEx/Cleanup 以及断线、重连、报警、抓拍回调都是进程全局的。
+SDKContext 只初始化一次SDK，并对使用者(设备搜索窗口、摄像机窗口、后台会话)
+做引用计数，最后一个使用者释放时才调用 Cleanup。
+
+断线/重连回调只注册一次，按登录句柄通过 callback_registry 分发给所属会话，
+会话需实现 on_disconnect(ip, port) 和 on_reconnect(ip, port)。
+"""
+
+import threading
+
+from callback_registry import callback_registry
+from sdk_backend import create_net_client
+
+try:
+    from NetSDK.SDK_Callback import fDisConnect, fHaveReConnect
+except ImportError:
+    # 模拟器后端在未安装NetSDK时可以直接调用Python函数
+    fDisConnect = fHaveReConnect = None
+
+
+def _decode_ip(pchDVRIP) -> str:
+    if isinstance(pchDVRIP, bytes):
+        return pchDVRIP.decode(errors="replace")
+    return str(pchDVRIP or "")
+
+
+class SDKContext:
+    """引用计数的NetSDK上下文，通过 SDKContext.instance() 获取"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refcount = 0
+        self.sdk = None
+        self._alarm_callback = None
+        self._snap_callback = None
+
+        # ctypes回调对象需要一直持有，避免被回收
+        self._disconnect_callback = self._wrap(fDisConnect, self._on_disconnect)
+        self._reconnect_callback = self._wrap(fHaveReConnect, self._on_reconnect)
+
+    @classmethod
+    def instance(cls) -> "SDKContext":
+        """获取进程内唯一的SDK上下文"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _wrap(functype, fn):
+        return functype(fn) if functype is not None else fn
+
+    @property
+    def refcount(self) -> int:
+        return self._refcount
+
+    def acquire(self):
+        """增加引用，首次引用时初始化SDK并注册全局回调，返回NetClient"""
+        with self._lock:
+            if self._refcount == 0:
+                print("初始化NetSDK...")
+                sdk = create_net_client()
+                sdk.InitEx(self._disconnect_callback)
+                sdk.SetAutoReconnect(self._reconnect_callback)
+                self.sdk = sdk
+            self._refcount += 1
+            return self.sdk
+
+    def release(self):
+        """减少引用，最后一个使用者释放时清理SDK"""
+        with self._lock:
+            if self._refcount == 0:
+                return
+            self._refcount -= 1
+            if self._refcount == 0 and self.sdk is not None:
+                print("清理NetSDK...")
+                try:
+                    self.sdk.Cleanup()
+                finally:
+                    self.sdk = None
+                    self._alarm_callback = None
+                    self._snap_callback = None
+
+    def set_alarm_callback(self, callback, user_data: int = 0):
+        """注册全局报警回调(SetDVRMessCallBackEx1)，同一回调只注册一次"""
+        with self._lock:
+            if self.sdk is not None and self._alarm_callback is not callback:
+                self.sdk.SetDVRMessCallBackEx1(callback, user_data)
+                self._alarm_callback = callback
+
+    def set_snap_callback(self, callback, user_data: int = 0):
+        """注册全局抓拍回调(SetSnapRevCallBack)，同一回调只注册一次"""
+        with self._lock:
+            if self.sdk is not None and self._snap_callback is not callback:
+                self.sdk.SetSnapRevCallBack(callback, user_data)
+                self._snap_callback = callback
+
+    def _on_disconnect(self, lLoginID, pchDVRIP, nDVRPort, dwUser):
+        """断线回调：分发给登录句柄对应的会话"""
+        ip = _decode_ip(pchDVRIP)
+        print(f"设备断线回调 - LoginID: {lLoginID}, IP: {ip}, Port: {nDVRPort}")
+        session = callback_registry.lookup(lLoginID)
+        if session is not None:
+            try:
+                session.on_disconnect(ip, nDVRPort)
+            except Exception as e:
+                print(f"分发断线回调失败: {e}")
+
+    def _on_reconnect(self, lLoginID, pchDVRIP, nDVRPort, dwUser):
+        """重连回调：分发给登录句柄对应的会话"""
+        ip = _decode_ip(pchDVRIP)
+        print(f"设备重连回调 - LoginID: {lLoginID}, IP: {ip}, Port: {nDVRPort}")
+        session = callback_registry.lookup(lLoginID)
+        if session is not None:
+            try:
+                session.on_reconnect(ip, nDVRPort)
+            except Exception as e:
+                print(f"分发重连回调失败: {e}")
+
+
+def get_sdk_context() -> SDKContext:
+    """获取进程内唯一的SDK上下文"""
+    return SDKContext.instance()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+SDK命令执行器 - 把阻塞的NetSDK调用移出Qt界面线程
+
+每个摄像机会话拥有一个单线程执行器，SDK调用按提交顺序在工作线程中执行，
+提交后立即返回 concurrent.futures.Future；结果通过Qt信号回到界面线程，
+支持按调用设置超时以及取消。
+
+注意：NetSDK调用本身无法被中断，超时或取消只会让Future提前结束，
+调用真正返回后的结果会被丢弃(可通过 on_discard 释放登录句柄等资源)。
+超时从调用开始执行时计算，排队等待的时间不计入；停止录制、停止预览、登出等
+改变设备状态的调用以 cancellable=False 提交，不会被取消或跳过。
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+# 各类SDK调用的默认超时(秒)
+DEFAULT_CALL_TIMEOUTS = {
+    "login": 10.0,
+    "logout": 5.0,
+    "realplay": 8.0,
+    "config": 5.0,
+    "reboot": 5.0,
+    "snap": 5.0,
+    "ptz": 2.0,
+    "record": 5.0,
+    "alarm": 5.0,
+    "log": 5.0,
+}
+DEFAULT_TIMEOUT = 10.0
+
+
+class SDKCallTimeout(TimeoutError):
+    """SDK调用超过设定时间未返回"""
+
+
+class _TimeoutWatchdog:
+    """全局超时看门狗，一个线程负责所有执行器的Future超时"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def watch(self, future: Future, timeout: float, name: str):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(
+                self._heap, (deadline, next(self._seq), future, name, timeout)
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="SDKTimeoutWatchdog", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, future, name, timeout = self._heap[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            if not future.done():
+                try:
+                    future.set_exception(
+                        SDKCallTimeout(f"SDK调用超时({timeout:.1f}秒): {name}")
+                    )
+                except InvalidStateError:
+                    pass
+
+
+_watchdog = _TimeoutWatchdog()
+
+
+class SDKCommandExecutor(QObject):
+    """单个会话的SDK命令执行器，需在界面线程中创建"""
+
+    # 内部信号：把完成的调用转交到界面线程(future, on_done)
+    _call_finished = Signal(object, object)
+
+    def __init__(self, name: str = "SDK", timeouts: Optional[dict] = None, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.timeouts = dict(DEFAULT_CALL_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._closed = False
+        # 界面线程和其他线程(例如动检录制)都会提交调用，_pending 用锁保护
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._call_finished.connect(self._on_call_finished)
+
+    def submit(
+        self,
+        fn: Callable,
+        *args,
+        kind: str = "",
+        timeout: Optional[float] = None,
+        on_done: Optional[Callable] = None,
+        on_discard: Optional[Callable] = None,
+        cancellable: bool = True,
+        **kwargs,
+    ) -> Future:
+        """
+        提交一个SDK调用，立即返回Future
+        :param kind: 调用类别，用于查找默认超时(见 DEFAULT_CALL_TIMEOUTS)
+        :param timeout: 超时秒数，None表示使用类别默认值，0表示不限时
+        :param on_done: 在界面线程中调用 on_done(result, error)，被取消时不调用
+        :param on_discard: 调用在超时/取消后才返回时，在工作线程中以结果调用，用于释放资源
+        :param cancellable: False表示改变设备状态的调用，提交时即标记为运行中，
+            cancel()/cancel_all() 不会取消，总会执行(超时后仍会执行完，只是结果被丢弃)
+        """
+        future = Future()
+        if self._closed:
+            future.cancel()
+            return future
+
+        name = kind or getattr(fn, "__name__", "call")
+        if timeout is None:
+            timeout = self.timeouts.get(kind, DEFAULT_TIMEOUT)
+
+        def run():
+            if future.done():
+                # 排队期间已被取消
+                return
+            if timeout and timeout > 0:
+                _watchdog.watch(future, timeout, name)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                try:
+                    future.set_exception(e)
+                except InvalidStateError:
+                    pass
+                return
+            try:
+                future.set_result(result)
+            except InvalidStateError:
+                if on_discard is not None:
+                    try:
+                        on_discard(result)
+                    except Exception as e:
+                        print(f"释放过期SDK调用结果失败({name}): {e}")
+
+        if not cancellable:
+            future.set_running_or_notify_cancel()
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda f: self._call_finished.emit(f, on_done))
+        self._pool.submit(run)
+        return future
+
+    def _on_call_finished(self, future: Future, on_done):
+        """在界面线程中分发调用结果"""
+        with self._lock:
+            self._pending.discard(future)
+        if self._closed or on_done is None or future.cancelled():
+            return
+        error = future.exception()
+        result = None if error is not None else future.result()
+        try:
+            on_done(result, error)
+        except Exception as e:
+            print(f"处理SDK调用结果失败: {e}")
+
+    def pending_count(self) -> int:
+        """尚未完成的调用数量"""
+        with self._lock:
+            return len(self._pending)
+
+    def cancel_all(self):
+        """取消所有尚未完成的调用"""
+        with self._lock:
+            futures = list(self._pending)
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self, cancel_pending: bool = True, wait: bool = False):
+        """
+        关闭执行器，不再接受新调用
+        :param cancel_pending: 是否取消尚未完成的调用(否则已提交的调用仍会依次执行)
+        :param wait: 是否等待工作线程执行完毕
+        """
+        if cancel_pending:
+            self.cancel_all()
+        self._closed = True
+        self._pool.shutdown(wait=wait)
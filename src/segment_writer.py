@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+录像分段
+
+SegmentWriter 作为预录缓冲(PrerollBuffer)的写入端，按时长或大小把一次录制切分为多个文件，
+文件名在原有命名后加序号，例如 record_192_168_1_108_ch0_20231211_143025_0002.dav。
+达到切分条件后，在下一个I帧处切换文件，每个分段都从I帧开始，分段之间不丢包也不重复。
+
+每个分段关闭后追加一行到所在目录的清单文件(manifest.jsonl)，记录文件名、通道、
+序号、起止时间、大小和触发方式，并通过 on_closed 通知索引(media_catalog)。
+"""
+
+import json
+import os
+import threading
+import time
+from ctypes import string_at
+from typing import Callable, List, Optional
+
+from dav_format import is_dav_keyframe
+from stream_tee import StreamTee
+
+MANIFEST_NAME = "manifest.jsonl"
+
+_manifest_lock = threading.Lock()
+
+
+def append_manifest(manifest_path: str, entry: dict):
+    """向清单文件追加一条记录(多个写入线程共用)"""
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _manifest_lock:
+        with open(manifest_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def read_manifest(manifest_path: str) -> List[dict]:
+    """读取清单文件，跳过损坏的行"""
+    entries = []
+    if not os.path.exists(manifest_path):
+        return entries
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+class SegmentWriter:
+    """按时长/大小切分的录像写入端，需提供 write(src, size)"""
+
+    def __init__(
+        self,
+        path: str,
+        ip: str,
+        channel: int,
+        segment_seconds: float = 0.0,
+        segment_bytes: int = 0,
+        preroll_seconds: float = 0.0,
+        segment_name: Optional[Callable[[int], str]] = None,
+        event: str = "",
+        on_closed: Optional[Callable[[dict], None]] = None,
+        **tee_options,
+    ):
+        """
+        :param path: 录制文件路径，切分时在文件名后加序号
+        :param segment_seconds: 每段最长时长，0表示不按时长切分
+        :param segment_bytes: 每段最大字节数，0表示不按大小切分
+        :param preroll_seconds: 第一段中预录数据的时长，用于修正起始时间
+        :param segment_name: segment_name(序号) 返回后续分段的文件名(不含目录)，
+            默认为 path 加序号
+        :param event: 触发方式(manual/motion/continuous)，写入清单
+        :param on_closed: on_closed(清单记录) 在分段关闭后调用(写入线程)，记录另含完整路径path
+        :param tee_options: 传给 StreamTee 的参数
+        """
+        self.ip = ip
+        self.channel = channel
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.event = event
+        self.on_closed = on_closed
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        self.seq = 1
+        self.segments_closed = 0
+
+        root, ext = os.path.splitext(os.path.basename(path))
+        self._segment_name = segment_name or (lambda seq: f"{root}_{seq:04d}{ext}")
+        if self.rotating:
+            path = f"{os.path.join(self.directory, root)}_{self.seq:04d}{ext}"
+        self.first_path = path
+        # 文件 -> (序号, 分段开始时间)，开始时间取切换时刻而不是写入线程打开文件的时刻
+        self._segments = {path: (self.seq, time.time() - preroll_seconds)}
+        self._segment_started = time.monotonic()
+        self._segment_bytes = 0
+        self._tee = StreamTee(
+            path, on_file_closed=self._on_segment_closed, **tee_options
+        )
+
+    @property
+    def rotating(self) -> bool:
+        return self.segment_seconds > 0 or self.segment_bytes > 0
+
+    @property
+    def path(self) -> str:
+        """正在写入的文件"""
+        return self._tee.path
+
+    def write(self, src, size: int):
+        """写入一个数据包(回调线程中调用)"""
+        if self.rotating and self._segment_due():
+            if is_dav_keyframe(string_at(src, min(size, 5))):
+                self._next_segment()
+        self._tee.write(src, size)
+        self._segment_bytes += size
+
+    def _segment_due(self) -> bool:
+        if self.segment_bytes > 0 and self._segment_bytes >= self.segment_bytes:
+            return True
+        return (
+            self.segment_seconds > 0
+            and time.monotonic() - self._segment_started >= self.segment_seconds
+        )
+
+    def _next_segment(self):
+        self.seq += 1
+        path = os.path.join(self.directory, self._segment_name(self.seq))
+        self._segments[path] = (self.seq, time.time())
+        self._segment_started = time.monotonic()
+        self._segment_bytes = 0
+        # 只插入切换标记，文件操作在写入线程中完成
+        self._tee.rotate(path)
+
+    def _on_segment_closed(self, path: str, size: int, opened: float, closed: float):
+        """分段关闭(写入线程)，追加到清单"""
+        seq, start = self._segments.pop(path, (self.seq, opened))
+        entry = {
+            "file": os.path.basename(path),
+            "ip": self.ip,
+            "channel": self.channel,
+            "seq": seq,
+            "start": round(start, 3),
+            "end": round(closed, 3),
+            "bytes": size,
+            "event": self.event,
+        }
+        try:
+            append_manifest(self.manifest_path, entry)
+        except OSError as e:
+            print(f"写入录像清单失败({self.manifest_path}): {e}")
+        self.segments_closed += 1
+        if self.on_closed is not None:
+            try:
+                self.on_closed(dict(entry, path=path))
+            except Exception as e:
+                print(f"录像分段通知错误: {e}")
+        print(f"录像分段完成: {entry['file']} ({size} 字节)")
+
+    def close(self):
+        """写完缓存的数据后关闭当前分段"""
+        self._tee.close()
+
+    def stats(self) -> dict:
+        stats = self._tee.stats()
+        stats["seq"] = self.seq
+        stats["segments_closed"] = self.segments_closed
+        return stats
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+抓拍图片异步保存
+
+抓拍回调运行在SDK线程中。SnapshotWriter 在回调中只把图片数据放入队列，
+由写入线程写文件、写入媒体索引并通知调用方，回调和界面线程都不等待磁盘。
+等待写入的图片数超过 max_pending 时丢弃新图片并计数，内存占用有上限。
+
+图片数据可以是回调中复制出的 PooledBuffer，写入线程直接写其内存视图，
+写完(或丢弃)后归还缓冲池，从回调到磁盘只复制一次。
+
+本地抓拍时提交的是解码帧(DecodedFrame)，由写入线程转换为RGB并编码为JPEG/PNG，
+不经过设备的 SnapPictureEx。解码帧是整幅I420图像的副本，
+等待编码的帧数另有更小的上限(max_pending_frames)。
+
+文件先写入 .part 再改名，索引扫描和配额清理不会看到写了一半的图片。
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from PySide6.QtGui import QImage
+
+from buffer_pool import PooledBuffer
+from camera_session import TRIGGER_MANUAL
+from frame_ring import DecodedFrame
+from yuv_convert import FORMAT_I420, YUVConverter
+
+DEFAULT_MAX_PENDING = 256  # 等待写入的图片数上限
+DEFAULT_MAX_PENDING_FRAMES = 8  # 等待编码的解码帧数上限(每帧为整幅I420图像)
+DEFAULT_JPEG_QUALITY = 90
+
+# 本地抓拍的图片格式(同时是文件扩展名)
+IMAGE_JPEG = "jpg"
+IMAGE_PNG = "png"
+
+_QT_FORMATS = {IMAGE_JPEG: "JPG", IMAGE_PNG: "PNG"}
+
+_STOP = object()
+
+
+def _release(data):
+    if isinstance(data, PooledBuffer):
+        data.release()
+
+
+class SnapshotWriter:
+    """抓拍图片的后台写入线程"""
+
+    def __init__(
+        self,
+        catalog=None,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+        on_saved: Optional[Callable[[str, int, object, str], None]] = None,
+        max_pending_frames: int = DEFAULT_MAX_PENDING_FRAMES,
+    ):
+        """
+        :param catalog: 媒体索引(MediaCatalog)，为None时不写索引
+        :param on_saved: 每张图片处理完后在写入线程中调用
+            on_saved(路径, 字节数, context, 错误信息)，成功时错误信息为空
+        """
+        if max_pending <= 0:
+            raise ValueError("max_pending 必须为正数")
+        self.catalog = catalog
+        self.max_pending = max_pending
+        self.max_pending_frames = max(1, min(max_pending_frames, max_pending))
+        self._pending_frames = 0
+        self._frames_lock = threading.Lock()
+        self.jpeg_quality = jpeg_quality
+        self.on_saved = on_saved
+        self._converter = YUVConverter()  # 只在写入线程中使用
+
+        self.submitted = 0
+        self.saved = 0
+        self.saved_bytes = 0
+        self.dropped = 0  # 队列已满而丢弃的图片数
+        self.write_errors = 0
+        self.max_queue_depth = 0
+        self.last_write_seconds = 0.0
+        self.encoded = 0  # 本地编码的图片数
+        self.last_encode_seconds = 0.0
+
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(
+            target=self._run, name="SnapshotWriter", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(
+        self, data, path: str, event: str = TRIGGER_MANUAL, context=None
+    ) -> bool:
+        """
+        提交一张图片(任意线程，不阻塞)
+        :param data: 图片数据(PooledBuffer 或 bytes 等支持缓冲区协议的对象)，
+            之后由写入线程持有，PooledBuffer 写完后自动归还；
+            DecodedFrame 按 path 的扩展名编码为JPEG/PNG
+        :return: 队列已满或已关闭时返回False
+        """
+        if self._thread is None:
+            _release(data)
+            return False
+        is_frame = isinstance(data, DecodedFrame)
+        if is_frame:
+            with self._frames_lock:
+                if self._pending_frames >= self.max_pending_frames:
+                    self.dropped += 1
+                    return False
+                self._pending_frames += 1
+        if isinstance(data, PooledBuffer):
+            # 入队后写入线程可能立即写完归还，先标记转交
+            data.hand_over()
+        try:
+            self._queue.put_nowait((data, path, event, context))
+        except queue.Full:
+            self.dropped += 1
+            if is_frame:
+                self._frame_done()
+            _release(data)
+            return False
+        self.submitted += 1
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """写完队列中的图片后停止写入线程"""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        # 超时未写完的图片不再写入，缓冲区归还
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                self._discard(item[0])
+
+    def _frame_done(self):
+        with self._frames_lock:
+            self._pending_frames -= 1
+
+    def _discard(self, data):
+        """队列中的一项处理完或丢弃后调用"""
+        if isinstance(data, DecodedFrame):
+            self._frame_done()
+        _release(data)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            data, path, event, context = item
+            try:
+                if isinstance(data, PooledBuffer):
+                    size, error_msg = self._write(data.view(), path, event)
+                else:
+                    size, error_msg = self._write(data, path, event)
+            finally:
+                self._discard(data)
+            if self.on_saved is not None:
+                try:
+                    self.on_saved(path, size, context, error_msg)
+                except Exception as e:
+                    print(f"抓拍保存回调错误: {e}")
+
+    def _write(self, data, path: str, event: str):
+        started = time.perf_counter()
+        temp = path + ".part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if isinstance(data, DecodedFrame):
+                size = self._encode(data, temp, os.path.splitext(path)[1])
+            else:
+                with open(temp, "wb") as f:
+                    size = f.write(data)
+            os.replace(temp, path)
+        except Exception as e:
+            # 任何错误(包括格式转换和编码)只影响这一张图片，写入线程继续运行
+            self.write_errors += 1
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            return 0, f"保存图片失败: {e}"
+        self.last_write_seconds = time.perf_counter() - started
+        self.saved += 1
+        self.saved_bytes += size
+        if self.catalog is not None:
+            try:
+                self.catalog.add_file(path, event=event)
+            except Exception as e:
+                print(f"抓拍写入索引失败: {e}")
+        return size, ""
+
+    def _encode(self, frame: DecodedFrame, temp: str, ext: str) -> int:
+        """解码帧(I420)转换为RGB后编码保存，返回文件大小"""
+        started = time.perf_counter()
+        fmt = _QT_FORMATS.get(ext.lstrip(".").lower())
+        if fmt is None:
+            raise OSError(f"不支持的图片格式: {ext}")
+        rgb = self._converter.convert(
+            frame.data, frame.width, frame.height, FORMAT_I420
+        )
+        image = QImage(
+            rgb.data, frame.width, frame.height, frame.width * 3, QImage.Format_RGB888
+        )
+        quality = self.jpeg_quality if fmt == "JPG" else -1
+        if not image.save(temp, fmt, quality):
+            raise OSError(f"图片编码失败: {temp}")
+        self.encoded += 1
+        self.last_encode_seconds = time.perf_counter() - started
+        return os.path.getsize(temp)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "submitted": self.submitted,
+            "saved": self.saved,
+            "saved_bytes": self.saved_bytes,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "last_write_seconds": self.last_write_seconds,
+            "encoded": self.encoded,
+            "pending_frames": self._pending_frames,
+            "last_encode_seconds": self.last_encode_seconds,
+        }
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+原始码流旁路写入(tee)
+
+拉流回调(RealDataCallBack)运行在SDK网络线程中，逐包打开/写入文件会让网络线程
+受磁盘延迟影响。StreamTee 在回调中只把数据包 memmove 到池化的大块缓冲区，
+攒满一块后交给写入线程做大块顺序写，回调本身只需几微秒。
+
+写入线程按 flush_interval 把未写满的缓冲块也落盘(限制掉电时丢失的数据量)，
+按 fsync_interval 调用 os.fsync。磁盘卡顿导致缓冲池耗尽时直接丢弃数据包并计数，
+从不阻塞SDK线程。
+
+rotate() 在数据流中插入切换标记，写入线程写完标记前的数据后关闭当前文件、打开新文件，
+切换前后的数据包不丢失也不重复；文件的关闭和打开都在写入线程中完成。
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from buffer_pool import BufferPool, PooledBuffer
+
+DEFAULT_CHUNK_SIZE = 512 * 1024  # 每个缓冲块的大小
+DEFAULT_MAX_CHUNKS = 32  # 缓冲块上限，决定磁盘卡顿时最多能缓存多少数据
+DEFAULT_FLUSH_INTERVAL = 1.0  # 未写满的缓冲块最多延迟多久落盘(秒)
+DEFAULT_FSYNC_INTERVAL = 0.0  # fsync间隔(秒)，0表示不主动fsync
+
+_STOP = object()
+
+
+class _Rotate:
+    __slots__ = ("path",)
+
+    def __init__(self, path: str):
+        self.path = path
+
+
+class StreamTee:
+    """把一路原始码流异步写入文件"""
+
+    def __init__(
+        self,
+        path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_chunks: int = DEFAULT_MAX_CHUNKS,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        fsync_interval: float = DEFAULT_FSYNC_INTERVAL,
+        on_file_closed: Optional[Callable[[str, int, float, float], None]] = None,
+    ):
+        """
+        :param on_file_closed: 每个文件关闭后在写入线程中调用
+            on_file_closed(路径, 字节数, 打开时间, 关闭时间)，时间为Unix时间
+        """
+        if flush_interval <= 0:
+            raise ValueError("flush_interval 必须为正数")
+        self.path = path  # 当前写入的文件
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.on_file_closed = on_file_closed
+
+        self.packets = 0  # 收到的数据包数
+        self.bytes_received = 0  # 收到的字节数
+        self.dropped_packets = 0  # 缓冲池耗尽而丢弃的数据包数
+        self.dropped_bytes = 0
+        self.bytes_written = 0  # 已写入文件的字节数
+        self.write_errors = 0
+        self.files = 1  # 打开过的文件数
+        self.max_queue_depth = 0  # 等待写入的缓冲块数的峰值
+        self.bytes_per_sec = 0.0  # 最近一个统计周期的写入速率
+
+        self._file = None
+        self._open_file(path)
+        if self._file is None:
+            raise OSError(f"无法打开文件: {path}")
+        self._pool = BufferPool(chunk_size, max_chunks, preallocate=2)
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._current: Optional[PooledBuffer] = None
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"StreamTee-{os.path.basename(path)}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def queue_depth(self) -> int:
+        """等待写入的缓冲块数"""
+        return self._queue.qsize()
+
+    def write(self, src, size: int):
+        """
+        追加一个数据包(拉流回调中调用，不做阻塞操作)
+        :param src: 指向数据的ctypes指针或地址
+        """
+        if size <= 0:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            chunk = self._current
+            if chunk is None or not chunk.append(src, size):
+                if chunk is not None:
+                    self._enqueue(chunk)
+                # 超过缓冲块大小的数据包单独占用一个扩大的缓冲块
+                chunk = self._current = self._pool.acquire(size)
+                if chunk is None:
+                    self.dropped_packets += 1
+                    self.dropped_bytes += size
+                    return
+                chunk.append(src, size)
+            self.packets += 1
+            self.bytes_received += size
+
+    def rotate(self, path: str):
+        """
+        之后写入的数据包改写到新文件(回调线程中调用，不阻塞)
+        """
+        with self._lock:
+            if self._closed:
+                return
+            if self._current is not None:
+                self._enqueue(self._current)
+                self._current = None
+            self._queue.put(_Rotate(path))
+
+    def _enqueue(self, chunk: PooledBuffer):
+        self._queue.put(chunk)
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def _take_current(self) -> Optional[PooledBuffer]:
+        """取走正在填充的缓冲块(写入线程中调用)"""
+        with self._lock:
+            chunk = self._current
+            self._current = None
+        return chunk
+
+    def _open_file(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # 不使用Python层缓冲，缓冲块本身就是写入单位
+            self._file = open(path, "ab", buffering=0)
+        except OSError as e:
+            self.write_errors += 1
+            print(f"打开码流文件失败({path}): {e}")
+            self._file = None
+        self.path = path
+        self._file_bytes = 0
+        self._file_opened = time.time()
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        if self.fsync_interval > 0:
+            self._fsync()
+        try:
+            self._file.close()
+        except OSError as e:
+            print(f"关闭码流文件失败({self.path}): {e}")
+        self._file = None
+        if self.on_file_closed is not None:
+            try:
+                self.on_file_closed(
+                    self.path, self._file_bytes, self._file_opened, time.time()
+                )
+            except Exception as e:
+                print(f"码流文件关闭回调错误: {e}")
+
+    def _write_chunk(self, chunk: PooledBuffer):
+        try:
+            if chunk.length and self._file is not None:
+                self._file.write(chunk.view())
+                self.bytes_written += chunk.length
+                self._file_bytes += chunk.length
+        except OSError as e:
+            # 写入出错后本文件不再写入(避免文件中出现空洞)，切换到下一个文件时恢复
+            self.write_errors += 1
+            print(f"码流写入失败({self.path}): {e}")
+            self._close_file()
+        finally:
+            chunk.release()
+
+    def _rotate_file(self, path: str):
+        self._close_file()
+        self._open_file(path)
+        self.files += 1
+
+    def _fsync(self):
+        try:
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            print(f"码流fsync失败({self.path}): {e}")
+
+    def _run(self):
+        now = time.monotonic()
+        last_flush = last_sync = rate_time = now
+        rate_bytes = 0
+        while True:
+            try:
+                chunk = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                chunk = None
+            if chunk is _STOP:
+                break
+            if isinstance(chunk, _Rotate):
+                self._rotate_file(chunk.path)
+            elif chunk is not None:
+                self._write_chunk(chunk)
+
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                current = self._take_current()
+                if current is not None:
+                    self._write_chunk(current)
+                last_flush = now
+            if self.fsync_interval > 0 and now - last_sync >= self.fsync_interval:
+                if self._file is not None:
+                    self._fsync()
+                last_sync = now
+            if now - rate_time >= 1.0:
+                self.bytes_per_sec = (self.bytes_written - rate_bytes) / (
+                    now - rate_time
+                )
+                rate_time, rate_bytes = now, self.bytes_written
+
+        # 写完剩余数据再关闭文件
+        while True:
+            try:
+                chunk = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(chunk, _Rotate):
+                self._rotate_file(chunk.path)
+            elif chunk is not _STOP:
+                self._write_chunk(chunk)
+        current = self._take_current()
+        if current is not None:
+            self._write_chunk(current)
+        self._close_file()
+
+    def close(self, timeout: float = 5.0):
+        """停止接收数据，写完缓存的数据后关闭文件"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._current is not None:
+                self._enqueue(self._current)
+                self._current = None
+        self._queue.put(_STOP)
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "packets": self.packets,
+            "bytes_received": self.bytes_received,
+            "bytes_written": self.bytes_written,
+            "bytes_per_sec": self.bytes_per_sec,
+            "dropped_packets": self.dropped_packets,
+            "dropped_bytes": self.dropped_bytes,
+            "write_errors": self.write_errors,
+            "files": self.files,
+            "buffer_memory": self._pool.memory_bytes,
+        }
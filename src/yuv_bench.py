@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YUV420转RGB性能测试
+
+示例:
+    python src/yuv_bench.py
+    python src/yuv_bench.py --resolutions 1920x1080,3840x2160 --scales 1,2 --frames 50
+
+按分辨率、格式和缩小倍数统计单核每帧转换耗时，以及按给定帧率单核可以支撑的画面数，
+用于估算多画面软件渲染的CPU开销。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+import numpy as np
+
+from yuv_convert import FORMAT_I420, FORMAT_NV12, YUVConverter, yuv420_size
+
+DEFAULT_RESOLUTIONS = "640x360,1280x720,1920x1080,2560x1440,3840x2160"
+
+
+def _parse_resolution(text: str):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def run_benchmark(args) -> list:
+    """运行转换测试，返回每个组合的统计结果"""
+    rng = np.random.default_rng(0)
+    converter = YUVConverter()
+    results = []
+    for resolution in args.resolutions.split(","):
+        width, height = _parse_resolution(resolution)
+        frame = rng.integers(0, 256, yuv420_size(width, height), dtype=np.uint8)
+        data = frame.tobytes()
+        for fmt in args.formats.split(","):
+            for scale in (int(s) for s in args.scales.split(",")):
+                out = np.empty((height // scale, width // scale, 3), dtype=np.uint8)
+                # 预热，分配中间缓冲区
+                converter.convert(data, width, height, fmt, scale, out)
+                start = time.perf_counter()
+                for _ in range(args.frames):
+                    converter.convert(data, width, height, fmt, scale, out)
+                ms = (time.perf_counter() - start) * 1000 / args.frames
+                results.append(
+                    {
+                        "resolution": f"{width}x{height}",
+                        "format": fmt,
+                        "scale": scale,
+                        "ms_per_frame": ms,
+                        "tiles_per_core": 1000 / ms / args.fps if ms > 0 else 0,
+                    }
+                )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YUV420转RGB性能测试")
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS)
+    parser.add_argument("--formats", default=f"{FORMAT_I420},{FORMAT_NV12}")
+    parser.add_argument("--scales", default="1,2,4")
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--fps", type=float, default=25.0, help="每个画面的显示帧率")
+    args = parser.parse_args(argv)
+
+    print(f"{'分辨率':<12}{'格式':<6}{'缩小':>4}{'耗时(ms)':>12}{'单核画面数':>12}")
+    for result in run_benchmark(args):
+        print(
+            f"{result['resolution']:<14}{result['format']:<7}{result['scale']:>4}"
+            f"{result['ms_per_frame']:>12.2f}{result['tiles_per_core']:>14.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
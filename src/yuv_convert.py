@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+YUV420(I420/NV12) 转 RGB - NumPy向量化实现
+
+使用BT.601有限范围系数的8位定点运算。色度项在色度分辨率(1/4像素数)上通过查找表计算，
+再广播加到亮度上，避免逐像素计算色度。支持整数倍缩小(直接抽样，不插值)，
+用于软件渲染时按显示尺寸降低转换量。
+
+YUVConverter 按输出尺寸缓存中间缓冲区，连续转换同一尺寸的帧时不再分配临时数组。
+"""
+
+from typing import Optional
+
+import numpy as np
+
+FORMAT_I420 = "i420"
+FORMAT_NV12 = "nv12"
+
+_INDEX = np.arange(256, dtype=np.int32)
+# 亮度项: 298 * (Y - 16) + 128(含四舍五入)
+_Y_LUT = (_INDEX - 16) * 298 + 128
+# 色度项
+_RV_LUT = (_INDEX - 128) * 409
+_GU_LUT = (_INDEX - 128) * -100
+_GV_LUT = (_INDEX - 128) * -208
+_BU_LUT = (_INDEX - 128) * 516
+
+
+def yuv420_size(width: int, height: int) -> int:
+    """一帧YUV420数据的字节数"""
+    return width * height * 3 // 2
+
+
+class YUVConverter:
+    """可复用中间缓冲区的YUV420转RGB转换器(非线程安全，每个线程使用一个实例)"""
+
+    def __init__(self):
+        self._buffers = {}
+
+    def _buffer(self, name: str, shape, dtype) -> np.ndarray:
+        key = (name, shape, dtype)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[key] = buffer
+        return buffer
+
+    def convert(
+        self,
+        data,
+        width: int,
+        height: int,
+        fmt: str = FORMAT_I420,
+        scale: int = 1,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        转换一帧YUV420数据
+        :param data: 支持缓冲区协议的对象(bytes、bytearray、memoryview、ctypes数组)
+        :param fmt: FORMAT_I420 或 FORMAT_NV12
+        :param scale: 整数缩小倍数，1表示原尺寸
+        :param out: 可选的输出数组，形状为 (height // scale, width // scale, 3)
+        :return: RGB888数组，形状 (height // scale, width // scale, 3)
+        """
+        if width % 2 or height % 2:
+            raise ValueError(f"YUV420要求宽高为偶数: {width}x{height}")
+        if scale < 1:
+            raise ValueError(f"缩小倍数必须为正整数: {scale}")
+
+        y_plane, u_plane, v_plane = _split_planes(data, width, height, fmt)
+        out_h, out_w = height // scale, width // scale
+        if out is None:
+            out = np.empty((out_h, out_w, 3), dtype=np.uint8)
+        elif out.shape != (out_h, out_w, 3):
+            raise ValueError(f"输出数组形状错误: {out.shape}")
+
+        if scale == 1:
+            # 色度为亮度的1/2x1/2：把亮度看成(h/2, 2, w/2, 2)，色度按(h/2, 1, w/2, 1)广播
+            shape4 = (height // 2, 2, width // 2, 2)
+            y_term = self._buffer("y", (out_h, out_w), np.int32)
+            np.take(_Y_LUT, y_plane, out=y_term)
+            y_term = y_term.reshape(shape4)
+            work = self._buffer("work", shape4, np.int32)
+            chroma_view = (slice(None), None, slice(None), None)
+            out_view = out.reshape(height // 2, 2, width // 2, 2, 3)
+        else:
+            y_sub = y_plane[::scale, ::scale][:out_h, :out_w]
+            if scale % 2 == 0:
+                half = scale // 2
+                u_plane = u_plane[::half, ::half][:out_h, :out_w]
+                v_plane = v_plane[::half, ::half][:out_h, :out_w]
+            else:
+                rows = (np.arange(out_h) * scale // 2)[:, None]
+                cols = np.arange(out_w) * scale // 2
+                u_plane = u_plane[rows, cols]
+                v_plane = v_plane[rows, cols]
+            y_term = self._buffer("y", (out_h, out_w), np.int32)
+            np.take(_Y_LUT, y_sub, out=y_term)
+            work = self._buffer("work", (out_h, out_w), np.int32)
+            chroma_view = (slice(None), slice(None))
+            out_view = out
+
+        chroma_shape = u_plane.shape
+        chroma = self._buffer("chroma", chroma_shape, np.int32)
+        chroma_tmp = self._buffer("chroma_tmp", chroma_shape, np.int32)
+
+        # R = Y + 409V
+        np.take(_RV_LUT, v_plane, out=chroma)
+        self._emit(y_term, chroma[chroma_view], work, out_view, 0)
+        # G = Y - 100U - 208V
+        np.take(_GU_LUT, u_plane, out=chroma)
+        np.take(_GV_LUT, v_plane, out=chroma_tmp)
+        np.add(chroma, chroma_tmp, out=chroma)
+        self._emit(y_term, chroma[chroma_view], work, out_view, 1)
+        # B = Y + 516U
+        np.take(_BU_LUT, u_plane, out=chroma)
+        self._emit(y_term, chroma[chroma_view], work, out_view, 2)
+        return out
+
+    @staticmethod
+    def _emit(y_term, chroma, work, out_view, channel: int):
+        np.add(y_term, chroma, out=work)
+        np.right_shift(work, 8, out=work)
+        np.clip(work, 0, 255, out=work)
+        out_view[..., channel] = work
+
+
+def _split_planes(data, width: int, height: int, fmt: str):
+    """把YUV420缓冲区拆成 Y、U、V 三个二维视图(不拷贝)"""
+    luma = width * height
+    buf = np.frombuffer(data, dtype=np.uint8, count=yuv420_size(width, height))
+    y_plane = buf[:luma].reshape(height, width)
+    chroma_shape = (height // 2, width // 2)
+    if fmt == FORMAT_I420:
+        quarter = luma // 4
+        u_plane = buf[luma : luma + quarter].reshape(chroma_shape)
+        v_plane = buf[luma + quarter :].reshape(chroma_shape)
+    elif fmt == FORMAT_NV12:
+        uv = buf[luma:].reshape(height // 2, width // 2, 2)
+        u_plane = uv[..., 0]
+        v_plane = uv[..., 1]
+    else:
+        raise ValueError(f"不支持的YUV格式: {fmt}")
+    return y_plane, u_plane, v_plane
+
+
+def pick_scale(width: int, height: int, target_width: int, target_height: int) -> int:
+    """选择不小于目标显示尺寸的最大整数缩小倍数"""
+    if target_width <= 0 or target_height <= 0:
+        return 1
+    return max(1, min(width // target_width, height // target_height))
+
+
+def i420_to_rgb(data, width: int, height: int, scale: int = 1) -> np.ndarray:
+    """I420(YUV420P)转RGB888"""
+    return YUVConverter().convert(data, width, height, FORMAT_I420, scale)
+
+
+def nv12_to_rgb(data, width: int, height: int, scale: int = 1) -> np.ndarray:
+    """NV12转RGB888"""
+    return YUVConverter().convert(data, width, height, FORMAT_NV12, scale)